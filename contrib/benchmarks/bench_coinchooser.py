@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# Benchmark coin selection over synthetic UTXO sets.
+#
+# Compares the Privacy chooser, which builds a transaction for every
+# candidate it scores, with the Changeless (branch-and-bound) chooser.
+# Each UTXO sits on its own p2wpkh address, so every coin is a bucket.
+# Also times building a batch of payouts with make_batch, which bucketizes
+# the coins once, against one make_tx call per payout.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_coinchooser.py
+
+import random
+import time
+
+from electrumsys.bitcoin import hash_to_segwit_addr
+from electrumsys.coinchooser import CoinChooserPrivacy, CoinChooserBranchAndBound
+from electrumsys.transaction import PartialTxInput, PartialTxOutput, TxOutpoint
+
+NUM_UTXOS = (100, 1_000, 5_000)
+NUM_PAYMENTS = 5
+BATCH_SIZE = 20
+FEE_RATE = 5  # sat/vbyte
+DUST_THRESHOLD = 546
+
+
+def make_coin(n: int, value: int) -> PartialTxInput:
+    txin = PartialTxInput(prevout=TxOutpoint(txid=n.to_bytes(32, 'big'), out_idx=0))
+    txin.script_type = 'address'
+    txin._trusted_address = hash_to_segwit_addr(n.to_bytes(20, 'big'), 0)
+    txin._trusted_value_sats = value
+    txin.block_height = 100
+    return txin
+
+
+def run(chooser_class, coins, amounts):
+    change_addr = hash_to_segwit_addr(b'\x98' * 20, 0)
+    dest_addr = hash_to_segwit_addr(b'\x99' * 20, 0)
+    num_inputs = num_changeless = total_fee = 0
+    t0 = time.monotonic()
+    for amount in amounts:
+        outputs = [PartialTxOutput.from_address_and_value(dest_addr, amount)]
+        tx = chooser_class().make_tx(coins=coins, inputs=[], outputs=outputs,
+                                     change_addrs=[change_addr],
+                                     fee_estimator_vb=lambda size: int(size) * FEE_RATE,
+                                     dust_threshold=DUST_THRESHOLD)
+        num_inputs += len(tx.inputs())
+        num_changeless += len(tx.outputs()) == 1
+        total_fee += tx.get_fee()
+    dt = time.monotonic() - t0
+    n = len(amounts)
+    print(f"  {chooser_class.__name__:<28} {1000 * dt / n:8.1f} ms/tx  "
+          f"inputs {num_inputs / n:5.1f}  changeless {num_changeless}/{n}  "
+          f"fee {total_fee / n:8.0f} sat")
+
+
+def run_batch(coins, amounts):
+    change_addr = hash_to_segwit_addr(b'\x98' * 20, 0)
+    dest_addr = hash_to_segwit_addr(b'\x99' * 20, 0)
+    outputs_list = [[PartialTxOutput.from_address_and_value(dest_addr, amount)] for amount in amounts]
+    kwargs = dict(fee_estimator_vb=lambda size: int(size) * FEE_RATE,
+                  dust_threshold=DUST_THRESHOLD)
+    t0 = time.monotonic()
+    remaining = list(coins)
+    for outputs in outputs_list:
+        tx = CoinChooserPrivacy().make_tx(coins=remaining, inputs=[], outputs=outputs,
+                                           change_addrs=[change_addr], **kwargs)
+        spent = set(txin.prevout for txin in tx.inputs())
+        remaining = [c for c in remaining if c.prevout not in spent]
+    t1 = time.monotonic()
+    CoinChooserPrivacy().make_batch(coins=coins, outputs_list=outputs_list,
+                                    change_addrs_list=[[change_addr]] * len(outputs_list), **kwargs)
+    t2 = time.monotonic()
+    n = len(amounts)
+    print(f"  {n} payouts, make_tx each: {1000 * (t1 - t0) / n:8.1f} ms/tx  "
+          f"make_batch: {1000 * (t2 - t1) / n:8.1f} ms/tx")
+
+
+def main():
+    rnd = random.Random(0)
+    for num_utxos in NUM_UTXOS:
+        coins = [make_coin(i + 1, rnd.randint(10_000, 10_000_000)) for i in range(num_utxos)]
+        amounts = [rnd.randint(1_000_000, 20_000_000) for _ in range(NUM_PAYMENTS)]
+        print(f"{num_utxos} utxos, {NUM_PAYMENTS} payments:")
+        for chooser_class in (CoinChooserPrivacy, CoinChooserBranchAndBound):
+            run(chooser_class, coins, amounts)
+        run_batch(coins, [rnd.randint(100_000, 1_000_000) for _ in range(BATCH_SIZE)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+# Benchmark ChannelDB.load_data, i.e. loading the gossip db at startup.
+#
+# Fills a gossip db with raw channel announcements, channel updates and
+# node announcements, then times load_data when the rows have their
+# decoded columns, and when they do not (as in a db written by an older
+# version), in which case every message is decoded with lnmsg.decode_msg.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_gossip_db_load.py
+
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from electrumsys import lnrouter
+from electrumsys.constants import BitcoinTestnet, set_testnet
+from electrumsys.lnmsg import encode_msg, decode_msg
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.util import create_and_start_event_loop, get_headers_dir
+
+NUM_NODES = 10_000
+NUM_CHANNELS = 40_000
+
+
+def node_id(n: int) -> bytes:
+    return b'\x02' + n.to_bytes(32, 'big')
+
+
+def with_raw(msg_type: str, **fields) -> dict:
+    raw = encode_msg(msg_type, **fields)
+    payload = decode_msg(raw)[1]
+    payload['raw'] = raw
+    return payload
+
+
+class ChannelDBRunner:
+    """Runs a ChannelDB with its own event loop, as the sql thread stops with the loop."""
+
+    def __init__(self, config):
+        self.loop, self.stop_loop, self.loop_thread = create_and_start_event_loop()
+        while not self.loop.is_running():
+            time.sleep(0.01)
+        class fake_network:
+            asyncio_loop = self.loop
+            interface = None
+        fake_network.config = config
+        self.channel_db = lnrouter.ChannelDB(fake_network())
+
+    def wait(self, fut):
+        while not fut.done():
+            time.sleep(0.001)
+        return fut.result()
+
+    def stop(self):
+        # let the sql thread process pending writes before stopping it
+        self.wait(self.channel_db._db_delete_channel(b'\x00' * 8))
+        self.loop.call_soon_threadsafe(self.stop_loop.set_result, 1)
+        self.loop_thread.join()
+        self.channel_db.sql_thread.join()
+
+
+def fill(channel_db, rnd: random.Random) -> None:
+    now = int(time.time())
+    chain_hash = BitcoinTestnet.rev_genesis_bytes()
+    for scid in range(1, NUM_CHANNELS + 1):
+        n1, n2 = sorted(rnd.sample(range(NUM_NODES), 2))
+        channel_db.add_channel_announcement(with_raw(
+            'channel_announcement', node_signature_1=bytes(64), node_signature_2=bytes(64),
+            bitcoin_signature_1=bytes(64), bitcoin_signature_2=bytes(64), len=0, features=b'',
+            chain_hash=chain_hash, short_channel_id=scid.to_bytes(8, 'big'),
+            node_id_1=node_id(n1), node_id_2=node_id(n2), bitcoin_key_1=node_id(n1), bitcoin_key_2=node_id(n2)))
+        for direction in (b'\x00', b'\x01'):
+            channel_db.add_channel_update(with_raw(
+                'channel_update', signature=bytes(64), chain_hash=chain_hash,
+                short_channel_id=scid.to_bytes(8, 'big'), timestamp=now - 100, message_flags=b'\x01',
+                channel_flags=direction, cltv_expiry_delta=40, htlc_minimum_msat=1000,
+                fee_base_msat=1000, fee_proportional_millionths=rnd.randint(1, 2000),
+                htlc_maximum_msat=rnd.randint(10**6, 10**10)), verbose=False)
+    for n in range(NUM_NODES):
+        channel_db.add_node_announcement(with_raw(
+            'node_announcement', signature=bytes(64), flen=2, features=b'\x88\x52', timestamp=now - 100,
+            node_id=node_id(n), rgb_color=b'\x00' * 3, alias=f'node{n}'.encode().ljust(32, b'\x00'),
+            addrlen=7, addresses=b'\x01\x7f\x00\x00\x01\x26\x07'))
+
+
+def time_load(config) -> float:
+    runner = ChannelDBRunner(config)
+    t0 = time.monotonic()
+    runner.wait(runner.channel_db.load_data())
+    dt = time.monotonic() - t0
+    runner.stop()
+    return dt
+
+
+def main():
+    set_testnet()
+    rnd = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = SimpleConfig({'electrumsys_path': tmpdir})
+        runner = ChannelDBRunner(config)
+        runner.channel_db.data_loaded.set()
+        t0 = time.monotonic()
+        fill(runner.channel_db, rnd)
+        runner.stop()
+        print(f"{NUM_NODES} nodes, {NUM_CHANNELS} channels, {2 * NUM_CHANNELS} policies "
+              f"(filled in {time.monotonic() - t0:.1f} s)")
+        print(f"  load_data, decoded columns         {1000 * time_load(config):8.1f} ms")
+        conn = sqlite3.connect(os.path.join(get_headers_dir(config), 'gossip_db'))
+        conn.execute("UPDATE channel_info SET node1_id=NULL, node2_id=NULL")
+        conn.execute("UPDATE policy SET timestamp=NULL")
+        conn.execute("UPDATE node_info SET timestamp=NULL")
+        conn.commit()
+        conn.close()
+        print(f"  load_data, raw messages only       {1000 * time_load(config):8.1f} ms")
+        print(f"  load_data, after filling columns   {1000 * time_load(config):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
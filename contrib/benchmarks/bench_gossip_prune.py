@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+# Benchmark pruning old policies from the ChannelDB.
+#
+# Fills a gossip db with channels whose policies have timestamps spread
+# over the last two weeks, then times a pruning pass as LNGossip.maintain_db
+# runs it every two minutes, when only a few policies have expired, and a
+# pass after a week offline, when about half of them have. For the latter,
+# the longest slice is how long the event loop is blocked at once.
+# Deleting the rows is timed separately, in the sql thread.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_gossip_prune.py
+
+import random
+import tempfile
+import time
+
+from electrumsys import lnrouter
+from electrumsys.constants import BitcoinTestnet, set_testnet
+from electrumsys.lnmsg import encode_msg, decode_msg
+from electrumsys.lnworker import LNGossip
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.sql_db import sql
+from electrumsys.util import create_and_start_event_loop
+
+NUM_NODES = 10_000
+NUM_CHANNELS = 40_000
+MAX_AGE = LNGossip.max_age
+SLICE_SIZE = LNGossip.PRUNE_SLICE_SIZE
+
+
+def node_id(n: int) -> bytes:
+    return b'\x02' + n.to_bytes(32, 'big')
+
+
+def with_raw(msg_type: str, **fields) -> dict:
+    raw = encode_msg(msg_type, **fields)
+    payload = decode_msg(raw)[1]
+    payload['raw'] = raw
+    return payload
+
+
+class ChannelDBRunner:
+    """Runs a ChannelDB with its own event loop, as the sql thread stops with the loop."""
+
+    def __init__(self, config):
+        self.loop, self.stop_loop, self.loop_thread = create_and_start_event_loop()
+        while not self.loop.is_running():
+            time.sleep(0.01)
+        class fake_network:
+            asyncio_loop = self.loop
+            interface = None
+        fake_network.config = config
+        self.channel_db = lnrouter.ChannelDB(fake_network())
+        self.channel_db.data_loaded.set()
+
+    def wait_for_sql(self):
+        fut = sql(lambda db: None)(self.channel_db)
+        while not fut.done():
+            time.sleep(0.001)
+
+    def stop(self):
+        self.channel_db.stop()
+        self.channel_db.sql_thread.join()
+        self.loop.call_soon_threadsafe(self.stop_loop.set_result, 1)
+        self.loop_thread.join()
+
+
+def fill(channel_db, rnd: random.Random, now: int) -> None:
+    chain_hash = BitcoinTestnet.rev_genesis_bytes()
+    for scid in range(1, NUM_CHANNELS + 1):
+        n1, n2 = sorted(rnd.sample(range(NUM_NODES), 2))
+        channel_db.add_channel_announcement(with_raw(
+            'channel_announcement', node_signature_1=bytes(64), node_signature_2=bytes(64),
+            bitcoin_signature_1=bytes(64), bitcoin_signature_2=bytes(64), len=0, features=b'',
+            chain_hash=chain_hash, short_channel_id=scid.to_bytes(8, 'big'),
+            node_id_1=node_id(n1), node_id_2=node_id(n2), bitcoin_key_1=node_id(n1), bitcoin_key_2=node_id(n2)))
+        for direction in (b'\x00', b'\x01'):
+            channel_db.add_channel_update(with_raw(
+                'channel_update', signature=bytes(64), chain_hash=chain_hash,
+                short_channel_id=scid.to_bytes(8, 'big'), timestamp=now - rnd.randrange(MAX_AGE),
+                message_flags=b'\x01', channel_flags=direction, cltv_expiry_delta=40, htlc_minimum_msat=1000,
+                fee_base_msat=1000, fee_proportional_millionths=rnd.randint(1, 2000),
+                htlc_maximum_msat=rnd.randint(10**6, 10**10)), verbose=False)
+
+
+def prune(runner, delta):
+    channel_db = runner.channel_db
+    num_policies = len(channel_db._policies)
+    slices = []
+    t0 = time.monotonic()
+    while True:
+        t = time.monotonic()
+        done = channel_db.prune_old_policies(delta, max_num=SLICE_SIZE)
+        slices.append(time.monotonic() - t)
+        if done:
+            break
+    while True:
+        t = time.monotonic()
+        done = channel_db.prune_orphaned_channels(max_num=SLICE_SIZE)
+        slices.append(time.monotonic() - t)
+        if done:
+            break
+    t1 = time.monotonic()
+    runner.wait_for_sql()
+    t2 = time.monotonic()
+    print(f"    {num_policies - len(channel_db._policies):6} policies pruned: "
+          f"{1000 * (t1 - t0):8.1f} ms in {len(slices):3} slices, longest {1000 * max(slices):7.1f} ms, "
+          f"sql thread {1000 * (t2 - t1):7.1f} ms")
+
+
+def main():
+    set_testnet()
+    rnd = random.Random(0)
+    now = int(time.time())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runner = ChannelDBRunner(SimpleConfig({'electrumsys_path': tmpdir}))
+        fill(runner.channel_db, rnd, now)
+        runner.wait_for_sql()
+        print(f"{NUM_CHANNELS} channels, {2 * NUM_CHANNELS} policies:")
+        print("  two minutes later:")
+        prune(runner, MAX_AGE - 120)
+        print("  after a week offline:")
+        prune(runner, MAX_AGE - 7 * 24 * 3600)
+        runner.stop()
+
+
+if __name__ == '__main__':
+    main()
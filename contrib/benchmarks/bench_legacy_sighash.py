@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+#
+# Benchmark signing large pre-segwit (p2pkh) transactions.
+#
+# Every input of a legacy tx has its own preimage that contains all other
+# inputs and all outputs, so building each preimage from scratch makes
+# signing quadratic in the number of inputs. Signing time per input should
+# stay flat as the tx grows.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_legacy_sighash.py
+
+import time
+
+from electrumsys import ecc
+from electrumsys.bitcoin import hash160_to_p2pkh
+from electrumsys.transaction import PartialTransaction, PartialTxInput, PartialTxOutput, TxOutpoint
+
+NUM_INPUTS = (100, 500, 2_000)
+SECRET = bytes.fromhex('0f' * 32)
+
+
+def make_tx(num_inputs: int, pubkey: bytes) -> PartialTransaction:
+    inputs = []
+    for n in range(num_inputs):
+        txin = PartialTxInput(prevout=TxOutpoint(txid=n.to_bytes(32, 'big'), out_idx=0))
+        txin.script_type = 'p2pkh'
+        txin.pubkeys = [pubkey]
+        txin.num_sig = 1
+        txin._trusted_value_sats = 100_000
+        inputs.append(txin)
+    outputs = [PartialTxOutput.from_address_and_value(hash160_to_p2pkh(bytes(20)), 50_000 * num_inputs)]
+    return PartialTransaction.from_io(inputs, outputs)
+
+
+def main():
+    privkey = ecc.ECPrivkey(SECRET)
+    pubkey = privkey.get_public_key_bytes(compressed=True)
+    keypairs = {pubkey.hex(): (SECRET, True)}
+    for num_inputs in NUM_INPUTS:
+        tx = make_tx(num_inputs, pubkey)
+        t0 = time.monotonic()
+        tx.sign(keypairs)
+        dt = time.monotonic() - t0
+        assert tx.is_complete()
+        print(f"{num_inputs:6} p2pkh inputs: sign {1000 * dt:9.1f} ms, "
+              f"{1000 * 1000 * dt / num_inputs:7.1f} us/input")
+
+
+if __name__ == '__main__':
+    main()
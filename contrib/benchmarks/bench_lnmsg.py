@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+# Benchmark lnmsg encode_msg/decode_msg on a mix of gossip messages.
+#
+# The mix is close to what an initial gossip sync receives: for each
+# channel announcement, two channel updates and half a node announcement.
+# Also times a few peer messages with TLV streams and variable-size fields.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_lnmsg.py
+
+import random
+import time
+
+from electrumsys.lnmsg import encode_msg, decode_msg
+
+NUM_CHANNELS = 5_000
+CHAIN_HASH = bytes(32)
+
+
+def gossip_messages(rnd: random.Random):
+    msgs = []
+    for scid in range(NUM_CHANNELS):
+        msgs.append(('channel_announcement', dict(
+            node_signature_1=rnd.randbytes(64), node_signature_2=rnd.randbytes(64),
+            bitcoin_signature_1=rnd.randbytes(64), bitcoin_signature_2=rnd.randbytes(64),
+            len=0, features=b'', chain_hash=CHAIN_HASH, short_channel_id=scid.to_bytes(8, 'big'),
+            node_id_1=rnd.randbytes(33), node_id_2=rnd.randbytes(33),
+            bitcoin_key_1=rnd.randbytes(33), bitcoin_key_2=rnd.randbytes(33))))
+        for direction in (b'\x00', b'\x01'):
+            msgs.append(('channel_update', dict(
+                signature=rnd.randbytes(64), chain_hash=CHAIN_HASH, short_channel_id=scid.to_bytes(8, 'big'),
+                timestamp=rnd.randrange(2**32), message_flags=b'\x01', channel_flags=direction,
+                cltv_expiry_delta=40, htlc_minimum_msat=1000, fee_base_msat=1000,
+                fee_proportional_millionths=rnd.randrange(2000), htlc_maximum_msat=rnd.randrange(2**40))))
+        if scid % 2 == 0:
+            msgs.append(('node_announcement', dict(
+                signature=rnd.randbytes(64), flen=2, features=b'\x88\x52', timestamp=rnd.randrange(2**32),
+                node_id=rnd.randbytes(33), rgb_color=rnd.randbytes(3), alias=rnd.randbytes(32),
+                addrlen=7, addresses=b'\x01\x7f\x00\x00\x01\x26\x07')))
+    return msgs
+
+
+def peer_messages(rnd: random.Random):
+    msgs = []
+    for _ in range(NUM_CHANNELS):
+        msgs.append(('init', dict(gflen=0, globalfeatures=b'', flen=4, features=rnd.randbytes(4),
+                                  init_tlvs={'networks': {'chains': CHAIN_HASH}})))
+        num_htlcs = rnd.randrange(5)
+        msgs.append(('commitment_signed', dict(
+            channel_id=rnd.randbytes(32), signature=rnd.randbytes(64),
+            num_htlcs=num_htlcs, htlc_signature=rnd.randbytes(64 * num_htlcs))))
+        msgs.append(('query_short_channel_ids', dict(
+            chain_hash=CHAIN_HASH, len=801, encoded_short_ids=b'\x00' + rnd.randbytes(800))))
+    return msgs
+
+
+def run(name, msgs):
+    t0 = time.monotonic()
+    raws = [encode_msg(msg_type, **fields) for msg_type, fields in msgs]
+    t1 = time.monotonic()
+    for raw in raws:
+        decode_msg(raw)
+    t2 = time.monotonic()
+    print(f"  {name:<8} {len(msgs) / (t1 - t0):10.0f} msg/s encode  {len(msgs) / (t2 - t1):10.0f} msg/s decode  "
+          f"({sum(map(len, raws)) / len(raws):.0f} bytes/msg)")
+
+
+def main():
+    rnd = random.Random(0)
+    print(f"{NUM_CHANNELS} channels:")
+    run('gossip', gossip_messages(rnd))
+    run('peer', peer_messages(rnd))
+
+
+if __name__ == '__main__':
+    main()
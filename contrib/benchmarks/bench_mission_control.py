@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+#
+# Simulate payments on a synthetic channel graph with hidden balances, and
+# count the attempts per successful payment.
+#
+# Channels have random capacities, split at random between their two ends,
+# and a few of them are offline. The sender has enough balance in its own
+# channels, and pays a small set of destinations repeatedly, with random
+# amounts. After each failed attempt, the route is searched again.
+# Compares the binary blacklist (the failing channel is avoided in both
+# directions, for any amount, for an hour, and other channels cost as
+# before; emulated with amount-independent failures that are forgotten
+# slowly, and no attempt cost) with mission
+# control, which learns from successes and failures per direction and
+# amount. The attempts of the last third of the payments show what was
+# learnt from the first ones.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_mission_control.py
+
+import random
+import tempfile
+import time
+
+from electrumsys import lnrouter
+from electrumsys.constants import BitcoinTestnet, set_testnet
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.util import create_and_start_event_loop
+
+NUM_NODES = 5_000
+NUM_CHANNELS = 25_000
+NUM_DESTINATIONS = 20
+NUM_PAYMENTS = 300
+MAX_ATTEMPTS = 20
+OFFLINE_RATE = 0.05  # fraction of channels that fail any payment
+
+
+def node_id(n: int) -> bytes:
+    return b'\x02' + n.to_bytes(32, 'big')
+
+
+def make_channel_db(config, loop) -> lnrouter.ChannelDB:
+    class fake_network:
+        asyncio_loop = loop
+        interface = None
+    fake_network.config = config
+    channel_db = lnrouter.ChannelDB(fake_network())
+    channel_db.data_loaded.set()
+    return channel_db
+
+
+def fill(channel_db, rnd: random.Random, now: int):
+    """Returns the hidden balances, by (short_channel_id, start node), in msat."""
+    balances = {}
+    endpoints = list(range(NUM_NODES))
+    for scid in range(1, NUM_CHANNELS + 1):
+        # preferential attachment, so that there are hubs as in the real graph
+        n1 = rnd.choice(endpoints)
+        n2 = rnd.choice(endpoints)
+        while n2 == n1:
+            n2 = rnd.randrange(NUM_NODES)
+        endpoints += (n1, n2)
+        n1, n2 = sorted((n1, n2))
+        short_channel_id = lnrouter.ShortChannelID(scid.to_bytes(8, 'big'))
+        capacity_sat = int(10 ** rnd.uniform(5, 7))
+        channel_db.add_verified_channel_info(
+            {'node_id_1': node_id(n1), 'node_id_2': node_id(n2),
+             'bitcoin_key_1': node_id(n1), 'bitcoin_key_2': node_id(n2),
+             'short_channel_id': short_channel_id,
+             'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+             'len': 0, 'features': b''}, capacity_sat=capacity_sat)
+        local_sat = 0 if rnd.random() < OFFLINE_RATE else rnd.randrange(capacity_sat)
+        remote_sat = 0 if not local_sat else capacity_sat - local_sat
+        balances[(short_channel_id, node_id(n1))] = 1000 * local_sat
+        balances[(short_channel_id, node_id(n2))] = 1000 * remote_sat
+    channel_db.add_channel_updates([{
+        'short_channel_id': scid.to_bytes(8, 'big'),
+        'message_flags': b'\x00',
+        'channel_flags': bytes([direction]),
+        'cltv_expiry_delta': rnd.choice((40, 40, 144)),
+        'htlc_minimum_msat': 1000,
+        'fee_base_msat': rnd.choice((0, 1000, 1000)),
+        'fee_proportional_millionths': rnd.randint(1, 2000),
+        'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+        'timestamp': now - 100,
+    } for scid in range(1, NUM_CHANNELS + 1) for direction in (0, 1)])
+    return balances
+
+
+def simulate_payments(path_finder, balances, payments, *, mission_control: bool):
+    path_finder.mission_control.clear()
+    overrides = {} if mission_control else {
+        'ATTEMPT_COST_MSAT': 0,
+        'ATTEMPT_COST_MILLIONTHS': 0,
+        # failed channels stay below MIN_PROBABILITY for about an hour
+        'HALF_LIFE': 40 * 3600,
+    }
+    for name, value in overrides.items():
+        setattr(path_finder.mission_control, name, value)
+    successes = attempts_to_success = failures = 0
+    last_successes = last_attempts = 0
+    t0 = time.monotonic()
+    for n, (node_a, node_b, amount_msat) in enumerate(payments):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            path = path_finder.find_path_for_payment(node_a, node_b, amount_msat)
+            if not path:
+                failures += 1
+                break
+            route = path_finder.create_route_from_path(path, node_a)
+            amounts = [amount_msat]
+            for route_edge in reversed(route[1:]):
+                amounts.append(amounts[-1] + route_edge.fee_for_edge(amounts[-1]))
+            amounts.reverse()
+            # the first channel is ours, and has enough balance
+            failed = [i for i in range(1, len(route))
+                      if balances[(route[i].short_channel_id, route[i - 1].node_id)] < amounts[i]]
+            if not failed:
+                successes += 1
+                attempts_to_success += attempt
+                if n >= 2 * len(payments) // 3:
+                    last_successes += 1
+                    last_attempts += attempt
+                if mission_control:
+                    path_finder.mission_control.report_route(route, amount_msat)
+                break
+            i = failed[0]
+            if mission_control:
+                path_finder.mission_control.report_route(route, amount_msat, sender_idx=i - 1, channel_failed=True)
+            else:
+                for start_node in (route[i - 1].node_id, route[i].node_id):
+                    path_finder.mission_control.report_failure(route[i].short_channel_id, start_node, 0)
+        else:
+            failures += 1
+    dt = (time.monotonic() - t0) / len(payments)
+    for name in overrides:
+        delattr(path_finder.mission_control, name)
+    name = 'mission control' if mission_control else 'blacklist'
+    print(f"  {name:<16} {attempts_to_success / max(successes, 1):5.2f} attempts/success "
+          f"({last_attempts / max(last_successes, 1):5.2f} for the last third), "
+          f"succeeded {successes}/{len(payments)}, {1000 * dt:6.1f} ms/payment")
+
+
+def main():
+    set_testnet()
+    rnd = random.Random(0)
+    now = int(time.time())
+    loop, stop_loop, loop_thread = create_and_start_event_loop()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        channel_db = make_channel_db(SimpleConfig({'electrumsys_path': tmpdir}), loop)
+        balances = fill(channel_db, rnd, now)
+        path_finder = lnrouter.LNPathFinder(channel_db)
+        sender = node_id(0)
+        for (short_channel_id, start_node) in balances:
+            if start_node == sender:
+                balances[(short_channel_id, start_node)] = 10**15
+        destinations = [node_id(rnd.randrange(1, NUM_NODES)) for _ in range(NUM_DESTINATIONS)]
+        payments = [(sender, rnd.choice(destinations), 1000 * int(10 ** rnd.uniform(4, 6)))
+                    for _ in range(NUM_PAYMENTS)]
+        print(f"{NUM_NODES} nodes, {channel_db.num_channels} channels, {100 * OFFLINE_RATE:.0f}% offline; "
+              f"{NUM_PAYMENTS} payments of 10k-1M sat to {NUM_DESTINATIONS} destinations:")
+        for mission_control in (False, True):
+            simulate_payments(path_finder, balances, payments, mission_control=mission_control)
+        channel_db.stop()
+        channel_db.sql_thread.join()
+        loop.call_soon_threadsafe(stop_loop.set_result, 1)
+        loop_thread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#
+# Benchmark LNPathFinder on a synthetic channel graph.
+#
+# Fills a ChannelDB with 100k random public channels between 20k nodes
+# (both policies set, a few channels disabled), then times path finding
+# between random node pairs, and taking a new graph snapshot after a
+# channel_update and after a new channel.
+# Then simulates payments where some channels fail, and compares the time
+# to the first successful route when searching again after each failure
+# (find_path_for_payment + mission control) with trying ranked candidates from
+# a single search (find_paths_for_payment).
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_pathfinding.py
+
+import random
+import tempfile
+import time
+
+from electrumsys import lnrouter
+from electrumsys.constants import BitcoinTestnet, set_testnet
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.util import create_and_start_event_loop
+
+NUM_NODES = 20_000
+NUM_CHANNELS = 100_000
+NUM_QUERIES = 10
+AMOUNT_MSAT = 100_000_000
+FAILURE_RATE = 0.2  # fraction of channels that fail payments
+MAX_ATTEMPTS = 10
+
+
+def node_id(n: int) -> bytes:
+    return b'\x02' + n.to_bytes(32, 'big')
+
+
+def make_channel_db(config, loop) -> lnrouter.ChannelDB:
+    class fake_network:
+        asyncio_loop = loop
+        interface = None
+    fake_network.config = config
+    channel_db = lnrouter.ChannelDB(fake_network())
+    channel_db.data_loaded.set()
+    return channel_db
+
+
+def channel_announcement(scid: int, n1: int, n2: int) -> dict:
+    n1, n2 = sorted((n1, n2))
+    return {'node_id_1': node_id(n1), 'node_id_2': node_id(n2),
+            'bitcoin_key_1': node_id(n1), 'bitcoin_key_2': node_id(n2),
+            'short_channel_id': scid.to_bytes(8, 'big'),
+            'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+            'len': 0, 'features': b''}
+
+
+def channel_update(rnd: random.Random, scid: int, direction: int, timestamp: int) -> dict:
+    disabled = rnd.random() < 0.05
+    return {'short_channel_id': scid.to_bytes(8, 'big'),
+            'message_flags': b'\x00',
+            'channel_flags': bytes([direction | (2 if disabled else 0)]),
+            'cltv_expiry_delta': rnd.choice((40, 40, 144)),
+            'htlc_minimum_msat': 1000,
+            'fee_base_msat': rnd.choice((0, 1000, 1000)),
+            'fee_proportional_millionths': rnd.randint(1, 2000),
+            'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+            'timestamp': timestamp}
+
+
+def simulate_payments(path_finder, queries, failing, *, k_paths: bool):
+    successes = attempts = searches = 0
+    time_to_success = 0
+    t0 = time.monotonic()
+    for node_a, node_b in queries:
+        t1 = time.monotonic()
+        path_finder.mission_control.clear()
+        paths = []
+        for i in range(MAX_ATTEMPTS):
+            if not paths:
+                searches += 1
+                if k_paths:
+                    paths = path_finder.find_paths_for_payment(node_a, node_b, AMOUNT_MSAT,
+                                                               num_paths=MAX_ATTEMPTS - i)
+                else:
+                    path = path_finder.find_path_for_payment(node_a, node_b, AMOUNT_MSAT)
+                    paths = [path] if path else []
+                if not paths:
+                    break
+            path = paths.pop(0)
+            attempts += 1
+            failed = [i for i, edge in enumerate(path) if edge.short_channel_id in failing]
+            if not failed:
+                successes += 1
+                time_to_success += time.monotonic() - t1
+                break
+            i = failed[0]
+            path_finder.mission_control.report_failure(path[i].short_channel_id,
+                                                       path[i - 1].node_id if i else node_a, 0)
+    dt = (time.monotonic() - t0) / len(queries)
+    name = 'find_paths_for_payment' if k_paths else 'find_path_for_payment'
+    print(f"  {name:<30} {1000 * dt:8.1f} ms/payment, "
+          f"{1000 * time_to_success / max(successes, 1):8.1f} ms to success "
+          f"(succeeded {successes}/{len(queries)}, {attempts} attempts, {searches} searches)")
+
+
+def main():
+    set_testnet()
+    rnd = random.Random(0)
+    now = int(time.time())
+    loop, stop_loop, loop_thread = create_and_start_event_loop()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        channel_db = make_channel_db(SimpleConfig({'electrumsys_path': tmpdir}), loop)
+        t0 = time.monotonic()
+        # preferential attachment, so that there are hubs as in the real graph
+        endpoints = list(range(NUM_NODES))
+        announcements = []
+        for scid in range(1, NUM_CHANNELS + 1):
+            n1 = rnd.choice(endpoints)
+            n2 = rnd.choice(endpoints)
+            while n2 == n1:
+                n2 = rnd.randrange(NUM_NODES)
+            endpoints += (n1, n2)
+            announcements.append(channel_announcement(scid, n1, n2))
+        channel_db.add_channel_announcement(announcements, trusted=True)
+        channel_db.add_channel_updates([channel_update(rnd, scid, direction, now - 100)
+                                        for scid in range(1, NUM_CHANNELS + 1)
+                                        for direction in (0, 1)])
+        print(f"{NUM_NODES} nodes, {channel_db.num_channels} channels "
+              f"(filled in {time.monotonic() - t0:.1f} s)")
+
+        queries = [(node_id(rnd.randrange(NUM_NODES)), node_id(rnd.randrange(NUM_NODES)))
+                   for _ in range(NUM_QUERIES)]
+        path_finder = lnrouter.LNPathFinder(channel_db)
+        if hasattr(channel_db, 'get_channel_graph'):
+            t0 = time.monotonic()
+            channel_db.get_channel_graph()
+            print(f"  first snapshot                  {1000 * (time.monotonic() - t0):8.1f} ms")
+            channel_db.add_channel_update(channel_update(rnd, 1, 0, now), verbose=False)
+            t0 = time.monotonic()
+            channel_db.get_channel_graph()
+            print(f"  snapshot after channel_update   {1000 * (time.monotonic() - t0):8.1f} ms")
+            channel_db.add_channel_announcement(channel_announcement(NUM_CHANNELS + 1, 1, 2), trusted=True)
+            t0 = time.monotonic()
+            channel_db.get_channel_graph()
+            print(f"  snapshot after new channel      {1000 * (time.monotonic() - t0):8.1f} ms")
+        found = 0
+        hops = 0
+        t0 = time.monotonic()
+        for node_a, node_b in queries:
+            path = path_finder.find_path_for_payment(node_a, node_b, AMOUNT_MSAT)
+            if path:
+                found += 1
+                hops += len(path)
+        dt = (time.monotonic() - t0) / NUM_QUERIES
+        print(f"  find_path_for_payment           {1000 * dt:8.1f} ms/path "
+              f"(found {found}/{NUM_QUERIES}, {hops / max(found, 1):.1f} hops)")
+        if hasattr(path_finder, 'find_paths_for_payment'):
+            failing = set(scid.to_bytes(8, 'big') for scid in range(1, NUM_CHANNELS + 1)
+                          if rnd.random() < FAILURE_RATE)
+            print(f"payments with {100 * FAILURE_RATE:.0f}% failing channels, up to {MAX_ATTEMPTS} attempts:")
+            for k_paths in (False, True):
+                simulate_payments(path_finder, queries, failing, k_paths=k_paths)
+        loop.call_soon_threadsafe(stop_loop.set_result, 1)
+        loop_thread.join()
+        channel_db.sql_thread.join()
+
+
+if __name__ == '__main__':
+    main()
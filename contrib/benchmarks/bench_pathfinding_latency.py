@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+# Benchmark how path finding affects the asyncio loop.
+#
+# Fills a ChannelDB with 100k random public channels between 20k nodes,
+# then runs searches between random node pairs from a coroutine, while a
+# ticker coroutine measures how late the loop wakes it up (every 1 ms).
+# Searches run on the loop itself, and in the path finding executor.
+# Then times how long a search keeps the path finding thread busy after
+# it is cancelled, and after its deadline.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_pathfinding_latency.py
+
+import asyncio
+import random
+import tempfile
+import threading
+import time
+import concurrent.futures
+
+from electrumsys import lnrouter
+from electrumsys.constants import BitcoinTestnet, set_testnet
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.util import create_and_start_event_loop
+
+NUM_NODES = 20_000
+NUM_CHANNELS = 100_000
+NUM_QUERIES = 10
+AMOUNT_MSAT = 100_000_000
+TICK = 0.001
+STOP_AFTER = 0.02  # seconds after which searches are cancelled, or time out
+
+
+def node_id(n: int) -> bytes:
+    return b'\x02' + n.to_bytes(32, 'big')
+
+
+def make_channel_db(config, loop) -> lnrouter.ChannelDB:
+    class fake_network:
+        asyncio_loop = loop
+        interface = None
+    fake_network.config = config
+    channel_db = lnrouter.ChannelDB(fake_network())
+    channel_db.data_loaded.set()
+    return channel_db
+
+
+def fill(channel_db, rnd: random.Random, now: int) -> None:
+    for scid in range(1, NUM_CHANNELS + 1):
+        n1, n2 = sorted(rnd.sample(range(NUM_NODES), 2))
+        channel_db.add_verified_channel_info(
+            {'node_id_1': node_id(n1), 'node_id_2': node_id(n2),
+             'bitcoin_key_1': node_id(n1), 'bitcoin_key_2': node_id(n2),
+             'short_channel_id': lnrouter.ShortChannelID(scid.to_bytes(8, 'big')),
+             'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+             'len': 0, 'features': b''}, capacity_sat=None)
+    channel_db.add_channel_updates([{
+        'short_channel_id': scid.to_bytes(8, 'big'),
+        'message_flags': b'\x00',
+        'channel_flags': bytes([direction]),
+        'cltv_expiry_delta': rnd.choice((40, 40, 144)),
+        'htlc_minimum_msat': 1000,
+        'fee_base_msat': rnd.choice((0, 1000, 1000)),
+        'fee_proportional_millionths': rnd.randint(1, 2000),
+        'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+        'timestamp': now - 100,
+    } for scid in range(1, NUM_CHANNELS + 1) for direction in (0, 1)])
+
+
+async def measure_loop_latency(path_finder, queries, *, in_executor: bool):
+    loop = asyncio.get_event_loop()
+    late = []
+    done = False
+
+    async def ticker():
+        while not done:
+            t = loop.time()
+            await asyncio.sleep(TICK)
+            late.append(loop.time() - t - TICK)
+
+    async def search():
+        for node_a, node_b in queries:
+            if in_executor:
+                await loop.run_in_executor(path_finder.executor, path_finder.find_path_for_payment,
+                                           node_a, node_b, AMOUNT_MSAT)
+            else:
+                path_finder.find_path_for_payment(node_a, node_b, AMOUNT_MSAT)
+            await asyncio.sleep(0)
+
+    ticker_task = asyncio.ensure_future(ticker())
+    t0 = time.monotonic()
+    await search()
+    dt = time.monotonic() - t0
+    done = True
+    await ticker_task
+    late.sort()
+    name = 'in executor' if in_executor else 'on the loop'
+    print(f"  {name:<12} {1000 * dt / len(queries):7.1f} ms/search, {len(late):5} ticks, "
+          f"loop lateness: median {1000 * late[len(late) // 2]:6.2f} ms, max {1000 * late[-1]:7.1f} ms")
+
+
+def measure_stop(path_finder, queries, *, cancel: bool):
+    stopped = []
+    for node_a, node_b in queries:
+        cancel_event = threading.Event()
+        deadline = None if cancel else time.monotonic() + STOP_AFTER
+        fut = path_finder.executor.submit(path_finder.find_path_for_payment, node_a, node_b, AMOUNT_MSAT,
+                                          deadline=deadline, cancel_event=cancel_event)
+        t0 = time.monotonic()
+        if cancel:
+            time.sleep(STOP_AFTER)
+            cancel_event.set()
+        try:
+            fut.result()
+        except (lnrouter.PathFindingTimeout, concurrent.futures.CancelledError):
+            pass
+        stopped.append(time.monotonic() - t0 - STOP_AFTER)
+    name = 'cancelled' if cancel else 'deadline'
+    print(f"  {name:<12} thread busy for {1000 * max(stopped):6.2f} ms at most after the search was stopped")
+
+
+def main():
+    set_testnet()
+    rnd = random.Random(0)
+    now = int(time.time())
+    loop, stop_loop, loop_thread = create_and_start_event_loop()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        channel_db = make_channel_db(SimpleConfig({'electrumsys_path': tmpdir}), loop)
+        fill(channel_db, rnd, now)
+        path_finder = lnrouter.LNPathFinder(channel_db)
+        queries = [(node_id(rnd.randrange(NUM_NODES)), node_id(rnd.randrange(NUM_NODES)))
+                   for _ in range(NUM_QUERIES)]
+        channel_db.get_channel_graph()
+        print(f"{NUM_NODES} nodes, {channel_db.num_channels} channels, {NUM_QUERIES} searches:")
+        for in_executor in (False, True):
+            asyncio.run_coroutine_threadsafe(
+                measure_loop_latency(path_finder, queries, in_executor=in_executor), loop).result()
+        for cancel in (True, False):
+            measure_stop(path_finder, queries, cancel=cancel)
+        channel_db.stop()
+        channel_db.sql_thread.join()
+        loop.call_soon_threadsafe(stop_loop.set_result, 1)
+        loop_thread.join()
+
+
+if __name__ == '__main__':
+    main()
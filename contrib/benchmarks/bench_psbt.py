@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+# Benchmark parsing and serializing large PSBTs.
+#
+# Builds a PSBT whose inputs all carry a full previous transaction
+# (PSBT_IN_NON_WITNESS_UTXO), as in large multisig consolidations.
+# Reports parse/serialize throughput, and the peak memory of loading it
+# from a file by reading the whole file (tx_from_any) versus parsing it
+# while the file is read (tx_from_fd, used by the Qt GUI).
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_psbt.py
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+from electrumsys.transaction import (Transaction, PartialTransaction, PartialTxInput,
+                                     PartialTxOutput, TxOutpoint, tx_from_any, tx_from_fd)
+
+NUM_INPUTS = 1_000
+PREV_TX_OUTPUTS = 100  # ~3.5 kB per previous tx
+
+
+def make_psbt(sig: bytes) -> bytes:
+    inputs = []
+    for n in range(NUM_INPUTS):
+        prev_tx = PartialTransaction.from_io(
+            [PartialTxInput(prevout=TxOutpoint(txid=(n + 1).to_bytes(32, 'big'), out_idx=0))],
+            [PartialTxOutput(scriptpubkey=bytes.fromhex('0014') + n.to_bytes(20, 'big'), value=1000 + k)
+             for k in range(PREV_TX_OUTPUTS)])
+        prev_tx = Transaction(prev_tx.serialize_to_network(include_sigs=False))
+        txin = PartialTxInput(prevout=TxOutpoint(txid=bytes.fromhex(prev_tx.txid()), out_idx=0))
+        txin.utxo = prev_tx
+        txin.part_sigs[bytes([2]) + n.to_bytes(32, 'big')] = sig
+        inputs.append(txin)
+    outputs = [PartialTxOutput(scriptpubkey=bytes.fromhex('0014') + bytes(20), value=NUM_INPUTS * 500)]
+    return PartialTransaction.from_io(inputs, outputs).serialize_as_bytes(force_psbt=True)
+
+
+def load_in_memory(path):
+    with open(path, 'rb') as f:
+        return tx_from_any(f.read())
+
+
+def load_streaming(path):
+    with open(path, 'rb') as f:
+        return tx_from_fd(f)
+
+
+def measure(name, func, *args):
+    tracemalloc.start()
+    t0 = time.monotonic()
+    result = func(*args)
+    dt = time.monotonic() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name:<28} {1000 * dt:8.1f} ms, peak {peak / 2**20:7.1f} MiB")
+    return result
+
+
+def main():
+    raw = make_psbt(b'\x30' * 71)
+    size_mb = len(raw) / 1e6
+    print(f"{NUM_INPUTS} inputs, {size_mb:.1f} MB PSBT:")
+    t0 = time.monotonic()
+    tx = PartialTransaction.from_raw_psbt(raw)
+    t1 = time.monotonic()
+    tx.serialize_as_bytes(force_psbt=True)
+    t2 = time.monotonic()
+    print(f"  parse     {size_mb / (t1 - t0):8.1f} MB/s")
+    print(f"  serialize {size_mb / (t2 - t1):8.1f} MB/s")
+    del tx
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'a.psbt')
+        with open(path, 'wb') as f:
+            f.write(raw)
+        print("load from a file:")
+        tx1 = measure("read, then parse", load_in_memory, path)
+        tx2 = measure("parse while reading", load_streaming, path)
+        assert tx1.serialize_as_bytes(force_psbt=True) == tx2.serialize_as_bytes(force_psbt=True) == raw
+
+if __name__ == '__main__':
+    main()
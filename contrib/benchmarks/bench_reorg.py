@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+#
+# Benchmark AddressSynchronizer.undo_verifications after a reorg.
+#
+# Uses the header fixtures of the blockchain unit tests: the wallet has
+# verified txs mined in blocks A..U (heights 0..12), and the verifier then
+# switches to the fork G..L, which replaces the blocks at heights 6..11.
+# Only txs above the fork point should cost anything.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_reorg.py
+
+import os
+import shutil
+import tempfile
+import time
+
+from electrumsys import constants, blockchain
+from electrumsys.address_synchronizer import AddressSynchronizer
+from electrumsys.blockchain import Blockchain, hash_header
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.util import make_dir, TxMinedInfo
+from electrumsys.wallet_db import WalletDB
+from electrumsys.tests.test_blockchain import TestBlockchain
+
+NUM_VERIFIED_TXS = 100_000
+NUM_AFFECTED_TXS = (10, 1_000, 10_000)
+FORK_HEIGHT = 5  # last common block of the two chains
+
+
+def make_chains(data_dir: str):
+    headers = TestBlockchain.HEADERS
+    make_dir(os.path.join(data_dir, 'forks'))
+    config = SimpleConfig({'electrumsys_path': data_dir})
+    blockchain.blockchains = {}
+    chain_u = Blockchain(config=config, forkpoint=0, parent=None,
+                         forkpoint_hash=constants.net.GENESIS, prev_hash=None)
+    blockchain.blockchains[constants.net.GENESIS] = chain_u
+    open(chain_u.path(), 'w+').close()
+    for name in 'ABCDEFOPQRSTU':
+        chain_u.save_header(headers[name])
+    chain_l = chain_u.fork(headers['G'])
+    for name in 'HIJKL':
+        chain_l.save_header(headers[name])
+    return chain_u, chain_l
+
+
+def bench_reorg(chain_u, chain_l, num_affected: int):
+    adb = AddressSynchronizer(WalletDB({}, manual_upgrades=False))
+    for i in range(NUM_VERIFIED_TXS):
+        if i < num_affected:
+            height = FORK_HEIGHT + 1 + i % (chain_l.height() - FORK_HEIGHT)
+        else:
+            height = i % (FORK_HEIGHT + 1)
+        header_hash = hash_header(chain_u.read_header(height))
+        adb.db.add_verified_tx(f'{i:064x}', TxMinedInfo(height=height, timestamp=0, txpos=0,
+                                                         header_hash=header_hash))
+    t0 = time.perf_counter()
+    txs = adb.undo_verifications(chain_l, FORK_HEIGHT)
+    dt = time.perf_counter() - t0
+    assert len(txs) == num_affected, len(txs)
+    print(f'verified={NUM_VERIFIED_TXS}  affected={num_affected:6d}  time={dt * 1000:9.3f} ms')
+
+
+def main():
+    constants.set_regtest()
+    data_dir = tempfile.mkdtemp()
+    try:
+        chain_u, chain_l = make_chains(data_dir)
+        for num_affected in NUM_AFFECTED_TXS:
+            bench_reorg(chain_u, chain_l, num_affected)
+    finally:
+        shutil.rmtree(data_dir)
+        constants.set_mainnet()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Benchmark gap limit address discovery when restoring a wallet.
+#
+# The server is simulated: some receiving addresses are given a deeply
+# confirmed history, spaced so that each one is discovered only after the
+# previous one extended the gap limit window.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_restore.py
+
+import os
+import shutil
+import tempfile
+import time
+
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.wallet import restore_wallet_from_text
+
+XPUB = 'zpub6nydoME6CFdJtMpzHW5BNoPz6i6XbeT9qfz72wsRqGdgGEYeivso6xjfw8cGcCyHwF7BNW4LDuHF35XrZsovBLWMF4qXSjmhTXYiHbWqGLt'
+GAP_LIMITS = (20, 200, 2000)
+NUM_USED = 20
+LOCAL_HEIGHT = 1000
+
+
+def bench_restore(gap_limit: int, user_dir: str):
+    config = SimpleConfig({'electrumsys_path': user_dir, 'skipmerklecheck': True})
+    path = os.path.join(user_dir, f'wallet_{gap_limit}')
+    t0 = time.perf_counter()
+    wallet = restore_wallet_from_text(XPUB, path=path, config=config, gap_limit=gap_limit)['wallet']
+    wallet.db.put('stored_height', LOCAL_HEIGHT)
+    used = {i * (gap_limit - 1) for i in range(NUM_USED)}
+    seen = 0
+    rounds = 0
+    while True:
+        addrs = wallet.get_receiving_addresses()
+        if len(addrs) == seen:
+            break
+        rounds += 1
+        # "server" replies with the histories of the newly subscribed addresses
+        for n in range(seen, len(addrs)):
+            if n in used:
+                wallet.db.set_addr_history(addrs[n], [(f'{n:064x}', 1)])
+        seen = len(addrs)
+        wallet.synchronize()
+    dt = time.perf_counter() - t0
+    print(f'gap_limit={gap_limit:5d}  addresses={seen:6d}  rounds={rounds:3d}  time={dt:8.3f}s')
+
+
+def main():
+    user_dir = tempfile.mkdtemp()
+    try:
+        for gap_limit in GAP_LIMITS:
+            bench_restore(gap_limit, user_dir)
+    finally:
+        shutil.rmtree(user_dir)
+
+
+if __name__ == '__main__':
+    main()
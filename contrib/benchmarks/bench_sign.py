@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+# Benchmark signing many-input p2wpkh transactions.
+#
+# All sighashes are computed first, then the ECDSA signatures are created in
+# a worker pool with one thread per core (libsecp256k1 releases the GIL).
+# Compares that against signing one input at a time, and checks that both
+# produce the same PSBT.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_sign.py
+
+import os
+import time
+from unittest import mock
+
+from electrumsys import ecc, transaction
+from electrumsys.bitcoin import hash_to_segwit_addr
+from electrumsys.transaction import PartialTransaction, PartialTxInput, PartialTxOutput, TxOutpoint
+
+NUM_INPUTS = (100, 1_000, 5_000)
+NUM_KEYS = 16
+
+
+def make_tx(num_inputs: int, pubkeys) -> PartialTransaction:
+    inputs = []
+    for n in range(num_inputs):
+        txin = PartialTxInput(prevout=TxOutpoint(txid=(n + 1).to_bytes(32, 'big'), out_idx=0))
+        txin.script_type = 'p2wpkh'
+        txin.pubkeys = [pubkeys[n % len(pubkeys)]]
+        txin.num_sig = 1
+        txin._trusted_value_sats = 100_000
+        inputs.append(txin)
+    outputs = [PartialTxOutput.from_address_and_value(hash_to_segwit_addr(bytes(20), witver=0),
+                                                      50_000 * num_inputs)]
+    return PartialTransaction.from_io(inputs, outputs)
+
+
+def sign(num_inputs, pubkeys, keypairs, *, serial: bool):
+    tx = make_tx(num_inputs, pubkeys)
+    min_sigs = 10**9 if serial else transaction._MIN_SIGNATURES_FOR_SIGNING_POOL
+    with mock.patch.object(transaction, '_MIN_SIGNATURES_FOR_SIGNING_POOL', min_sigs):
+        t0 = time.monotonic()
+        tx.sign(keypairs)
+        dt = time.monotonic() - t0
+    assert tx.is_complete()
+    return tx, dt
+
+
+def main():
+    secrets = [(k + 1).to_bytes(32, 'big') for k in range(NUM_KEYS)]
+    pubkeys = [ecc.ECPrivkey(sec).get_public_key_bytes(compressed=True) for sec in secrets]
+    keypairs = {pk.hex(): (sec, True) for pk, sec in zip(pubkeys, secrets)}
+    print(f"{os.cpu_count()} cores")
+    for num_inputs in NUM_INPUTS:
+        serial_tx, dt_serial = sign(num_inputs, pubkeys, keypairs, serial=True)
+        pool_tx, dt_pool = sign(num_inputs, pubkeys, keypairs, serial=False)
+        assert serial_tx._serialize_as_base64() == pool_tx._serialize_as_base64()
+        print(f"{num_inputs:6} p2wpkh inputs: serial {1000 * dt_serial:9.1f} ms, "
+              f"pool {1000 * dt_pool:9.1f} ms, speedup {dt_serial / dt_pool:4.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#
+# Benchmark the SqlDB request thread.
+#
+# Gossip ingestion: queues the writes ChannelDB makes for a batch of
+# gossip (one channel, two policies and half a node per channel), and
+# measures how many writes per second the sql thread commits.
+# SweepStore: awaits add_sweep_tx from the event loop, one write at a
+# time and with many writers at once, as the watchtower does, and
+# measures the latency of each write.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_sql_db.py
+
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from electrumsys.channel_db import ChannelDB, ChannelInfo, Policy, NodeInfo
+from electrumsys.lnutil import ShortChannelID
+from electrumsys.lnwatcher import SweepStore
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.transaction import PartialTransaction, PartialTxInput, PartialTxOutput, TxOutpoint
+from electrumsys.bitcoin import hash_to_segwit_addr
+from electrumsys.util import create_and_start_event_loop
+
+NUM_CHANNELS = 20_000
+NUM_SWEEP_TXS = 200
+NUM_WRITERS = 50
+
+
+class fake_network:
+
+    def __init__(self, config):
+        self.config = config
+        self.asyncio_loop, self.stop_loop, self.loop_thread = create_and_start_event_loop()
+        while not self.asyncio_loop.is_running():
+            time.sleep(0.01)
+        self.interface = None
+
+    def stop(self, db):
+        db.stop()
+        db.sql_thread.join()
+        self.asyncio_loop.call_soon_threadsafe(self.stop_loop.set_result, 1)
+        self.loop_thread.join()
+
+
+def wait(fut):
+    while not fut.done():
+        time.sleep(0.001)
+    return fut.result()
+
+
+def bench_gossip(config, rnd: random.Random):
+    network = fake_network(config)
+    channel_db = ChannelDB(network)
+    writes = []
+    for n in range(NUM_CHANNELS):
+        scid = ShortChannelID(n.to_bytes(8, 'big'))
+        node1, node2 = b'\x02' + rnd.randbytes(32), b'\x03' + rnd.randbytes(32)
+        writes.append((channel_db._db_save_channel, ChannelInfo(scid, node1, node2, None), rnd.randbytes(430)))
+        for node_id in (node1, node2):
+            policy = Policy(key=scid + node_id, cltv_expiry_delta=40, htlc_minimum_msat=1000,
+                            htlc_maximum_msat=rnd.randrange(2**40), fee_base_msat=1000,
+                            fee_proportional_millionths=rnd.randrange(2000), channel_flags=0,
+                            message_flags=1, timestamp=rnd.randrange(2**32))
+            writes.append((channel_db._db_save_policy, policy, rnd.randbytes(138)))
+        if n % 2 == 0:
+            node_info = NodeInfo(node_id=node1, features=0x8852, timestamp=rnd.randrange(2**32), alias='node')
+            writes.append((channel_db._db_save_node_info, node_info, rnd.randbytes(150)))
+    t0 = time.monotonic()
+    for func, obj, msg in writes:
+        fut = func(obj, msg)
+    wait(fut)
+    dt = time.monotonic() - t0
+    network.stop(channel_db)
+    print(f"gossip ingestion, {len(writes)} writes: {len(writes) / dt:10.0f} writes/s")
+
+
+def make_raw_tx(n: int) -> str:
+    txin = PartialTxInput(prevout=TxOutpoint(txid=n.to_bytes(32, 'big'), out_idx=0))
+    txin.script_type = 'p2wpkh'
+    txin.script_sig = b''
+    txin.witness = bytes(108)
+    txout = PartialTxOutput.from_address_and_value(hash_to_segwit_addr(bytes(20), witver=0), 50_000)
+    return PartialTransaction.from_io([txin], [txout]).serialize()
+
+
+def bench_sweepstore(config):
+    network = fake_network(config)
+    sweepstore = SweepStore(os.path.join(config.path, "watchtower_db"), network)
+    raw_txs = [make_raw_tx(n) for n in range(NUM_SWEEP_TXS)]
+
+    async def add(n):
+        t0 = time.monotonic()
+        await sweepstore.add_sweep_tx(f'{n:064x}:0', n, f'{n:064x}:1', raw_txs[n])
+        return time.monotonic() - t0
+
+    async def sequential():
+        return [await add(n) for n in range(NUM_SWEEP_TXS)]
+
+    async def concurrent():
+        latencies = []
+        async def writer(k):
+            for n in range(k, NUM_SWEEP_TXS, NUM_WRITERS):
+                latencies.append(await add(n))
+        await asyncio.gather(*[writer(k) for k in range(NUM_WRITERS)])
+        return latencies
+
+    for name, coro in (('one writer', sequential), (f'{NUM_WRITERS} writers', concurrent)):
+        t0 = time.monotonic()
+        latencies = asyncio.run_coroutine_threadsafe(coro(), network.asyncio_loop).result()
+        dt = time.monotonic() - t0
+        latencies.sort()
+        print(f"  {name:<12} {NUM_SWEEP_TXS / dt:8.0f} writes/s  latency: "
+              f"median {1000 * statistics.median(latencies):6.2f} ms  "
+              f"p99 {1000 * latencies[int(0.99 * len(latencies))]:6.2f} ms")
+    network.stop(sweepstore)
+
+
+def main():
+    rnd = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = SimpleConfig({'electrumsys_path': tmpdir})
+        bench_gossip(config, rnd)
+        print(f"sweepstore, {NUM_SWEEP_TXS} add_sweep_tx:")
+        bench_sweepstore(config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+# Benchmark transaction serialization and hashing for large transactions.
+#
+# Builds signed-looking 1,000-input transactions (p2wpkh and p2pkh), then
+# times deserialize+txid, wtxid and re-serialization of the network tx, and
+# the BIP-143 preimages of an unsigned p2wpkh tx, as done when signing.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_tx_serialize.py
+
+import time
+
+from electrumsys.bitcoin import hash_to_segwit_addr, hash160_to_p2pkh
+from electrumsys.transaction import (Transaction, PartialTransaction, PartialTxInput,
+                                     PartialTxOutput, TxOutpoint)
+
+NUM_INPUTS = 1_000
+REPEAT = 20
+
+PUBKEY = bytes.fromhex('02e61d176da16edd1d258a200ad9759ef63adf8e14cd97f53227bae35cdb84d2f6')
+SIG = bytes.fromhex('30' + '44' + '00' * 68) + b'\x01'  # 71 bytes, like a DER sig + sighash byte
+
+
+def make_tx(*, segwit: bool, signed: bool) -> PartialTransaction:
+    inputs = []
+    for n in range(NUM_INPUTS):
+        txin = PartialTxInput(prevout=TxOutpoint(txid=n.to_bytes(32, 'big'), out_idx=n % 3))
+        txin.script_type = 'p2wpkh' if segwit else 'p2pkh'
+        txin.pubkeys = [PUBKEY]
+        txin.num_sig = 1
+        txin._trusted_value_sats = 100_000
+        if signed:
+            if segwit:
+                txin.script_sig = b''
+                txin.witness = b'\x02' + bytes([len(SIG)]) + SIG + bytes([len(PUBKEY)]) + PUBKEY
+            else:
+                txin.script_sig = bytes([len(SIG)]) + SIG + bytes([len(PUBKEY)]) + PUBKEY
+        inputs.append(txin)
+    outputs = [PartialTxOutput.from_address_and_value(hash_to_segwit_addr(bytes(20), witver=0), 50_000_000),
+               PartialTxOutput.from_address_and_value(hash160_to_p2pkh(bytes(20)), 40_000_000)]
+    return PartialTransaction.from_io(inputs, outputs)
+
+
+def timeit(name, func):
+    t0 = time.monotonic()
+    for _ in range(REPEAT):
+        func()
+    dt = (time.monotonic() - t0) / REPEAT
+    print(f"  {name:<40} {1000 * dt:8.2f} ms")
+
+
+def main():
+    for segwit in (True, False):
+        raw = make_tx(segwit=segwit, signed=True).serialize()
+        print(f"{'p2wpkh' if segwit else 'p2pkh'}, {NUM_INPUTS} inputs, {len(raw) // 2} bytes:")
+        timeit("deserialize + txid", lambda: Transaction(raw).txid())
+        if segwit:
+            timeit("deserialize + wtxid", lambda: Transaction(raw).wtxid())
+        tx = Transaction(raw)
+        tx.deserialize()
+        def reserialize():
+            tx.invalidate_ser_cache()
+            tx.serialize()
+        timeit("serialize (after deserialize)", reserialize)
+
+    unsigned = make_tx(segwit=True, signed=False)
+    def preimages():
+        shared = unsigned._calc_bip143_shared_txdigest_fields()
+        for i in range(NUM_INPUTS):
+            unsigned.serialize_preimage(i, bip143_shared_txdigest_fields=shared)
+    print(f"p2wpkh, {NUM_INPUTS} inputs, unsigned:")
+    timeit("BIP-143 preimages for all inputs", preimages)
+
+
+if __name__ == '__main__':
+    main()
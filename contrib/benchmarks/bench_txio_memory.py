@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#
+# Benchmark memory used by transaction inputs and outputs.
+#
+# Loads 100k synthetic wallet transactions (2 inputs, 2 outputs each), as
+# kept in WalletDB.transactions, plus 100k coins as returned by get_utxos,
+# and reports the RSS growth of each step and the average size per object.
+# Run it on two checkouts to compare them.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_txio_memory.py
+
+import gc
+import os
+import resource
+import sys
+import tracemalloc
+
+from electrumsys.bitcoin import hash_to_segwit_addr
+from electrumsys.transaction import (Transaction, PartialTransaction, PartialTxInput,
+                                     PartialTxOutput, TxOutpoint)
+
+NUM_TXS = 100_000
+NUM_COINS = 100_000
+SAMPLE = 1_000
+
+
+def rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:  # not linux; peak RSS is the best we can do
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def make_raw_tx(n: int) -> str:
+    inputs = []
+    for k in range(2):
+        txin = PartialTxInput(prevout=TxOutpoint(txid=(2 * n + k + 1).to_bytes(32, 'big'), out_idx=k))
+        txin.script_sig = b''
+        txin.witness = b'\x02' + b'\x47' + bytes(71) + b'\x21' + bytes(33)
+        inputs.append(txin)
+    outputs = [PartialTxOutput.from_address_and_value(hash_to_segwit_addr(n.to_bytes(20, 'big'), 0), 10_000 + k)
+               for k in range(2)]
+    return PartialTransaction.from_io(inputs, outputs).serialize_to_network()
+
+
+def load_txs(raw_txs):
+    txs = []
+    for raw in raw_txs:
+        tx = Transaction(raw)
+        tx.deserialize()
+        txs.append(tx)
+    return txs
+
+
+def make_coins(ns):
+    coins = []
+    for n in ns:
+        txin = PartialTxInput(prevout=TxOutpoint(txid=(n + 1).to_bytes(32, 'big'), out_idx=0))
+        txin._trusted_address = 'addr'
+        txin._trusted_value_sats = 10_000 + n
+        txin.block_height = 100
+        coins.append(txin)
+    return coins
+
+
+def measure(name, func, arg, *, num_objects: int):
+    gc.collect()
+    rss0 = rss_bytes()
+    tracemalloc.start()
+    sample = func(arg[:SAMPLE])
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sample
+    gc.collect()
+    result = func(arg)
+    gc.collect()
+    rss1 = rss_bytes()
+    print(f"  {name:<36} RSS +{(rss1 - rss0) / 2**20:7.1f} MiB, "
+          f"{size / (SAMPLE * num_objects):6.0f} bytes per in/output")
+    return result
+
+
+def main():
+    raw_txs = [make_raw_tx(n) for n in range(NUM_TXS)]
+    print(f"{NUM_TXS} txs, {NUM_COINS} coins:")
+    txs = measure("deserialized txs (2-in, 2-out)", load_txs, raw_txs, num_objects=4)
+    coins = measure("coins (PartialTxInput)", make_coins, list(range(NUM_COINS)), num_objects=1)
+    assert len(txs) == NUM_TXS and len(coins) == NUM_COINS
+
+
+if __name__ == '__main__':
+    main()
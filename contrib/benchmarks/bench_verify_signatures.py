@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+#
+# Micro-benchmark ECDSA signature verification.
+#
+# Verifies gossip-like batches (a few node keys signing many messages, plus
+# one-off bitcoin keys) one call at a time with ecc.verify_signature, and
+# in one call with ecc.verify_signatures, which parses each distinct pubkey
+# once, reuses its buffers and splits large batches across threads.
+#
+# usage (from the repository root):
+#   PYTHONPATH=. python3 contrib/benchmarks/bench_verify_signatures.py
+
+import os
+import time
+
+from electrumsys import ecc
+from electrumsys.crypto import sha256d
+
+BATCH_SIZES = (100, 1_000, 10_000)
+NUM_NODE_KEYS = 50
+
+
+def make_items(num_items: int):
+    node_keys = [ecc.ECPrivkey((k + 1).to_bytes(32, 'big')) for k in range(NUM_NODE_KEYS)]
+    items = []
+    for n in range(num_items):
+        if n % 2:
+            privkey = node_keys[n % NUM_NODE_KEYS]
+        else:
+            privkey = ecc.ECPrivkey((1_000_000 + n).to_bytes(32, 'big'))
+        msg_hash = sha256d(n.to_bytes(8, 'big'))
+        sig = privkey.sign(msg_hash, sigencode=ecc.sig_string_from_r_and_s)
+        items.append((privkey.get_public_key_bytes(compressed=True), sig, msg_hash))
+    return items
+
+
+def main():
+    print(f"{os.cpu_count()} cores")
+    for batch_size in BATCH_SIZES:
+        items = make_items(batch_size)
+        t0 = time.monotonic()
+        single = [ecc.verify_signature(*item) for item in items]
+        t1 = time.monotonic()
+        batch = ecc.verify_signatures(items)
+        t2 = time.monotonic()
+        assert all(single) and single == batch
+        print(f"{batch_size:6} sigs: one at a time {1e6 * (t1 - t0) / batch_size:6.1f} us/sig, "
+              f"batch {1e6 * (t2 - t1) / batch_size:6.1f} us/sig, speedup {(t1 - t0) / (t2 - t1):4.2f}x")
+
+
+if __name__ == '__main__':
+    main()
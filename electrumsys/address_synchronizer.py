@@ -182,11 +182,15 @@ class AddressSynchronizer(Logger):
             self.db.put('stored_height', self.get_local_height())
 
     def add_address(self, address):
-        if not self.db.get_addr_history(address):
-            self.db.history[address] = []
-            self.set_up_to_date(False)
+        self.add_addresses([address])
+
+    def add_addresses(self, addresses: Sequence[str]):
+        for address in addresses:
+            if not self.db.get_addr_history(address):
+                self.db.history[address] = []
+                self.set_up_to_date(False)
         if self.synchronizer:
-            self.synchronizer.add(address)
+            self.synchronizer.add_addresses(addresses)
 
     def get_conflicting_transactions(self, tx_hash, tx: Transaction, include_self=False):
         """Returns a set of transaction hashes from the wallet history that are
@@ -363,7 +367,8 @@ class AddressSynchronizer(Logger):
         self.add_unverified_tx(tx_hash, tx_height)
         self.add_transaction(tx, allow_unrelated=True)
 
-    def receive_history_callback(self, addr: str, hist, tx_fees: Dict[str, int]):
+    def receive_history_callback(self, addr: str, hist, tx_fees: Dict[str, int], *,
+                                 status: Optional[str] = None):
         with self.lock:
             old_hist = self.get_address_history(addr)
             for tx_hash, height in old_hist:
@@ -373,7 +378,7 @@ class AddressSynchronizer(Logger):
                     self.db.remove_verified_tx(tx_hash)
                     if self.verifier:
                         self.verifier.remove_spv_proof_for_tx(tx_hash)
-            self.db.set_addr_history(addr, hist)
+            self.db.set_addr_history(addr, hist, status=status)
 
         for tx_hash, tx_height in hist:
             # add it in case it was previously unconfirmed
@@ -559,27 +564,27 @@ class AddressSynchronizer(Logger):
 
     def undo_verifications(self, blockchain, above_height):
         '''Used by the verifier when a reorg has happened'''
-        txs = set()
+        txs = {}  # type: Dict[str, int]  # txid -> height
         with self.lock:
-            for tx_hash in self.db.list_verified_tx():
-                info = self.db.get_verified_tx(tx_hash)
-                tx_height = info.height
-                if tx_height > above_height:
-                    header = blockchain.read_header(tx_height)
-                    if not header or hash_header(header) != info.header_hash:
+            for tx_height, tx_hashes in self.db.list_verified_tx_above_height(above_height).items():
+                header = blockchain.read_header(tx_height)
+                header_hash = hash_header(header) if header else None
+                for tx_hash in tx_hashes:
+                    info = self.db.get_verified_tx(tx_hash)
+                    if header_hash is None or header_hash != info.header_hash:
                         self.db.remove_verified_tx(tx_hash)
-                        # NOTE: we should add these txns to self.unverified_tx,
-                        # but with what height?
-                        # If on the new fork after the reorg, the txn is at the
-                        # same height, we will not get a status update for the
-                        # address. If the txn is not mined or at a diff height,
-                        # we should get a status update. Unless we put tx into
-                        # unverified_tx, it will turn into local. So we put it
-                        # into unverified_tx with the old height, and if we get
-                        # a status update, that will overwrite it.
-                        self.unverified_tx[tx_hash] = tx_height
-                        txs.add(tx_hash)
-        return txs
+                        txs[tx_hash] = tx_height
+            # NOTE: we should add these txns to self.unverified_tx,
+            # but with what height?
+            # If on the new fork after the reorg, the txn is at the
+            # same height, we will not get a status update for the
+            # address. If the txn is not mined or at a diff height,
+            # we should get a status update. Unless we put tx into
+            # unverified_tx, it will turn into local. So we put it
+            # into unverified_tx with the old height, and if we get
+            # a status update, that will overwrite it.
+            self.unverified_tx.update(txs)
+        return set(txs)
 
     def get_local_height(self) -> int:
         """ return last known height if we are offline """
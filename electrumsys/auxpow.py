@@ -49,8 +49,7 @@ from . import blockchain
 from .bitcoin import hash_encode, hash_decode
 from . import constants
 from .crypto import sha256d
-from . import transaction
-from .transaction import BCDataStream, Transaction, TxOutput, TYPE_SCRIPT
+from .transaction import BCDataStream, Transaction, TYPE_SCRIPT
 from .util import bfh, bh2u
 
 # Maximum index of the merkle root hash in the coinbase transaction script,
@@ -114,8 +113,10 @@ def deserialize_auxpow_header(base_header, s, start_position=0) -> (dict, int):
 
     # The parent coinbase transaction is first.
     # Deserialize it and save the trailing data.
+    # Only the coinbase input is ever looked at; deserialization is lazy,
+    # so the outputs are not parsed.
     parent_coinbase_tx = Transaction(s, expect_trailing_data=True, copy_input=False, start_position=start_position)
-    start_position = fast_tx_deserialize(parent_coinbase_tx)
+    start_position = parent_coinbase_tx.deserialize()
     auxpow_header['parent_coinbase_tx'] = parent_coinbase_tx
 
     # Next is the parent block hash.  According to the Bitcoin.it wiki,
@@ -366,23 +367,3 @@ def verify_auxpow(header):
 # reserialize it.
 def fast_txid(tx):
     return bh2u(sha256d(tx._cached_network_ser_bytes)[::-1])
-
-# Used by fast_tx_deserialize
-def stub_parse_output(vds: BCDataStream) -> TxOutput:
-    vds.read_int64() # value
-    vds.read_bytes(vds.read_compact_size()) # scriptpubkey
-    return TxOutput(value=0, scriptpubkey=b'')
-
-# This is equivalent to (tx.deserialize(), ), but doesn't parse outputs.
-def fast_tx_deserialize(tx):
-    # Monkeypatch output address parsing with a stub, since we only care about
-    # inputs.
-    real_parse_output, transaction.parse_output = transaction.parse_output, stub_parse_output
-
-    try:
-        result = tx.deserialize()
-    finally:
-        # Restore the real output address parser.
-        transaction.parse_output = real_parse_output
-
-    return result
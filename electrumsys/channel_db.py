@@ -25,7 +25,10 @@
 
 import time
 import random
+import heapq
 import os
+import itertools
+from array import array
 from collections import defaultdict
 from typing import Sequence, List, Tuple, Optional, Dict, NamedTuple, TYPE_CHECKING, Set
 import binascii
@@ -124,6 +127,26 @@ class Policy(NamedTuple):
 
 
 
+class EdgeHistory(NamedTuple):
+    """Results of past payments through a channel, in the direction that
+    starts at the node in the key (see lnrouter.MissionControl).
+    Times are 0 if there was no such result.
+    """
+    key: bytes  # short_channel_id + start node, as for Policy
+    fail_time: int
+    fail_amount_msat: int  # payments of at least this amount failed
+    success_time: int
+    success_amount_msat: int  # payments of at most this amount went through
+
+    @property
+    def short_channel_id(self) -> ShortChannelID:
+        return ShortChannelID.normalize(self.key[0:8])
+
+    @property
+    def start_node(self) -> bytes:
+        return self.key[8:]
+
+
 class NodeInfo(NamedTuple):
     node_id: bytes
     features: int
@@ -197,6 +220,161 @@ class NodeInfo(NamedTuple):
         return addresses
 
 
+class ChannelGraph:
+    """Array-backed graph of the public channels, used for path finding.
+
+    Nodes and channels are numbered with ints. Channel c has two slots:
+    2*c for node1 and 2*c+1 for node2. A slot holds the node and the policy
+    that node set for forwarding to the other end of the channel, which is
+    at slot ^ 1. The policy of a slot is stored in flat arrays indexed by
+    the slot.
+
+    ChannelDB keeps one instance up to date as gossip arrives, and hands
+    out snapshots of it (see snapshot()) that must not be modified.
+    """
+
+    POLICY_KNOWN = 1
+    POLICY_DISABLED = 2
+    NO_HTLC_MAXIMUM = 2**64 - 1
+
+    def __init__(self):
+        self.node_ids = []  # type: List[bytes]
+        self.node_index = {}  # type: Dict[bytes, int]
+        self.short_channel_ids = []  # type: List[Optional[ShortChannelID]]
+        self.channel_index = {}  # type: Dict[ShortChannelID, int]
+        self.capacity_sat = array('q')  # per channel; -1 if unknown
+        # per slot:
+        self.slot_node = array('i')  # -1 if the channel was removed
+        self.policy_flags = array('B')
+        self.cltv_expiry_delta = array('H')
+        self.htlc_minimum_msat = array('Q')
+        self.htlc_maximum_msat = array('Q')
+        self.fee_base_msat = array('Q')
+        self.fee_proportional_millionths = array('Q')
+        # adjacency, in CSR form: the slots of node n are
+        # adjacent_slots[adjacency_start[n]:adjacency_start[n+1]]
+        self.adjacency_start = None  # type: Optional[array]
+        self.adjacent_slots = None  # type: Optional[array]
+        # only used by the instance kept up to date by ChannelDB
+        self._slots_for_node = []  # type: List[List[int]]
+        self._free_channels = []  # type: List[int]
+        self._snapshot = None  # type: Optional[ChannelGraph]
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def _get_or_add_node(self, node_id: bytes) -> int:
+        n = self.node_index.get(node_id)
+        if n is None:
+            n = len(self.node_ids)
+            self.node_ids.append(node_id)
+            self.node_index[node_id] = n
+            self._slots_for_node.append([])
+        return n
+
+    def add_channel(self, channel_info: ChannelInfo) -> None:
+        short_channel_id = channel_info.short_channel_id
+        if short_channel_id in self.channel_index:
+            return
+        n1 = self._get_or_add_node(channel_info.node1_id)
+        n2 = self._get_or_add_node(channel_info.node2_id)
+        capacity_sat = channel_info.capacity_sat if channel_info.capacity_sat is not None else -1
+        if self._free_channels:
+            c = self._free_channels.pop()
+            self.short_channel_ids[c] = short_channel_id
+            self.capacity_sat[c] = capacity_sat
+            self.slot_node[2*c] = n1
+            self.slot_node[2*c+1] = n2
+            self.policy_flags[2*c] = self.policy_flags[2*c+1] = 0
+        else:
+            c = len(self.short_channel_ids)
+            self.short_channel_ids.append(short_channel_id)
+            self.capacity_sat.append(capacity_sat)
+            self.slot_node.extend((n1, n2))
+            self.policy_flags.extend((0, 0))
+            for arr in (self.cltv_expiry_delta, self.htlc_minimum_msat, self.htlc_maximum_msat,
+                        self.fee_base_msat, self.fee_proportional_millionths):
+                arr.extend((0, 0))
+        self.channel_index[short_channel_id] = c
+        self._slots_for_node[n1].append(2*c)
+        self._slots_for_node[n2].append(2*c+1)
+        self.adjacency_start = self.adjacent_slots = None
+        self._snapshot = None
+
+    def remove_channel(self, short_channel_id: ShortChannelID) -> None:
+        c = self.channel_index.pop(short_channel_id, None)
+        if c is None:
+            return
+        for slot in (2*c, 2*c+1):
+            self._slots_for_node[self.slot_node[slot]].remove(slot)
+            self.slot_node[slot] = -1
+            self.policy_flags[slot] = 0
+        self.short_channel_ids[c] = None
+        self._free_channels.append(c)
+        self.adjacency_start = self.adjacent_slots = None
+        self._snapshot = None
+
+    def get_slot(self, short_channel_id: ShortChannelID, node_id: bytes) -> Optional[int]:
+        c = self.channel_index.get(short_channel_id)
+        if c is None:
+            return None
+        n = self.node_index.get(node_id)
+        if n is None:
+            return None
+        if self.slot_node[2*c] == n:
+            return 2*c
+        if self.slot_node[2*c+1] == n:
+            return 2*c+1
+        return None
+
+    def update_policy(self, short_channel_id: ShortChannelID, node_id: bytes, policy: Policy) -> None:
+        slot = self.get_slot(short_channel_id, node_id)
+        if slot is None:
+            return
+        self.policy_flags[slot] = self.POLICY_KNOWN | (self.POLICY_DISABLED if policy.is_disabled() else 0)
+        self.cltv_expiry_delta[slot] = policy.cltv_expiry_delta
+        self.htlc_minimum_msat[slot] = policy.htlc_minimum_msat
+        self.htlc_maximum_msat[slot] = policy.htlc_maximum_msat \
+            if policy.htlc_maximum_msat is not None else self.NO_HTLC_MAXIMUM
+        self.fee_base_msat[slot] = policy.fee_base_msat
+        self.fee_proportional_millionths[slot] = policy.fee_proportional_millionths
+        self._snapshot = None
+
+    def remove_policy(self, short_channel_id: ShortChannelID, node_id: bytes) -> None:
+        slot = self.get_slot(short_channel_id, node_id)
+        if slot is None:
+            return
+        self.policy_flags[slot] = 0
+        self._snapshot = None
+
+    def snapshot(self) -> 'ChannelGraph':
+        """Returns a copy of the graph that is not affected by later updates.
+        The copy is cached until the graph changes, and the adjacency
+        arrays are only rebuilt if channels were added or removed.
+        """
+        if self._snapshot is not None:
+            return self._snapshot
+        if self.adjacency_start is None:
+            self.adjacent_slots = array('i', itertools.chain.from_iterable(self._slots_for_node))
+            self.adjacency_start = array('i', itertools.accumulate(
+                itertools.chain((0,), map(len, self._slots_for_node))))
+        graph = ChannelGraph()
+        graph.node_ids = self.node_ids[:]
+        graph.node_index = self.node_index.copy()
+        graph.short_channel_ids = self.short_channel_ids[:]
+        graph.channel_index = self.channel_index.copy()
+        for name in ('capacity_sat', 'slot_node', 'policy_flags', 'cltv_expiry_delta',
+                     'htlc_minimum_msat', 'htlc_maximum_msat', 'fee_base_msat',
+                     'fee_proportional_millionths'):
+            setattr(graph, name, array(getattr(self, name).typecode, getattr(self, name)))
+        # these are replaced, never modified in place
+        graph.adjacency_start = self.adjacency_start
+        graph.adjacent_slots = self.adjacent_slots
+        self._snapshot = graph
+        return graph
+
+
 class UpdateStatus(IntEnum):
     ORPHANED   = 0
     EXPIRED    = 1
@@ -212,19 +390,52 @@ class CategorizedChannelUpdates(NamedTuple):
     good: List        # good updates
 
 
+# Besides the raw gossip message, tables hold the decoded fields needed for
+# routing, so that load_data does not have to decode the messages.
+# These columns were added later: in rows written by older versions they are
+# NULL, and load_data fills them in from the message.
+decoded_columns = {
+    'channel_info': [
+        'node1_id BLOB(33)',
+        'node2_id BLOB(33)',
+        'capacity_sat INTEGER',
+    ],
+    'policy': [
+        'cltv_expiry_delta INTEGER',
+        'htlc_minimum_msat INTEGER',
+        'htlc_maximum_msat INTEGER',
+        'fee_base_msat INTEGER',
+        'fee_proportional_millionths INTEGER',
+        'channel_flags INTEGER',
+        'message_flags INTEGER',
+        'timestamp INTEGER',
+    ],
+    'node_info': [
+        'features BLOB',
+        'timestamp INTEGER',
+        'alias TEXT',
+    ],
+}
+
 create_channel_info = """
 CREATE TABLE IF NOT EXISTS channel_info (
 short_channel_id BLOB(8),
 msg BLOB,
+%s,
 PRIMARY KEY(short_channel_id)
-)"""
+)""" % ',\n'.join(decoded_columns['channel_info'])
 
 create_policy = """
 CREATE TABLE IF NOT EXISTS policy (
 key BLOB(41),
 msg BLOB,
+%s,
 PRIMARY KEY(key)
-)"""
+)""" % ',\n'.join(decoded_columns['policy'])
+
+# for pruning old policies
+create_policy_timestamp_index = """
+CREATE INDEX IF NOT EXISTS policy_timestamp ON policy(timestamp)"""
 
 create_address = """
 CREATE TABLE IF NOT EXISTS address (
@@ -239,17 +450,32 @@ create_node_info = """
 CREATE TABLE IF NOT EXISTS node_info (
 node_id BLOB(33),
 msg BLOB,
+%s,
 PRIMARY KEY(node_id)
+)""" % ',\n'.join(decoded_columns['node_info'])
+
+create_edge_history = """
+CREATE TABLE IF NOT EXISTS edge_history (
+key BLOB(41),
+fail_time INTEGER,
+fail_amount_msat INTEGER,
+success_time INTEGER,
+success_amount_msat INTEGER,
+PRIMARY KEY(key)
 )"""
 
+MAX_SQLITE_INT = 2**63 - 1
+
 
 class ChannelDB(SqlDB):
 
     NUM_MAX_RECENT_PEERS = 20
+    # payment results older than this are not loaded (seconds)
+    EDGE_HISTORY_MAX_AGE = 24 * 3600
 
     def __init__(self, network: 'Network'):
         path = os.path.join(get_headers_dir(network.config), 'gossip_db')
-        super().__init__(network.asyncio_loop, path, commit_interval=100)
+        super().__init__(network.asyncio_loop, path)
         self.lock = threading.RLock()
         self.num_nodes = 0
         self.num_channels = 0
@@ -260,7 +486,11 @@ class ChannelDB(SqlDB):
         # note: modify/iterate needs self.lock
         self._channels = {}  # type: Dict[ShortChannelID, ChannelInfo]
         self._policies = {}  # type: Dict[Tuple[bytes, ShortChannelID], Policy]  # (node_id, scid) -> Policy
+        # min-heap of (timestamp, node_id, scid), for pruning old policies.
+        # Entries of policies that have been replaced or removed are skipped when popped.
+        self._policy_timestamps = []  # type: List[Tuple[int, bytes, ShortChannelID]]
         self._nodes = {}  # type: Dict[bytes, NodeInfo]  # node_id -> NodeInfo
+        self._edge_history = {}  # type: Dict[bytes, EdgeHistory]  # key -> EdgeHistory
         # node_id -> (host, port, ts)
         self._addresses = defaultdict(set)  # type: Dict[bytes, Set[Tuple[str, int, int]]]
         self._channels_for_node = defaultdict(set)  # type: Dict[bytes, Set[ShortChannelID]]
@@ -268,6 +498,7 @@ class ChannelDB(SqlDB):
         self._chans_with_0_policies = set()  # type: Set[ShortChannelID]
         self._chans_with_1_policies = set()  # type: Set[ShortChannelID]
         self._chans_with_2_policies = set()  # type: Set[ShortChannelID]
+        self._graph = ChannelGraph()
 
         self.data_loaded = asyncio.Event()
         self.network = network # only for callback
@@ -360,9 +591,10 @@ class ChannelDB(SqlDB):
             self._channels[channel_info.short_channel_id] = channel_info
             self._channels_for_node[channel_info.node1_id].add(channel_info.short_channel_id)
             self._channels_for_node[channel_info.node2_id].add(channel_info.short_channel_id)
+            self._graph.add_channel(channel_info)
         self._update_num_policies_for_chan(channel_info.short_channel_id)
         if 'raw' in msg:
-            self._db_save_channel(channel_info.short_channel_id, msg['raw'])
+            self._db_save_channel(channel_info, msg['raw'])
 
     def policy_changed(self, old_policy: Policy, new_policy: Policy, verbose: bool) -> bool:
         changed = False
@@ -426,9 +658,11 @@ class ChannelDB(SqlDB):
         policy = Policy.from_msg(payload)
         with self.lock:
             self._policies[key] = policy
+            self._add_policy_timestamp(policy.timestamp, start_node, short_channel_id)
+            self._graph.update_policy(short_channel_id, start_node, policy)
         self._update_num_policies_for_chan(short_channel_id)
         if 'raw' in payload:
-            self._db_save_policy(policy.key, payload['raw'])
+            self._db_save_policy(policy, payload['raw'])
         if old_policy and not self.policy_changed(old_policy, policy, verbose):
             return UpdateStatus.UNCHANGED
         else:
@@ -467,13 +701,33 @@ class ChannelDB(SqlDB):
         c.execute(create_address)
         c.execute(create_policy)
         c.execute(create_channel_info)
+        c.execute(create_edge_history)
+        # add the decoded columns to tables created by older versions
+        for table, columns in decoded_columns.items():
+            c.execute(f"PRAGMA table_info({table})")
+            existing = set(row[1] for row in c.fetchall())
+            for column in columns:
+                if column.split()[0] not in existing:
+                    c.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        c.execute(create_policy_timestamp_index)
         self.conn.commit()
 
     @sql
-    def _db_save_policy(self, key: bytes, msg: bytes):
+    def _db_save_policy(self, policy: Policy, msg: bytes):
         # 'msg' is a 'channel_update' message
         c = self.conn.cursor()
-        c.execute("""REPLACE INTO policy (key, msg) VALUES (?,?)""", [key, msg])
+        c.execute("""REPLACE INTO policy (key, msg, cltv_expiry_delta, htlc_minimum_msat, htlc_maximum_msat,
+                     fee_base_msat, fee_proportional_millionths, channel_flags, message_flags, timestamp)
+                     VALUES (?,?,?,?,?,?,?,?,?,?)""", [policy.key, msg] + self._decoded_policy_columns(policy))
+
+    @staticmethod
+    def _decoded_policy_columns(policy: Policy) -> list:
+        columns = [policy.cltv_expiry_delta, policy.htlc_minimum_msat, policy.htlc_maximum_msat,
+                   policy.fee_base_msat, policy.fee_proportional_millionths,
+                   policy.channel_flags, policy.message_flags, policy.timestamp]
+        if policy.htlc_minimum_msat > MAX_SQLITE_INT or (policy.htlc_maximum_msat or 0) > MAX_SQLITE_INT:
+            columns = [None] * len(columns)  # too large for sqlite; load_data will decode the message
+        return columns
 
     @sql
     def _db_delete_policy(self, node_id: bytes, short_channel_id: ShortChannelID):
@@ -482,10 +736,20 @@ class ChannelDB(SqlDB):
         c.execute("""DELETE FROM policy WHERE key=?""", (key,))
 
     @sql
-    def _db_save_channel(self, short_channel_id: ShortChannelID, msg: bytes):
+    def _db_delete_old_policies(self, max_timestamp: int, keys: Sequence[bytes]):
+        # 'keys' are the policies being pruned. Most rows are found with the
+        # timestamp index, but rows without decoded columns need their key.
+        c = self.conn.cursor()
+        c.execute("""DELETE FROM policy WHERE timestamp <= ?""", (max_timestamp,))
+        c.executemany("""DELETE FROM policy WHERE key=? AND timestamp IS NULL""", [(key,) for key in keys])
+
+    @sql
+    def _db_save_channel(self, channel_info: ChannelInfo, msg: bytes):
         # 'msg' is a 'channel_announcement' message
         c = self.conn.cursor()
-        c.execute("REPLACE INTO channel_info (short_channel_id, msg) VALUES (?,?)", [short_channel_id, msg])
+        c.execute("REPLACE INTO channel_info (short_channel_id, msg, node1_id, node2_id, capacity_sat) VALUES (?,?,?,?,?)",
+                  [channel_info.short_channel_id, msg, channel_info.node1_id, channel_info.node2_id,
+                   channel_info.capacity_sat])
 
     @sql
     def _db_delete_channel(self, short_channel_id: ShortChannelID):
@@ -493,10 +757,27 @@ class ChannelDB(SqlDB):
         c.execute("""DELETE FROM channel_info WHERE short_channel_id=?""", (short_channel_id,))
 
     @sql
-    def _db_save_node_info(self, node_id: bytes, msg: bytes):
+    def _db_save_edge_history(self, history: EdgeHistory):
+        c = self.conn.cursor()
+        c.execute("""REPLACE INTO edge_history (key, fail_time, fail_amount_msat, success_time, success_amount_msat)
+                     VALUES (?,?,?,?,?)""", tuple(history))
+
+    @sql
+    def _db_delete_edge_history(self, keys: Sequence[bytes]):
+        c = self.conn.cursor()
+        c.executemany("""DELETE FROM edge_history WHERE key=?""", [(key,) for key in keys])
+
+    @sql
+    def _db_save_node_info(self, node_info: NodeInfo, msg: bytes):
         # 'msg' is a 'node_announcement' message
         c = self.conn.cursor()
-        c.execute("REPLACE INTO node_info (node_id, msg) VALUES (?,?)", [node_id, msg])
+        c.execute("REPLACE INTO node_info (node_id, msg, features, timestamp, alias) VALUES (?,?,?,?,?)",
+                  [node_info.node_id, msg] + self._decoded_node_columns(node_info))
+
+    @staticmethod
+    def _decoded_node_columns(node_info: NodeInfo) -> list:
+        features = node_info.features.to_bytes((node_info.features.bit_length() + 7) // 8, 'big')
+        return [features, node_info.timestamp, node_info.alias]
 
     @sql
     def _db_save_node_address(self, peer: LNPeerAddr, timestamp: int):
@@ -546,7 +827,7 @@ class ChannelDB(SqlDB):
             with self.lock:
                 self._nodes[node_id] = node_info
             if 'raw' in msg_payload:
-                self._db_save_node_info(node_id, msg_payload['raw'])
+                self._db_save_node_info(node_info, msg_payload['raw'])
             with self.lock:
                 for addr in node_addresses:
                     self._addresses[node_id].add((addr.host, addr.port, 0))
@@ -555,32 +836,53 @@ class ChannelDB(SqlDB):
         self.logger.debug("on_node_announcement: %d/%d"%(len(new_nodes), len(msg_payloads)))
         self.update_counts()
 
-    def get_old_policies(self, delta) -> Sequence[Tuple[bytes, ShortChannelID]]:
+    def _add_policy_timestamp(self, timestamp: int, node_id: bytes, short_channel_id: ShortChannelID) -> None:
+        # note: needs self.lock
+        heapq.heappush(self._policy_timestamps, (timestamp, node_id, short_channel_id))
+        # drop the entries of replaced policies, once they are the majority
+        if len(self._policy_timestamps) > 2 * len(self._policies) + 1000:
+            self._policy_timestamps = [(p.timestamp, node_id, scid) for (node_id, scid), p in self._policies.items()]
+            heapq.heapify(self._policy_timestamps)
+
+    def prune_old_policies(self, delta, *, max_num: int = None) -> bool:
+        """Removes policies older than delta seconds, oldest first.
+        At most max_num policies are removed; returns whether all old policies have been removed.
+        """
+        max_timestamp = int(time.time()) - delta
+        pruned = []
         with self.lock:
-            _policies = self._policies.copy()
-        now = int(time.time())
-        return list(k for k, v in _policies.items() if v.timestamp <= now - delta)
-
-    def prune_old_policies(self, delta):
-        old_policies = self.get_old_policies(delta)
-        if old_policies:
-            for key in old_policies:
-                node_id, scid = key
-                with self.lock:
-                    self._policies.pop(key)
-                self._db_delete_policy(*key)
-                self._update_num_policies_for_chan(scid)
+            while self._policy_timestamps and self._policy_timestamps[0][0] <= max_timestamp:
+                if max_num is not None and len(pruned) >= max_num:
+                    break
+                timestamp, node_id, scid = heapq.heappop(self._policy_timestamps)
+                policy = self._policies.get((node_id, scid))
+                if policy is None or policy.timestamp != timestamp:
+                    continue  # replaced or removed
+                del self._policies[(node_id, scid)]
+                self._graph.remove_policy(scid, node_id)
+                pruned.append(policy)
+            done = not self._policy_timestamps or self._policy_timestamps[0][0] > max_timestamp
+        if pruned:
+            self._db_delete_old_policies(max(p.timestamp for p in pruned), [p.key for p in pruned])
+            for policy in pruned:
+                self._update_num_policies_for_chan(policy.short_channel_id)
             self.update_counts()
-            self.logger.info(f'Deleting {len(old_policies)} old policies')
+            self.logger.info(f'Deleting {len(pruned)} old policies')
+        return done
 
-    def prune_orphaned_channels(self):
+    def prune_orphaned_channels(self, *, max_num: int = None) -> bool:
+        """Removes channels without policies.
+        At most max_num channels are removed; returns whether all of them have been removed.
+        """
         with self.lock:
-            orphaned_chans = self._chans_with_0_policies.copy()
+            orphaned_chans = list(itertools.islice(self._chans_with_0_policies, max_num))
+            done = len(orphaned_chans) == len(self._chans_with_0_policies)
         if orphaned_chans:
             for short_channel_id in orphaned_chans:
                 self.remove_channel(short_channel_id)
             self.update_counts()
             self.logger.info(f'Deleting {len(orphaned_chans)} orphaned channels')
+        return done
 
     def add_channel_update_for_private_channel(self, msg_payload: dict, start_node_id: bytes):
         if not verify_sig_for_channel_update(msg_payload, start_node_id):
@@ -596,9 +898,36 @@ class ChannelDB(SqlDB):
             if channel_info:
                 self._channels_for_node[channel_info.node1_id].remove(channel_info.short_channel_id)
                 self._channels_for_node[channel_info.node2_id].remove(channel_info.short_channel_id)
+            self._graph.remove_channel(short_channel_id)
+            history_keys = []
+            if channel_info:
+                for node_id in (channel_info.node1_id, channel_info.node2_id):
+                    if self._edge_history.pop(short_channel_id + node_id, None):
+                        history_keys.append(short_channel_id + node_id)
         self._update_num_policies_for_chan(short_channel_id)
         # delete from database
         self._db_delete_channel(short_channel_id)
+        if history_keys:
+            self._db_delete_edge_history(history_keys)
+
+    def get_edge_history(self, key: bytes) -> Optional[EdgeHistory]:
+        return self._edge_history.get(key)
+
+    def get_all_edge_history(self) -> Dict[bytes, EdgeHistory]:
+        """Returns a copy of the payment results of all channels, by key."""
+        with self.lock:
+            return self._edge_history.copy()
+
+    def save_edge_history(self, history: EdgeHistory) -> None:
+        with self.lock:
+            self._edge_history[history.key] = history
+        self._db_save_edge_history(history)
+
+    def clear_edge_history(self) -> None:
+        with self.lock:
+            keys = list(self._edge_history)
+            self._edge_history.clear()
+        self._db_delete_edge_history(keys)
 
     def get_node_addresses(self, node_id):
         return self._addresses.get(node_id)
@@ -606,9 +935,8 @@ class ChannelDB(SqlDB):
     @sql
     @profiler
     def load_data(self):
-        # Note: this method takes several seconds... mostly due to lnmsg.decode_msg being slow.
-        #       I believe lnmsg (and lightning.json) will need a rewrite anyway, so instead of tweaking
-        #       load_data() here, that should be done. see #6006
+        # note: gossip messages are only decoded for rows that lack the decoded
+        #       columns (written by older versions). Those rows are then updated.
         c = self.conn.cursor()
         c.execute("""SELECT * FROM address""")
         for x in c:
@@ -621,29 +949,81 @@ class ChannelDB(SqlDB):
             return newest_ts
         sorted_node_ids = sorted(self._addresses.keys(), key=newest_ts_for_node_id, reverse=True)
         self._recent_peers = sorted_node_ids[:self.NUM_MAX_RECENT_PEERS]
-        c.execute("""SELECT * FROM channel_info""")
-        for short_channel_id, msg in c:
-            try:
-                ci = ChannelInfo.from_raw_msg(msg)
-            except IncompatibleOrInsaneFeatures:
-                continue
-            self._channels[ShortChannelID.normalize(short_channel_id)] = ci
-        c.execute("""SELECT * FROM node_info""")
-        for node_id, msg in c:
+        undecoded_channels = []
+        c.execute("""SELECT short_channel_id, msg, node1_id, node2_id, capacity_sat FROM channel_info""")
+        for short_channel_id, msg, node1_id, node2_id, capacity_sat in c:
+            short_channel_id = ShortChannelID(short_channel_id)
+            if node1_id is None:
+                try:
+                    ci = ChannelInfo.from_raw_msg(msg)
+                except IncompatibleOrInsaneFeatures:
+                    continue
+                undecoded_channels.append(ci)
+            else:
+                ci = ChannelInfo(short_channel_id=short_channel_id, node1_id=node1_id,
+                                 node2_id=node2_id, capacity_sat=capacity_sat)
+            self._channels[short_channel_id] = ci
+        undecoded_nodes = []
+        c.execute("""SELECT node_id, msg, features, timestamp, alias FROM node_info""")
+        for node_id, msg, features, timestamp, alias in c:
             try:
-                node_info, node_addresses = NodeInfo.from_raw_msg(msg)
+                if timestamp is None:
+                    node_info, node_addresses = NodeInfo.from_raw_msg(msg)
+                    undecoded_nodes.append(node_info)
+                else:
+                    features = int.from_bytes(features, 'big')
+                    validate_features(features)
+                    node_info = NodeInfo(node_id=node_id, features=features, timestamp=timestamp, alias=alias)
             except IncompatibleOrInsaneFeatures:
                 continue
             # don't load node_addresses because they dont have timestamps
             self._nodes[node_id] = node_info
-        c.execute("""SELECT * FROM policy""")
-        for key, msg in c:
-            p = Policy.from_raw_msg(key, msg)
-            self._policies[(p.start_node, p.short_channel_id)] = p
+        undecoded_policies = []
+        c.execute("""SELECT key, msg, cltv_expiry_delta, htlc_minimum_msat, htlc_maximum_msat, fee_base_msat,
+                     fee_proportional_millionths, channel_flags, message_flags, timestamp FROM policy""")
+        for (key, msg, cltv_expiry_delta, htlc_minimum_msat, htlc_maximum_msat, fee_base_msat,
+             fee_proportional_millionths, channel_flags, message_flags, timestamp) in c:
+            if timestamp is None:
+                p = Policy.from_raw_msg(key, msg)
+                undecoded_policies.append(p)
+            else:
+                p = Policy(key=key, cltv_expiry_delta=cltv_expiry_delta, htlc_minimum_msat=htlc_minimum_msat,
+                           htlc_maximum_msat=htlc_maximum_msat, fee_base_msat=fee_base_msat,
+                           fee_proportional_millionths=fee_proportional_millionths,
+                           channel_flags=channel_flags, message_flags=message_flags, timestamp=timestamp)
+            self._policies[(key[8:], ShortChannelID(key[:8]))] = p
+        self._policy_timestamps = [(p.timestamp, node_id, scid) for (node_id, scid), p in self._policies.items()]
+        heapq.heapify(self._policy_timestamps)
+        c.execute("""SELECT key, fail_time, fail_amount_msat, success_time, success_amount_msat FROM edge_history""")
+        min_time = int(time.time()) - self.EDGE_HISTORY_MAX_AGE
+        old_history_keys = []
+        for row in c.fetchall():
+            history = EdgeHistory(*row)
+            if max(history.fail_time, history.success_time) < min_time:
+                old_history_keys.append((history.key,))
+            else:
+                self._edge_history[history.key] = history
+        c.executemany("""DELETE FROM edge_history WHERE key=?""", old_history_keys)
+        c.executemany("""UPDATE channel_info SET node1_id=?, node2_id=? WHERE short_channel_id=?""",
+                      [(ci.node1_id, ci.node2_id, ci.short_channel_id) for ci in undecoded_channels])
+        c.executemany("""UPDATE node_info SET features=?, timestamp=?, alias=? WHERE node_id=?""",
+                      [self._decoded_node_columns(ni) + [ni.node_id] for ni in undecoded_nodes])
+        c.executemany("""UPDATE policy SET cltv_expiry_delta=?, htlc_minimum_msat=?, htlc_maximum_msat=?,
+                         fee_base_msat=?, fee_proportional_millionths=?, channel_flags=?, message_flags=?,
+                         timestamp=? WHERE key=?""",
+                      [self._decoded_policy_columns(p) + [p.key] for p in undecoded_policies])
+        if undecoded_channels or undecoded_nodes or undecoded_policies:
+            self.logger.info(f'decoded {len(undecoded_channels)} channels, {len(undecoded_nodes)} nodes '
+                             f'and {len(undecoded_policies)} policies from raw messages')
         for channel_info in self._channels.values():
             self._channels_for_node[channel_info.node1_id].add(channel_info.short_channel_id)
             self._channels_for_node[channel_info.node2_id].add(channel_info.short_channel_id)
             self._update_num_policies_for_chan(channel_info.short_channel_id)
+        with self.lock:
+            for channel_info in self._channels.values():
+                self._graph.add_channel(channel_info)
+            for (node_id, short_channel_id), policy in self._policies.items():
+                self._graph.update_policy(short_channel_id, node_id, policy)
         self.logger.info(f'load data {len(self._channels)} {len(self._policies)} {len(self._channels_for_node)}')
         self.update_counts()
         (nchans_with_0p, nchans_with_1p, nchans_with_2p) = self.get_num_channels_partitioned_by_policy_count()
@@ -750,3 +1130,10 @@ class ChannelDB(SqlDB):
 
     def get_node_info_for_node_id(self, node_id: bytes) -> Optional['NodeInfo']:
         return self._nodes.get(node_id)
+
+    def get_channel_graph(self) -> ChannelGraph:
+        """Returns a snapshot of the public channel graph."""
+        if not self.data_loaded.is_set():
+            raise Exception("channelDB data not loaded yet!")
+        with self.lock:
+            return self._graph.snapshot()
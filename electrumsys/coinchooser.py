@@ -22,9 +22,10 @@
 # ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import time
 from collections import defaultdict
 from math import floor, log10
-from typing import NamedTuple, List, Callable, Sequence, Union, Dict, Tuple
+from typing import NamedTuple, List, Callable, Sequence, Union, Dict, Tuple, Optional
 from decimal import Decimal
 
 from .bitcoin import sha256, COIN, is_address
@@ -83,10 +84,20 @@ class Bucket(NamedTuple):
 
 class ScoredCandidate(NamedTuple):
     penalty: float
-    tx: PartialTransaction
+    tx: Optional[PartialTransaction]  # None if not built yet; make_tx will build it
     buckets: List[Bucket]
 
 
+class SelectionContext(NamedTuple):
+    base_tx: PartialTransaction
+    input_value: int              # value of fixed inputs. in satoshis
+    spent_amount: int             # value of fixed outputs. in satoshis
+    base_weight: int              # weight of tx with fixed inputs/outputs, no change
+    change_addrs: Sequence[str]
+    fee_estimator_w: Callable[[int], int]
+    dust_threshold: int
+
+
 def strip_unneeded(bkts: List[Bucket], sufficient_funds) -> List[Bucket]:
     '''Remove buckets that are unnecessary in achieving the spend amount'''
     if sufficient_funds([], bucket_value_sum=0):
@@ -150,8 +161,8 @@ class CoinChooserBase(Logger):
         return list(map(make_Bucket, buckets.keys(), buckets.values()))
 
     def penalty_func(self, base_tx, *,
-                     tx_from_buckets: Callable[[List[Bucket]], Tuple[PartialTransaction, List[PartialTxOutput]]]) \
-            -> Callable[[List[Bucket]], ScoredCandidate]:
+                     tx_from_buckets: Callable[[List[Bucket]], Tuple[PartialTransaction, List[PartialTxOutput]]],
+                     ctx: SelectionContext) -> Callable[[List[Bucket]], ScoredCandidate]:
         raise NotImplementedError
 
     def _change_amounts(self, tx: PartialTransaction, count: int, fee_estimator_numchange) -> List[int]:
@@ -286,6 +297,56 @@ class CoinChooserBase(Logger):
         utxos = [c.prevout.serialize_to_network() for c in coins]
         self.p = PRNG(b''.join(sorted(utxos)))
 
+        all_buckets = self._spendable_buckets(coins, fee_estimator_vb=fee_estimator_vb)
+        tx, _ = self._make_tx_from_buckets(all_buckets, inputs=inputs, outputs=outputs,
+                                           change_addrs=change_addrs,
+                                           fee_estimator_vb=fee_estimator_vb,
+                                           dust_threshold=dust_threshold)
+        return tx
+
+    def make_batch(self, *, coins: Sequence[PartialTxInput],
+                   outputs_list: Sequence[List[PartialTxOutput]],
+                   change_addrs_list: Sequence[Sequence[str]],
+                   fee_estimator_vb: Callable, dust_threshold: int) -> List[PartialTransaction]:
+        """Like make_tx, but builds one transaction for each list of outputs
+        in outputs_list, with the change addresses at the same index in
+        change_addrs_list. The coins are bucketized once for the whole batch,
+        and the buckets selected for a transaction are reserved, so that no
+        coin is spent by two transactions of the batch.
+        Raises NotEnoughFunds if the coins left over by the previous
+        transactions cannot pay for one of the output lists.
+        """
+        assert all(outputs_list), 'tx outputs cannot be empty'
+        assert len(change_addrs_list) == len(outputs_list)
+
+        utxos = [c.prevout.serialize_to_network() for c in coins]
+        self.p = PRNG(b''.join(sorted(utxos)))
+
+        buckets = self._spendable_buckets(coins, fee_estimator_vb=fee_estimator_vb)
+        txs = []
+        for outputs, change_addrs in zip(outputs_list, change_addrs_list):
+            tx, chosen = self._make_tx_from_buckets(buckets, inputs=[], outputs=outputs,
+                                                    change_addrs=change_addrs,
+                                                    fee_estimator_vb=fee_estimator_vb,
+                                                    dust_threshold=dust_threshold)
+            chosen = set(bucket.desc for bucket in chosen)
+            buckets = [bucket for bucket in buckets if bucket.desc not in chosen]
+            txs.append(tx)
+        return txs
+
+    def _spendable_buckets(self, coins: Sequence[PartialTxInput], *, fee_estimator_vb) -> List[Bucket]:
+        # Collect the coins into buckets
+        all_buckets = self.bucketize_coins(coins, fee_estimator_vb=fee_estimator_vb)
+        # Filter some buckets out. Only keep those that have positive effective value.
+        # Note that this filtering is intentionally done on the bucket level
+        # instead of per-coin, as each bucket should be either fully spent or not at all.
+        # (e.g. CoinChooserPrivacy ensures that same-address coins go into one bucket)
+        return list(filter(lambda b: b.effective_value > 0, all_buckets))
+
+    def _make_tx_from_buckets(self, all_buckets: List[Bucket], *, inputs: List[PartialTxInput],
+                              outputs: List[PartialTxOutput], change_addrs: Sequence[str],
+                              fee_estimator_vb: Callable,
+                              dust_threshold: int) -> Tuple[PartialTransaction, List[Bucket]]:
         # Copy the outputs so when adding change we don't modify "outputs"
         base_tx = PartialTransaction.from_io(inputs[:], outputs[:])
         input_value = base_tx.input_value()
@@ -301,6 +362,14 @@ class CoinChooserBase(Logger):
         def fee_estimator_w(weight):
             return fee_estimator_vb(Transaction.virtual_size_from_weight(weight))
 
+        ctx = SelectionContext(base_tx=base_tx,
+                               input_value=input_value,
+                               spent_amount=spent_amount,
+                               base_weight=base_weight,
+                               change_addrs=change_addrs,
+                               fee_estimator_w=fee_estimator_w,
+                               dust_threshold=dust_threshold)
+
         def sufficient_funds(buckets, *, bucket_value_sum):
             '''Given a list of buckets, return True if it has enough
             value to pay for the transaction'''
@@ -321,26 +390,23 @@ class CoinChooserBase(Logger):
                                                             dust_threshold=dust_threshold,
                                                             base_weight=base_weight)
 
-        # Collect the coins into buckets
-        all_buckets = self.bucketize_coins(coins, fee_estimator_vb=fee_estimator_vb)
-        # Filter some buckets out. Only keep those that have positive effective value.
-        # Note that this filtering is intentionally done on the bucket level
-        # instead of per-coin, as each bucket should be either fully spent or not at all.
-        # (e.g. CoinChooserPrivacy ensures that same-address coins go into one bucket)
-        all_buckets = list(filter(lambda b: b.effective_value > 0, all_buckets))
         # Choose a subset of the buckets
         scored_candidate = self.choose_buckets(all_buckets, sufficient_funds,
-                                               self.penalty_func(base_tx, tx_from_buckets=tx_from_buckets))
+                                               self.penalty_func(base_tx, tx_from_buckets=tx_from_buckets, ctx=ctx),
+                                               ctx=ctx)
         tx = scored_candidate.tx
+        if tx is None:
+            tx, _ = tx_from_buckets(scored_candidate.buckets)
 
         self.logger.info(f"using {len(tx.inputs())} inputs")
         self.logger.info(f"using buckets: {[bucket.desc for bucket in scored_candidate.buckets]}")
 
-        return tx
+        return tx, scored_candidate.buckets
 
     def choose_buckets(self, buckets: List[Bucket],
                        sufficient_funds: Callable,
-                       penalty_func: Callable[[List[Bucket]], ScoredCandidate]) -> ScoredCandidate:
+                       penalty_func: Callable[[List[Bucket]], ScoredCandidate], *,
+                       ctx: SelectionContext) -> ScoredCandidate:
         raise NotImplemented('To be subclassed')
 
 
@@ -423,7 +489,7 @@ class CoinChooserRandom(CoinChooserBase):
         candidates = [(already_selected_buckets + c) for c in candidates]
         return [strip_unneeded(c, sufficient_funds) for c in candidates]
 
-    def choose_buckets(self, buckets, sufficient_funds, penalty_func):
+    def choose_buckets(self, buckets, sufficient_funds, penalty_func, *, ctx):
         candidates = self.bucket_candidates_prefer_confirmed(buckets, sufficient_funds)
         scored_candidates = [penalty_func(cand) for cand in candidates]
         winner = min(scored_candidates, key=lambda x: x.penalty)
@@ -447,34 +513,183 @@ class CoinChooserPrivacy(CoinChooserRandom):
     def keys(self, coins):
         return [coin.scriptpubkey.hex() for coin in coins]
 
-    def penalty_func(self, base_tx, *, tx_from_buckets):
+    @classmethod
+    def _badness(cls, num_buckets: int, change: int, *, min_change, max_change) -> float:
+        # Penalize using many buckets (~inputs)
+        badness = num_buckets - 1
+        # Penalize change not roughly in output range
+        if change == 0:
+            pass  # no change is great!
+        elif change < min_change:
+            badness += (min_change - change) / (min_change + 10000)
+            # Penalize really small change; under 1 mSYS ~= using 1 more input
+            if change < COIN / 1000:
+                badness += 1
+        elif change > max_change:
+            badness += (change - max_change) / (max_change + 10000)
+            # Penalize large change; 5 SYS excess ~= using 1 more input
+            badness += change / (COIN * 5)
+        return badness
+
+    def penalty_func(self, base_tx, *, tx_from_buckets, ctx):
         min_change = min(o.value for o in base_tx.outputs()) * 0.75
         max_change = max(o.value for o in base_tx.outputs()) * 1.33
 
         def penalty(buckets: List[Bucket]) -> ScoredCandidate:
-            # Penalize using many buckets (~inputs)
-            badness = len(buckets) - 1
             tx, change_outputs = tx_from_buckets(buckets)
             change = sum(o.value for o in change_outputs)
-            # Penalize change not roughly in output range
-            if change == 0:
-                pass  # no change is great!
-            elif change < min_change:
-                badness += (min_change - change) / (min_change + 10000)
-                # Penalize really small change; under 1 mSYS ~= using 1 more input
-                if change < COIN / 1000:
-                    badness += 1
-            elif change > max_change:
-                badness += (change - max_change) / (max_change + 10000)
-                # Penalize large change; 5 SYS excess ~= using 1 more input
-                badness += change / (COIN * 5)
+            badness = self._badness(len(buckets), change, min_change=min_change, max_change=max_change)
             return ScoredCandidate(badness, tx, buckets)
 
         return penalty
 
 
+class CoinChooserBranchAndBound(CoinChooserPrivacy):
+    """Tries to avoid creating change at all.
+    Coins are grouped per address as with the Privacy chooser. A
+    branch-and-bound search looks for a set of coins whose value, after
+    fees, matches the amount sent closely enough that a change output
+    would be dust, preferring confirmed coins. If none is found within
+    the search budget, it falls back to the Privacy heuristic.
+    """
+
+    bnb_max_tries = 100_000
+    bnb_time_budget = 0.5  # seconds
+
+    def _change_output_weight(self, ctx: SelectionContext, buckets: Sequence[Bucket]) -> int:
+        if ctx.change_addrs:
+            addr = ctx.change_addrs[0]
+        else:
+            # mirrors _construct_tx_from_selected_buckets
+            inputs = ctx.base_tx.inputs() or [coin for b in buckets for coin in b.coins]
+            if not inputs:
+                return 0
+            addr = inputs[0].address
+        return 4 * Transaction.estimated_output_size(addr)
+
+    def _excess(self, ctx: SelectionContext, buckets: Sequence[Bucket], *, with_change_weight: int = 0) -> int:
+        """Value left over for change (or extra fee) when spending buckets."""
+        tx_weight = self._get_tx_weight(buckets, base_weight=ctx.base_weight)
+        total_input = ctx.input_value + sum(bucket.value for bucket in buckets)
+        return total_input - ctx.spent_amount - ctx.fee_estimator_w(tx_weight + with_change_weight)
+
+    def _is_changeless(self, ctx: SelectionContext, buckets: Sequence[Bucket]) -> bool:
+        if self._excess(ctx, buckets) < 0:
+            return False
+        change_weight = self._change_output_weight(ctx, buckets)
+        return self._excess(ctx, buckets, with_change_weight=change_weight) < ctx.dust_threshold
+
+    def penalty_func(self, base_tx, *, tx_from_buckets, ctx):
+        min_change = min(o.value for o in base_tx.outputs()) * 0.75
+        max_change = max(o.value for o in base_tx.outputs()) * 1.33
+
+        def penalty(buckets: List[Bucket]) -> ScoredCandidate:
+            # estimate change arithmetically instead of building the tx.
+            # this ignores the split into several change outputs and rounding.
+            change_weight = self._change_output_weight(ctx, buckets)
+            change = max(0, self._excess(ctx, buckets, with_change_weight=change_weight))
+            if change < ctx.dust_threshold:
+                change = 0
+            badness = self._badness(len(buckets), change, min_change=min_change, max_change=max_change)
+            return ScoredCandidate(badness, None, buckets)
+
+        return penalty
+
+    def _bnb_search(self, ctx: SelectionContext, buckets: List[Bucket], *, target: int,
+                    cost_of_change: int, deadline: float) -> Optional[List[Bucket]]:
+        """Depth-first search over include/exclude decisions, largest effective
+        value first, for selections whose effective value lies in
+        [target, target + cost_of_change]. Returns the one with the least
+        waste (fees paid for the inputs plus excess given up), or None.
+        """
+        buckets = sorted(buckets, key=lambda b: b.effective_value, reverse=True)
+        values = [b.effective_value for b in buckets]
+        fees = [b.value - b.effective_value for b in buckets]
+        curr_available = sum(values)
+        if curr_available < target:
+            return None
+        upper_bound = target + cost_of_change
+        curr_value = 0
+        curr_fee = 0
+        curr_selection = []  # type: List[int]
+        best_selection = None
+        best_waste = None
+        index = 0
+        for tries in range(self.bnb_max_tries):
+            if tries % 1000 == 0 and time.monotonic() > deadline:
+                break
+            backtrack = False
+            if (curr_value + curr_available < target
+                    or curr_value > upper_bound
+                    or (best_waste is not None and curr_fee > best_waste)):
+                backtrack = True
+            elif curr_value >= target:
+                waste = curr_fee + curr_value - target
+                if best_waste is None or waste < best_waste:
+                    # the arithmetic bounds are an approximation; check the real tx weight
+                    selection = [buckets[i] for i in curr_selection]
+                    if self._is_changeless(ctx, selection):
+                        best_selection = list(curr_selection)
+                        best_waste = waste
+                        if waste == 0:
+                            break
+                backtrack = True
+            if backtrack:
+                if not curr_selection:
+                    break  # search space exhausted
+                # add omitted buckets back to lookahead, then try excluding the last included one
+                index -= 1
+                while index > curr_selection[-1]:
+                    curr_available += values[index]
+                    index -= 1
+                curr_value -= values[index]
+                curr_fee -= fees[index]
+                curr_selection.pop()
+            else:
+                curr_available -= values[index]
+                # skip inclusion branch if the previous, equivalent bucket was excluded
+                if (not curr_selection
+                        or index - 1 == curr_selection[-1]
+                        or values[index] != values[index - 1]
+                        or fees[index] != fees[index - 1]):
+                    curr_selection.append(index)
+                    curr_value += values[index]
+                    curr_fee += fees[index]
+            index += 1
+        if best_selection is None:
+            return None
+        return [buckets[i] for i in best_selection]
+
+    def choose_buckets(self, buckets, sufficient_funds, penalty_func, *, ctx):
+        if buckets:
+            change_weight = self._change_output_weight(ctx, buckets)
+            # effective values already account for the fee of each bucket
+            target = ctx.spent_amount - ctx.input_value + ctx.fee_estimator_w(ctx.base_weight)
+            cost_of_change = (ctx.fee_estimator_w(ctx.base_weight + change_weight)
+                              - ctx.fee_estimator_w(ctx.base_weight)
+                              + ctx.dust_threshold)
+            deadline = time.monotonic() + self.bnb_time_budget
+            # prefer confirmed coins, as bucket_candidates_prefer_confirmed does
+            pools = [[b for b in buckets if b.min_height > 0],
+                     [b for b in buckets if b.min_height >= 0],
+                     buckets]
+            prev_pool_size = None
+            for pool in pools:
+                if len(pool) == prev_pool_size:
+                    continue
+                prev_pool_size = len(pool)
+                selection = self._bnb_search(ctx, pool, target=target, cost_of_change=cost_of_change,
+                                             deadline=deadline)
+                if selection is not None:
+                    self.logger.info(f"branch-and-bound found changeless solution "
+                                     f"with {len(selection)} buckets")
+                    return penalty_func(selection)
+        return super().choose_buckets(buckets, sufficient_funds, penalty_func, ctx=ctx)
+
+
 COIN_CHOOSERS = {
     'Privacy': CoinChooserPrivacy,
+    'Changeless': CoinChooserBranchAndBound,
 }
 
 def get_name(config):
@@ -637,6 +637,36 @@ class Commands:
             locktime=locktime)
         return tx.serialize()
 
+    @command('w')
+    async def paytomanybatch(self, payouts, fee=None, feerate=None, from_addr=None, from_coins=None, change_addr=None,
+                             nocheck=False, rbf=None, locktime=None, wallet: Abstract_Wallet = None):
+        """Create a batch of unsigned multi-output transactions, one per list of outputs.
+        No coin is spent by more than one transaction of the batch. """
+        self.nocheck = nocheck
+        tx_fee = satoshis(fee)
+        domain_addr = from_addr.split(',') if from_addr else None
+        domain_coins = from_coins.split(',') if from_coins else None
+        change_addr = self._resolver(change_addr, wallet)
+        domain_addr = None if domain_addr is None else map(self._resolver, domain_addr, repeat(wallet))
+        outputs_list = []
+        for outputs in payouts:
+            final_outputs = []
+            for address, amount in outputs:
+                address = self._resolver(address, wallet)
+                amount_sat = satoshis(amount)
+                final_outputs.append(PartialTxOutput.from_address_and_value(address, amount_sat))
+            outputs_list.append(final_outputs)
+        txs = wallet.create_unsigned_transactions(
+            outputs_list,
+            fee=tx_fee,
+            feerate=feerate,
+            change_addr=change_addr,
+            domain_addr=domain_addr,
+            domain_coins=domain_coins,
+            rbf=rbf,
+            locktime=locktime)
+        return [tx.serialize() for tx in txs]
+
     @command('w')
     async def onchain_history(self, year=None, show_addresses=False, show_fiat=False, wallet: Abstract_Wallet = None):
         """Wallet onchain history. Returns the transaction history of your wallet."""
@@ -1062,7 +1092,7 @@ class Commands:
 
     @command('n')
     async def clear_ln_blacklist(self):
-        self.network.path_finder.blacklist.clear()
+        self.network.path_finder.mission_control.clear()
 
     @command('w')
     async def list_invoices(self, wallet: Abstract_Wallet = None):
@@ -1127,6 +1157,7 @@ param_descriptions = {
     'amount': 'Amount to be sent (in SYS). Type \'!\' to send the maximum available.',
     'requested_amount': 'Requested amount (in SYS).',
     'outputs': 'list of ["address", amount]',
+    'payouts': 'list of transactions, each a list of ["address", amount]',
     'redeem_script': 'redeem script (hexadecimal)',
 }
 
@@ -1194,6 +1225,7 @@ arg_types = {
     'jsontx': json_loads,
     'inputs': json_loads,
     'outputs': json_loads,
+    'payouts': json_loads,
     'fee': lambda x: str(Decimal(x)) if x is not None else None,
     'amount': lambda x: str(Decimal(x)) if x != '!' else '!',
     'locktime': int,
@@ -43,7 +43,7 @@ from jsonrpcserver import response
 from jsonrpcclient.clients.aiohttp_client import AiohttpClient
 from aiorpcx import TaskGroup
 
-from . import util
+from . import util, ecc
 from .network import Network
 from .util import (json_decode, to_bytes, to_string, profiler, standardize_path, constant_time_compare)
 from .util import PR_PAID, PR_EXPIRED, get_request_status
@@ -533,6 +533,7 @@ class Daemon(Logger):
             fut.result(timeout=2)
         except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError, asyncio.CancelledError):
             pass
+        ecc.shutdown_signature_executor()
         self.logger.info("removing lockfile")
         remove_lockfile(get_lockfile(self.config))
         self.logger.info("stopped")
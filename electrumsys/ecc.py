@@ -26,7 +26,10 @@
 import base64
 import hashlib
 import functools
-from typing import Union, Tuple, Optional
+import os
+import threading
+import concurrent.futures
+from typing import Union, Tuple, Optional, Sequence, List, Dict
 from ctypes import (
     byref, c_byte, c_int, c_uint, c_char_p, c_size_t, c_void_p, create_string_buffer,
     CFUNCTYPE, POINTER, cast
@@ -365,6 +368,82 @@ def verify_signature(pubkey: bytes, sig: bytes, h: bytes) -> bool:
         return False
     return True
 
+
+# libsecp256k1 releases the GIL while signing and verifying, so large batches are
+# split across threads. All of them share one small pool, created when first needed,
+# and shut down with shutdown_signature_executor() when the daemon stops.
+MAX_SIGNATURE_THREADS = 8
+_signature_executor = None  # type: Optional[concurrent.futures.Executor]
+_signature_executor_lock = threading.Lock()
+_MIN_BATCH_SIZE_PER_THREAD = 64
+
+
+def num_signature_threads() -> int:
+    return min(os.cpu_count() or 1, MAX_SIGNATURE_THREADS)
+
+
+def get_signature_executor() -> concurrent.futures.Executor:
+    global _signature_executor
+    with _signature_executor_lock:
+        if _signature_executor is None:
+            _signature_executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_signature_threads(),
+                                                                        thread_name_prefix='secp256k1')
+        return _signature_executor
+
+
+def shutdown_signature_executor() -> None:
+    global _signature_executor
+    with _signature_executor_lock:
+        executor, _signature_executor = _signature_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _verify_signatures_chunk(items: Sequence[Tuple[bytes, bytes, bytes]]) -> List[bool]:
+    # buffers are allocated once per chunk, and each distinct pubkey is parsed only once
+    sig = create_string_buffer(64)
+    parsed_pubkeys = {}  # type: Dict[bytes, Optional[bytes]]
+    ctx = _libsecp256k1.ctx
+    results = []
+    for pubkey, sig_string, msg_hash in items:
+        try:
+            if len(sig_string) != 64 or len(msg_hash) != 32:
+                results.append(False)
+                continue
+            if isinstance(pubkey, bytearray):
+                pubkey = bytes(pubkey)
+            pubkey_ptr = parsed_pubkeys.get(pubkey, b'')
+            if pubkey_ptr == b'':
+                pubkey_ptr = create_string_buffer(64)
+                if not _libsecp256k1.secp256k1_ec_pubkey_parse(ctx, pubkey_ptr, pubkey, len(pubkey)):
+                    pubkey_ptr = None
+                parsed_pubkeys[pubkey] = pubkey_ptr
+            if (pubkey_ptr is None
+                    or not _libsecp256k1.secp256k1_ecdsa_signature_parse_compact(ctx, sig, sig_string)):
+                results.append(False)
+                continue
+            _libsecp256k1.secp256k1_ecdsa_signature_normalize(ctx, sig, sig)
+            results.append(1 == _libsecp256k1.secp256k1_ecdsa_verify(ctx, sig, msg_hash, pubkey_ptr))
+        except Exception:
+            results.append(False)
+    return results
+
+
+def verify_signatures(items: Sequence[Tuple[bytes, bytes, bytes]]) -> List[bool]:
+    """Batch version of verify_signature.
+    items are (pubkey, sig_string, msg_hash) triples; returns one bool per item, in order.
+    """
+    items = list(items)
+    num_threads = min(num_signature_threads(), len(items) // _MIN_BATCH_SIZE_PER_THREAD)
+    if num_threads < 2:
+        return _verify_signatures_chunk(items)
+    chunk_size = -(-len(items) // num_threads)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    results = []
+    for chunk_results in get_signature_executor().map(_verify_signatures_chunk, chunks):
+        results.extend(chunk_results)
+    return results
+
 def verify_message_with_address(address: str, sig65: bytes, message: bytes, *, net=None):
     from .bitcoin import pubkey_to_address
     assert_bytes(sig65, message)
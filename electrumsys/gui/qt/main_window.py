@@ -2364,8 +2364,8 @@ class ElectrumSysWindow(QMainWindow, MessageBoxMixin, Logger):
             return
         if not self.network.is_lightning_running():
             return
-        cur, total = self.network.lngossip.get_sync_progress_estimate()
-        # self.logger.debug(f"updating lngossip sync progress estimate: cur={cur}, total={total}")
+        cur, total, rate = self.network.lngossip.get_sync_progress_estimate()
+        # self.logger.debug(f"updating lngossip sync progress estimate: cur={cur}, total={total}, rate={rate}")
         progress_percent = 0
         progress_str = "??%"
         if cur is not None and total is not None and total > 0:
@@ -2383,8 +2383,11 @@ class ElectrumSysWindow(QMainWindow, MessageBoxMixin, Logger):
         else:
             self.lightning_button.setMaximumWidth(25 + 4 * char_width_in_lineedit())
             self.lightning_button.setText(progress_str)
-            self.lightning_button.setToolTip(_("The Lightning Network graph is syncing...\n"
-                                               "Payments are more likely to succeed with a more complete graph."))
+            tooltip = _("The Lightning Network graph is syncing...\n"
+                        "Payments are more likely to succeed with a more complete graph.")
+            if rate:
+                tooltip += "\n" + _("Receiving {} channels per second.").format(round(rate))
+            self.lightning_button.setToolTip(tooltip)
 
     def update_lock_icon(self):
         icon = read_QIcon("lock.png") if self.wallet.has_password() else read_QIcon("unlock.png")
@@ -2848,14 +2851,20 @@ class ElectrumSysWindow(QMainWindow, MessageBoxMixin, Logger):
                                         TRANSACTION_FILE_EXTENSION_FILTER_ANY)
         if not fileName:
             return
+        from electrumsys.transaction import tx_from_fd
         try:
-            with open(fileName, "rb") as f:
-                file_content = f.read()  # type: Union[str, bytes]
+            f = open(fileName, "rb")
         except (ValueError, IOError, os.error) as reason:
             self.show_critical(_("ElectrumSys was unable to open your transaction file") + "\n" + str(reason),
                                title=_("Unable to read file or no transaction found"))
             return
-        return self.tx_from_text(file_content)
+        with f:
+            # binary PSBTs are parsed while the file is read
+            try:
+                return tx_from_fd(f)
+            except BaseException as e:
+                self.show_critical(_("ElectrumSys was unable to parse your transaction") + ":\n" + repr(e))
+                return
 
     def do_process_from_text(self):
         text = text_dialog(self, _('Input raw transaction'), _("Transaction:"), _("Load transaction"))
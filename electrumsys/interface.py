@@ -29,7 +29,7 @@ import sys
 import traceback
 import asyncio
 import socket
-from typing import Tuple, Union, List, TYPE_CHECKING, Optional, Set, NamedTuple
+from typing import Tuple, Union, List, TYPE_CHECKING, Optional, Set, NamedTuple, Sequence
 from collections import defaultdict
 from ipaddress import IPv4Network, IPv6Network, ip_address, IPv6Address, IPv4Address
 import itertools
@@ -161,6 +161,35 @@ class NotificationSession(RPCSession):
             self.cache[key] = result
         await queue.put(params + [result])
 
+    async def subscribe_many(self, method: str, params_list: Sequence[List], queue: asyncio.Queue):
+        """Like subscribe, for several params. The requests that are not
+        cached are sent together, in a single JSON-RPC batch.
+        """
+        to_request = []
+        for params in params_list:
+            key = self.get_hashable_key_for_rpc_call(method, params)
+            self.subscriptions[key].append(queue)
+            if key in self.cache:
+                await queue.put(params + [self.cache[key]])
+            else:
+                to_request.append(params)
+        if not to_request:
+            return
+        msg_id = next(self._msg_counter)
+        self.maybe_log(f"<-- batch of {len(to_request)} {method} (id: {msg_id})")
+        try:
+            async with self.send_batch() as batch:
+                for params in to_request:
+                    batch.add_request(method, params)
+        except (TaskTimeout, asyncio.TimeoutError) as e:
+            raise RequestTimedOut(f'request timed out: batch of {len(to_request)} {method} (id: {msg_id})') from e
+        self.maybe_log(f"--> batch of {len(batch.results)} results (id: {msg_id})")
+        for params, result in zip(to_request, batch.results):
+            if isinstance(result, Exception):
+                raise result
+            self.cache[self.get_hashable_key_for_rpc_call(method, params)] = result
+            await queue.put(params + [result])
+
     def unsubscribe(self, queue):
         """Unsubscribe a callback to free object references to enable GC."""
         # note: we can't unsubscribe from the server, so we keep receiving
@@ -27,8 +27,9 @@
 from unicodedata import normalize
 import hashlib
 import re
+import threading
+from collections import OrderedDict
 from typing import Tuple, TYPE_CHECKING, Union, Sequence, Optional, Dict, List, NamedTuple
-from functools import lru_cache
 from abc import ABC, abstractmethod
 
 from . import bitcoin, ecc, constants, bip32
@@ -52,6 +53,54 @@ if TYPE_CHECKING:
     from .wallet_db import WalletDB
 
 
+class DerivationCache:
+    """LRU cache of derived child pubkeys, shared by all keystores.
+
+    Entries are keyed by (master public key, for_change, n). The cache is bounded
+    by the approximate number of bytes it holds, as pubkeys can be either
+    compressed (bip32) or uncompressed (old keystores).
+    """
+
+    ENTRY_OVERHEAD = 200  # rough cost of the key tuple and dict slot, in bytes
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # type: OrderedDict[Tuple[str, int, int], bytes]
+        self._size = 0
+
+    def get(self, mpk: str, for_change: int, n: int) -> Optional[bytes]:
+        key = (mpk, for_change, n)
+        with self._lock:
+            pubkey = self._entries.get(key)
+            if pubkey is not None:
+                self._entries.move_to_end(key)
+            return pubkey
+
+    def put(self, mpk: str, for_change: int, n: int, pubkey: bytes) -> None:
+        key = (mpk, for_change, n)
+        with self._lock:
+            old_pubkey = self._entries.pop(key, None)
+            if old_pubkey is not None:
+                self._size -= len(old_pubkey) + self.ENTRY_OVERHEAD
+            self._entries[key] = pubkey
+            self._size += len(pubkey) + self.ENTRY_OVERHEAD
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted) + self.ENTRY_OVERHEAD
+
+    def get_size(self) -> int:
+        return self._size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+derivation_cache = DerivationCache(max_bytes=16 * 1024 * 1024)
+
+
 class KeyStore(Logger, ABC):
     type: str
 
@@ -353,9 +402,29 @@ class MasterPublicKeyMixin(ABC):
         pass
 
     @abstractmethod
-    def derive_pubkey(self, for_change: int, n: int) -> bytes:
+    def _derive_pubkey_uncached(self, for_change: int, n: int) -> bytes:
         pass
 
+    def derive_pubkey(self, for_change: int, n: int) -> bytes:
+        for_change = int(for_change)
+        assert for_change in (0, 1)
+        mpk = self.get_master_public_key()
+        pubkey = derivation_cache.get(mpk, for_change, n)
+        if pubkey is None:
+            pubkey = self._derive_pubkey_uncached(for_change, n)
+            derivation_cache.put(mpk, for_change, n, pubkey)
+        return pubkey
+
+    def derive_pubkeys(self, for_change: int, start: int, count: int) -> Sequence[bytes]:
+        """Returns the pubkeys at indices start..start+count-1 of the given branch."""
+        return [self.derive_pubkey(for_change, n) for n in range(start, start + count)]
+
+    def add_derived_pubkeys_to_cache(self, for_change: int, start: int, pubkeys: Sequence[bytes]) -> None:
+        """Seeds the derivation cache with previously derived (e.g. persisted) pubkeys."""
+        mpk = self.get_master_public_key()
+        for n, pubkey in enumerate(pubkeys, start=start):
+            derivation_cache.put(mpk, for_change, n, pubkey)
+
     def get_pubkey_derivation(self, pubkey: bytes,
                               txinout: Union['PartialTxInput', 'PartialTxOutput'],
                               *, only_der_suffix=True) \
@@ -399,9 +468,8 @@ class Xpub(MasterPublicKeyMixin):
 
     def __init__(self, *, derivation_prefix: str = None, root_fingerprint: str = None):
         self.xpub = None
-        self.xpub_receive = None
-        self.xpub_change = None
         self._xpub_bip32_node = None  # type: Optional[BIP32Node]
+        self._branch_bip32_nodes = {}  # type: Dict[int, BIP32Node]  # for_change -> node at m/for_change
 
         # "key origin" info (subclass should persist these):
         self._derivation_prefix = derivation_prefix  # type: Optional[str]
@@ -483,19 +551,17 @@ class Xpub(MasterPublicKeyMixin):
             self._derivation_prefix = derivation_prefix
         self.is_requesting_to_be_rewritten_to_wallet_file = True
 
-    @lru_cache(maxsize=None)
-    def derive_pubkey(self, for_change: int, n: int) -> bytes:
-        for_change = int(for_change)
-        assert for_change in (0, 1)
-        xpub = self.xpub_change if for_change else self.xpub_receive
-        if xpub is None:
+    def _get_bip32_node_for_branch(self, for_change: int) -> BIP32Node:
+        node = self._branch_bip32_nodes.get(for_change)
+        if node is None:
             rootnode = self.get_bip32_node_for_xpub()
-            xpub = rootnode.subkey_at_public_derivation((for_change,)).to_xpub()
-            if for_change:
-                self.xpub_change = xpub
-            else:
-                self.xpub_receive = xpub
-        return self.get_pubkey_from_xpub(xpub, (n,))
+            node = rootnode.subkey_at_public_derivation((for_change,))
+            self._branch_bip32_nodes[for_change] = node
+        return node
+
+    def _derive_pubkey_uncached(self, for_change: int, n: int) -> bytes:
+        node = self._get_bip32_node_for_branch(for_change).subkey_at_public_derivation((n,))
+        return node.eckey.get_public_key_bytes(compressed=True)
 
     @classmethod
     def get_pubkey_from_xpub(self, xpub: str, sequence) -> bytes:
@@ -648,10 +714,7 @@ class Old_KeyStore(MasterPublicKeyMixin, Deterministic_KeyStore):
         public_key = master_public_key + z*ecc.GENERATOR
         return public_key.get_public_key_bytes(compressed=False)
 
-    @lru_cache(maxsize=None)
-    def derive_pubkey(self, for_change, n) -> bytes:
-        for_change = int(for_change)
-        assert for_change in (0, 1)
+    def _derive_pubkey_uncached(self, for_change, n) -> bytes:
         return self.get_pubkey_from_mpk(self.mpk, for_change, n)
 
     def _get_private_key_from_stretched_exponent(self, for_change, n, secexp):
@@ -1,6 +1,7 @@
 import os
 import csv
 import io
+import struct
 from typing import Callable, Tuple, Any, Dict, List, Sequence, Union, Optional
 from collections import OrderedDict
 
@@ -280,6 +281,92 @@ def _parse_msgtype_intvalue_for_onion_wire(value: str) -> int:
     return msg_type_int
 
 
+# Sizes of the field types that have a fixed size, and the struct format
+# of those that are decoded as ints. Other types (tu16, varint, ...) are
+# read and written by _read_field and _write_field.
+_FIXED_FIELD_TYPE_LEN = {
+    'byte': 1, 'u8': 1, 'u16': 2, 'u32': 4, 'u64': 8,
+    'chain_hash': 32, 'channel_id': 32, 'sha256': 32,
+    'signature': 64, 'point': 33, 'short_channel_id': 8,
+}
+_INT_FIELD_STRUCT_FORMAT = {'u8': 'B', 'u16': 'H', 'u32': 'I', 'u64': 'Q'}
+
+# Steps of compiled message schemes, see _compile_msg_scheme.
+_STEP_FIXED = 0      # decode: (op, struct.Struct, field_names). encode: (op, field_name, total_len, int_ok, optional)
+_STEP_OPTIONAL = 1   # decode only: (op, struct.Struct, field_name)
+_STEP_COUNTED = 2    # (op, field_name, type_len, count_field_name, is_byte, optional)
+_STEP_TLVS = 3       # (op, tlv_stream_name)
+_STEP_GENERIC = 4    # (op, row)
+
+
+def _compile_msg_scheme(scheme: List[Sequence[str]]) -> Tuple[list, list]:
+    """Compiles the msgdata rows of a message scheme into a decoder and
+    an encoder table, interpreted by LNSerializer.decode_msg and encode_msg.
+    Consecutive mandatory fields with a fixed size are decoded with one
+    struct.Struct. Rows that do not fit the other steps are handled like
+    the CSV rows themselves, with _read_field and _write_field.
+    """
+    decoder = []
+    encoder = []
+    fixed_formats = []  # type: List[str]
+    fixed_names = []  # type: List[str]
+
+    def flush_fixed():
+        if fixed_names:
+            decoder.append((_STEP_FIXED, struct.Struct('>' + ''.join(fixed_formats)), tuple(fixed_names)))
+            fixed_formats.clear()
+            fixed_names.clear()
+
+    for row in scheme:
+        if row[0] == "msgtype":
+            continue
+        if row[0] != "msgdata":
+            raise Exception(f"unexpected row in scheme: {row!r}")
+        # msgdata,<msgname>,<fieldname>,<typename>,[<count>][,<option>]
+        field_name = row[2]
+        field_type = row[3]
+        field_count_str = row[4]
+        optional = len(row) > 5
+        if field_count_str == "":
+            field_count = 1
+        else:
+            try:
+                field_count = int(field_count_str)
+            except ValueError:
+                field_count = field_count_str
+        type_len = _FIXED_FIELD_TYPE_LEN.get(field_type)
+        if field_name == "tlvs":
+            flush_fixed()
+            decoder.append((_STEP_TLVS, field_type))
+            encoder.append((_STEP_TLVS, field_type))
+        elif type_len is not None and isinstance(field_count, int) and field_count >= 0 \
+                and (field_count <= 1 or field_type not in _INT_FIELD_STRUCT_FORMAT):
+            if field_count == 1 and field_type in _INT_FIELD_STRUCT_FORMAT:
+                fmt = _INT_FIELD_STRUCT_FORMAT[field_type]
+            else:
+                fmt = f'{field_count * type_len}s'
+            if optional:
+                flush_fixed()
+                decoder.append((_STEP_OPTIONAL, struct.Struct('>' + fmt), field_name))
+            else:
+                fixed_formats.append(fmt)
+                fixed_names.append(field_name)
+            int_ok = field_count == 1 or field_type == 'byte'
+            encoder.append((_STEP_FIXED, field_name, field_count * type_len, int_ok, optional))
+        elif type_len is not None and isinstance(field_count, str) and field_count != "..." \
+                and field_type not in _INT_FIELD_STRUCT_FORMAT:
+            flush_fixed()
+            step = (_STEP_COUNTED, field_name, type_len, field_count, field_type == 'byte', optional)
+            decoder.append(step)
+            encoder.append(step)
+        else:
+            flush_fixed()
+            decoder.append((_STEP_GENERIC, row))
+            encoder.append((_STEP_GENERIC, row))
+    flush_fixed()
+    return decoder, encoder
+
+
 class LNSerializer:
 
     def __init__(self, *, for_onion_wire: bool = False):
@@ -342,6 +429,12 @@ class LNSerializer:
                     self.in_tlv_stream_get_tlv_record_scheme_from_type[tlv_stream_name][tlv_record_type].append(tuple(row))
                 else:
                     pass  # TODO
+        self._msg_decoder_from_type = {}  # type: Dict[bytes, list]
+        self._msg_encoder_from_type = {}  # type: Dict[bytes, list]
+        for msg_type_bytes, scheme in self.msg_scheme_from_type.items():
+            decoder, encoder = _compile_msg_scheme(scheme)
+            self._msg_decoder_from_type[msg_type_bytes] = decoder
+            self._msg_encoder_from_type[msg_type_bytes] = encoder
 
     def write_tlv_stream(self, *, fd: io.BytesIO, tlv_stream_name: str, **kwargs) -> None:
         scheme_map = self.in_tlv_stream_get_tlv_record_scheme_from_type[tlv_stream_name]
@@ -423,42 +516,68 @@ class LNSerializer:
         Encode kwargs into a Lightning message (bytes)
         of the type given in the msg_type string
         """
-        #print(f">>> encode_msg. msg_type={msg_type}, payload={kwargs!r}")
         msg_type_bytes = self.msg_type_from_name[msg_type]
-        scheme = self.msg_scheme_from_type[msg_type_bytes]
-        with io.BytesIO() as fd:
-            fd.write(msg_type_bytes)
-            for row in scheme:
-                if row[0] == "msgtype":
-                    pass
-                elif row[0] == "msgdata":
-                    # msgdata,<msgname>,<fieldname>,<typename>,[<count>][,<option>]
-                    field_name = row[2]
-                    field_type = row[3]
-                    field_count_str = row[4]
-                    #print(f">>> encode_msg. msgdata. field_name={field_name!r}. field_type={field_type!r}. field_count_str={field_count_str!r}")
-                    field_count = _resolve_field_count(field_count_str, vars_dict=kwargs)
-                    if field_name == "tlvs":
-                        tlv_stream_name = field_type
-                        if tlv_stream_name in kwargs:
-                            self.write_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name, **(kwargs[tlv_stream_name]))
-                        continue
-                    try:
-                        field_value = kwargs[field_name]
-                    except KeyError:
-                        if len(row) > 5:
-                            break  # optional feature field not present
-                        else:
-                            field_value = 0  # default mandatory fields to zero
-                    #print(f">>> encode_msg. writing field: {field_name}. value={field_value!r}. field_type={field_type!r}. count={field_count!r}")
-                    _write_field(fd=fd,
-                                 field_type=field_type,
-                                 count=field_count,
-                                 value=field_value)
-                    #print(f">>> encode_msg. so far: {fd.getvalue().hex()}")
-                else:
-                    raise Exception(f"unexpected row in scheme: {row!r}")
-            return fd.getvalue()
+        encoder = self._msg_encoder_from_type[msg_type_bytes]
+        parts = [msg_type_bytes]
+        for step in encoder:
+            op = step[0]
+            if op == _STEP_FIXED:
+                _, field_name, total_len, int_ok, optional = step
+                try:
+                    field_value = kwargs[field_name]
+                except KeyError:
+                    if optional:
+                        break  # optional feature field not present
+                    field_value = 0  # default mandatory fields to zero
+                if total_len == 0:
+                    continue
+                if int_ok and isinstance(field_value, int):
+                    field_value = field_value.to_bytes(total_len, byteorder="big", signed=False)
+                if not isinstance(field_value, (bytes, bytearray)):
+                    raise Exception(f"can only write bytes into fd. got: {field_value!r}")
+                if total_len != len(field_value):
+                    raise UnexpectedFieldSizeForEncoder(f"expected: {total_len}, got {len(field_value)}")
+                parts.append(field_value)
+            elif op == _STEP_COUNTED:
+                _, field_name, type_len, count_field_name, is_byte, optional = step
+                field_count = _resolve_field_count(count_field_name, vars_dict=kwargs)
+                assert field_count >= 0, f"{field_count!r} must be non-neg int"
+                try:
+                    field_value = kwargs[field_name]
+                except KeyError:
+                    if optional:
+                        break  # optional feature field not present
+                    field_value = 0  # default mandatory fields to zero
+                if field_count == 0:
+                    continue
+                total_len = field_count * type_len
+                if isinstance(field_value, int) and (field_count == 1 or is_byte):
+                    field_value = field_value.to_bytes(total_len, byteorder="big", signed=False)
+                if not isinstance(field_value, (bytes, bytearray)):
+                    raise Exception(f"can only write bytes into fd. got: {field_value!r}")
+                if total_len != len(field_value):
+                    raise UnexpectedFieldSizeForEncoder(f"expected: {total_len}, got {len(field_value)}")
+                parts.append(field_value)
+            elif op == _STEP_TLVS:
+                tlv_stream_name = step[1]
+                if tlv_stream_name in kwargs:
+                    with io.BytesIO() as fd:
+                        self.write_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name, **(kwargs[tlv_stream_name]))
+                        parts.append(fd.getvalue())
+            else:
+                row = step[1]
+                field_name = row[2]
+                field_count = _resolve_field_count(row[4], vars_dict=kwargs)
+                try:
+                    field_value = kwargs[field_name]
+                except KeyError:
+                    if len(row) > 5:
+                        break  # optional feature field not present
+                    field_value = 0  # default mandatory fields to zero
+                with io.BytesIO() as fd:
+                    _write_field(fd=fd, field_type=row[3], count=field_count, value=field_value)
+                    parts.append(fd.getvalue())
+        return b"".join(parts)
 
     def decode_msg(self, data: bytes) -> Tuple[str, dict]:
         """
@@ -467,41 +586,57 @@ class LNSerializer:
 
         Returns message type string and parsed message contents dict
         """
-        #print(f"decode_msg >>> {data.hex()}")
         assert len(data) >= 2
+        data = bytes(data)
         msg_type_bytes = data[:2]
         msg_type_int = int.from_bytes(msg_type_bytes, byteorder="big", signed=False)
         scheme = self.msg_scheme_from_type[msg_type_bytes]
         assert scheme[0][2] == msg_type_int
         msg_type_name = scheme[0][1]
+        decoder = self._msg_decoder_from_type[msg_type_bytes]
         parsed = {}
-        with io.BytesIO(data[2:]) as fd:
-            for row in scheme:
-                #print(f"row: {row!r}")
-                if row[0] == "msgtype":
-                    pass
-                elif row[0] == "msgdata":
-                    field_name = row[2]
-                    field_type = row[3]
-                    field_count_str = row[4]
-                    field_count = _resolve_field_count(field_count_str, vars_dict=parsed)
-                    if field_name == "tlvs":
-                        tlv_stream_name = field_type
-                        d = self.read_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name)
-                        parsed[tlv_stream_name] = d
-                        continue
-                    #print(f">> count={field_count}. parsed={parsed}")
+        offset = 2
+        end = len(data)
+        for step in decoder:
+            op = step[0]
+            if op == _STEP_FIXED:
+                _, fields_struct, field_names = step
+                if offset + fields_struct.size > end:
+                    raise UnexpectedEndOfStream()
+                parsed.update(zip(field_names, fields_struct.unpack_from(data, offset)))
+                offset += fields_struct.size
+            elif op == _STEP_OPTIONAL:
+                _, field_struct, field_name = step
+                if offset + field_struct.size > end:
+                    break  # optional feature field not present
+                parsed[field_name] = field_struct.unpack_from(data, offset)[0]
+                offset += field_struct.size
+            elif op == _STEP_COUNTED:
+                _, field_name, type_len, count_field_name, is_byte, optional = step
+                total_len = _resolve_field_count(count_field_name, vars_dict=parsed) * type_len
+                if offset + total_len > end:
+                    if optional:
+                        break  # optional feature field not present
+                    raise UnexpectedEndOfStream()
+                parsed[field_name] = data[offset:offset + total_len]
+                offset += total_len
+            elif op == _STEP_TLVS:
+                tlv_stream_name = step[1]
+                with io.BytesIO(data[offset:]) as fd:
+                    parsed[tlv_stream_name] = self.read_tlv_stream(fd=fd, tlv_stream_name=tlv_stream_name)
+                offset = end
+            else:
+                row = step[1]
+                field_count = _resolve_field_count(row[4], vars_dict=parsed)
+                with io.BytesIO(data) as fd:
+                    fd.seek(offset)
                     try:
-                        parsed[field_name] = _read_field(fd=fd,
-                                                         field_type=field_type,
-                                                         count=field_count)
-                    except UnexpectedEndOfStream as e:
+                        parsed[row[2]] = _read_field(fd=fd, field_type=row[3], count=field_count)
+                    except UnexpectedEndOfStream:
                         if len(row) > 5:
                             break  # optional feature field not present
-                        else:
-                            raise
-                else:
-                    raise Exception(f"unexpected row in scheme: {row!r}")
+                        raise
+                    offset = fd.tell()
         return msg_type_name, parsed
 
 
@@ -17,6 +17,7 @@ import sys
 from datetime import datetime
 
 import aiorpcx
+from aiorpcx import run_in_thread
 
 from .crypto import sha256, sha256d
 from . import bitcoin, util
@@ -49,6 +50,7 @@ from .lntransport import LNTransport, LNTransportBase
 from .lnmsg import encode_msg, decode_msg
 from .interface import GracefulDisconnect, NetworkException
 from .lnrouter import fee_for_edge_msat
+from .lnverifier import verify_sigs_for_gossip
 from .lnutil import ln_dummy_address
 from .json_db import StoredDict
 
@@ -59,6 +61,8 @@ if TYPE_CHECKING:
 
 
 LN_P2P_NETWORK_TIMEOUT = 20
+# the reply to a query_short_channel_ids can be thousands of messages
+LN_GOSSIP_QUERY_TIMEOUT = 120
 
 
 class Peer(Logger):
@@ -300,20 +304,36 @@ class Peer(Logger):
                     raise Exception('unknown message')
                 if self.gossip_queue.empty():
                     break
+            # drop messages that we already got from other peers
+            sync_scheduler = self.network.lngossip.sync_scheduler
+            chan_anns = sync_scheduler.remove_seen(chan_anns)
+            node_anns = sync_scheduler.remove_seen(node_anns)
+            chan_upds = sync_scheduler.remove_seen(chan_upds)
             self.logger.debug(f'process_gossip {len(chan_anns)} {len(node_anns)} {len(chan_upds)}')
+            # verify signatures in a worker thread, so that we do not block the event loop
+            if not await run_in_thread(partial(verify_sigs_for_gossip, chan_anns, node_anns)):
+                raise Exception('signature failed')
             # note: data processed in chunks to avoid taking sql lock for too long
             # channel announcements
             for chan_anns_chunk in chunks(chan_anns, 300):
-                self.verify_channel_announcements(chan_anns_chunk)
                 self.channel_db.add_channel_announcement(chan_anns_chunk)
+            sync_scheduler.add_seen(
+                payload for payload in chan_anns
+                if self.channel_db.get_channel_info(ShortChannelID(payload['short_channel_id'])))
             # node announcements
             for node_anns_chunk in chunks(node_anns, 100):
-                self.verify_node_announcements(node_anns_chunk)
                 self.channel_db.add_node_announcement(node_anns_chunk)
+            def is_node_stored(payload):
+                node_info = self.channel_db.get_node_info_for_node_id(payload['node_id'])
+                return node_info is not None and node_info.timestamp >= payload['timestamp']
+            sync_scheduler.add_seen(filter(is_node_stored, node_anns))
             # channel updates
             for chan_upds_chunk in chunks(chan_upds, 1000):
                 categorized_chan_upds = self.channel_db.add_channel_updates(
                     chan_upds_chunk, max_age=self.network.lngossip.max_age)
+                # orphaned updates may be for channels that we are about to query
+                sync_scheduler.add_seen(categorized_chan_upds.expired + categorized_chan_upds.deprecated
+                                        + categorized_chan_upds.unchanged + categorized_chan_upds.good)
                 orphaned = categorized_chan_upds.orphaned
                 if orphaned:
                     self.logger.info(f'adding {len(orphaned)} unknown channel ids')
@@ -330,23 +350,6 @@ class Peer(Logger):
                 if categorized_chan_upds.good:
                     self.logger.debug(f'on_channel_update: {len(categorized_chan_upds.good)}/{len(chan_upds_chunk)}')
 
-    def verify_channel_announcements(self, chan_anns):
-        for payload in chan_anns:
-            h = sha256d(payload['raw'][2+256:])
-            pubkeys = [payload['node_id_1'], payload['node_id_2'], payload['bitcoin_key_1'], payload['bitcoin_key_2']]
-            sigs = [payload['node_signature_1'], payload['node_signature_2'], payload['bitcoin_signature_1'], payload['bitcoin_signature_2']]
-            for pubkey, sig in zip(pubkeys, sigs):
-                if not ecc.verify_signature(pubkey, sig, h):
-                    raise Exception('signature failed')
-
-    def verify_node_announcements(self, node_anns):
-        for payload in node_anns:
-            pubkey = payload['node_id']
-            signature = payload['signature']
-            h = sha256d(payload['raw'][66:])
-            if not ecc.verify_signature(pubkey, signature, h):
-                raise Exception('signature failed')
-
     async def query_gossip(self):
         try:
             await asyncio.wait_for(self.initialized, LN_P2P_NETWORK_TIMEOUT)
@@ -360,11 +363,15 @@ class Peer(Logger):
             self.logger.info('Received {} channel ids. (complete: {})'.format(len(ids), complete))
             await self.lnworker.add_new_ids(ids)
             while True:
-                todo = self.lnworker.get_ids_to_query()
+                todo = self.lnworker.get_ids_to_query(self.pubkey)
                 if not todo:
-                    await asyncio.sleep(1)
+                    await self.lnworker.sync_scheduler.wait_for_ids()
                     continue
-                await self.get_short_channel_ids(todo)
+                try:
+                    await asyncio.wait_for(self.get_short_channel_ids(todo), LN_GOSSIP_QUERY_TIMEOUT)
+                except asyncio.TimeoutError as e:
+                    raise GracefulDisconnect("query_short_channel_ids timed out") from e
+                self.lnworker.on_ids_queried(self.pubkey)
 
     async def get_channel_range(self):
         first_block = constants.net.BLOCK_HEIGHT_FIRST_LIGHTNING_CHANNELS
@@ -23,17 +23,20 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import queue
+import heapq
 from collections import defaultdict
+import concurrent.futures
 from typing import Sequence, List, Tuple, Optional, Dict, NamedTuple, TYPE_CHECKING, Set
+import threading
 import time
 import attr
 
+from .i18n import _
 from .util import bh2u, profiler
 from .logging import Logger
 from .lnutil import (NUM_MAX_EDGES_IN_PAYMENT_PATH, ShortChannelID, LnFeatures,
-                     NBLOCK_CLTV_EXPIRY_TOO_FAR_INTO_FUTURE)
-from .channel_db import ChannelDB, Policy, NodeInfo
+                     NBLOCK_CLTV_EXPIRY_TOO_FAR_INTO_FUTURE, PaymentFailure)
+from .channel_db import ChannelDB, Policy, NodeInfo, ChannelGraph, EdgeHistory
 
 if TYPE_CHECKING:
     from .lnchannel import Channel
@@ -48,6 +51,11 @@ class NoChannelPolicy(Exception):
 class LNPathInconsistent(Exception): pass
 
 
+class PathFindingTimeout(PaymentFailure):
+    def __str__(self):
+        return _('Path finding took too long')
+
+
 def fee_for_edge_msat(forwarded_amount_msat: int, fee_base_msat: int, fee_proportional_millionths: int) -> int:
     return fee_base_msat \
            + (forwarded_amount_msat * fee_proportional_millionths // 1_000_000)
@@ -86,14 +94,9 @@ class RouteEdge(PathEdge):
                          node_features=node_info.features if node_info else 0)
 
     def is_sane_to_use(self, amount_msat: int) -> bool:
-        # TODO revise ad-hoc heuristics
-        # cltv cannot be more than 2 weeks
-        if self.cltv_expiry_delta > 14 * 144:
-            return False
-        total_fee = self.fee_for_edge(amount_msat)
-        if not is_fee_sane(total_fee, payment_amount_msat=amount_msat):
-            return False
-        return True
+        return is_edge_sane_to_use(fee_msat=self.fee_for_edge(amount_msat),
+                                   cltv_expiry_delta=self.cltv_expiry_delta,
+                                   amount_msat=amount_msat)
 
     def has_feature_varonion(self) -> bool:
         features = self.node_features
@@ -125,6 +128,16 @@ def is_route_sane_to_use(route: LNPaymentRoute, invoice_amount_msat: int, min_fi
     return True
 
 
+def is_edge_sane_to_use(*, fee_msat: int, cltv_expiry_delta: int, amount_msat: int) -> bool:
+    # TODO revise ad-hoc heuristics
+    # cltv cannot be more than 2 weeks
+    if cltv_expiry_delta > 14 * 144:
+        return False
+    if not is_fee_sane(fee_msat, payment_amount_msat=amount_msat):
+        return False
+    return True
+
+
 def is_fee_sane(fee_msat: int, *, payment_amount_msat: int) -> bool:
     # fees <= 5 sat are fine
     if fee_msat <= 5_000:
@@ -135,24 +148,225 @@ def is_fee_sane(fee_msat: int, *, payment_amount_msat: int) -> bool:
     return False
 
 
-BLACKLIST_DURATION = 3600
+class _PathSearch:
+    """State of a path search on a snapshot of the channel graph.
+    Nodes are numbered as in the graph; nodes that are not in the graph
+    (e.g. our own node, if all our channels are private) get numbers
+    after the graph nodes.
+    Our own channels (my_channels) are not in the graph, or carry private
+    state (e.g. balances), so they are explored separately.
+    """
+
+    # the searches check their deadline after expanding this many nodes
+    CHECK_INTERVAL = 256
+
+    def __init__(self, graph: ChannelGraph, nodeA: bytes, nodeB: bytes, invoice_amount_msat: int, *,
+                 my_channels: Dict[ShortChannelID, 'Channel'],
+                 deadline: float = None, cancel_event: threading.Event = None):
+        self.graph = graph
+        self.my_channels = my_channels
+        self.deadline = deadline  # in time.monotonic() time
+        self.cancel_event = cancel_event
+        self.invoice_amount_msat = invoice_amount_msat
+        self._extra_node_ids = []  # type: List[bytes]
+        self._extra_node_index = {}  # type: Dict[bytes, int]
+        self.my_channels_for_node = defaultdict(list)  # type: Dict[int, List[ShortChannelID]]
+        self.skipped_channels = set()  # type: Set[int]  # graph channels not to explore
+        for short_channel_id, chan in my_channels.items():
+            self.my_channels_for_node[self.node_index(chan.node_id)].append(short_channel_id)
+            self.my_channels_for_node[self.node_index(chan.get_local_pubkey())].append(short_channel_id)
+            c = graph.channel_index.get(short_channel_id)
+            if c is not None:
+                self.skipped_channels.add(c)
+        self.node_a = self.node_index(nodeA)
+        self.node_b = self.node_index(nodeB)
+        # results of the reverse search from nodeB
+        num_nodes = graph.num_nodes + len(self._extra_node_ids)
+        self.distance = [float('inf')] * num_nodes  # type: List[float]
+        self.amount_msat = [None] * num_nodes  # type: List[Optional[int]]
+        self.amount_msat[self.node_b] = invoice_amount_msat
+        self.settled = bytearray(num_nodes)
+        self.prev_edge = {}  # type: Dict[int, Tuple[int, ShortChannelID]]
+        # results of past payments, by graph slot (see MissionControl)
+        self.edge_history = {}  # type: Dict[int, EdgeHistory]
+        self.now = int(time.time())
+
+    def check_deadline(self) -> None:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise concurrent.futures.CancelledError()
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise PathFindingTimeout()
+
+    def node_index(self, node_id: bytes) -> int:
+        n = self.graph.node_index.get(node_id)
+        if n is None:
+            n = self._extra_node_index.get(node_id)
+            if n is None:
+                n = self.graph.num_nodes + len(self._extra_node_ids)
+                self._extra_node_ids.append(node_id)
+                self._extra_node_index[node_id] = n
+        return n
+
+    def node_id(self, n: int) -> bytes:
+        if n < self.graph.num_nodes:
+            return self.graph.node_ids[n]
+        return self._extra_node_ids[n - self.graph.num_nodes]
+
+    def get_shortest_path(self) -> Optional[LNPaymentPath]:
+        if self.node_a not in self.prev_edge:
+            return None  # no path found
+        # backtrack from search_end (nodeA) to search_start (nodeB)
+        # FIXME paths cannot be longer than 20 edges (onion packet)...
+        edge_startnode = self.node_a
+        path = []
+        while edge_startnode != self.node_b:
+            edge_endnode, short_channel_id = self.prev_edge[edge_startnode]
+            path += [PathEdge(node_id=self.node_id(edge_endnode), short_channel_id=short_channel_id)]
+            edge_startnode = edge_endnode
+        return path
+
 
-class LNPathFinder(Logger):
+class MissionControl(Logger):
+    """Learns from the results of past payments how likely a channel is to
+    forward a payment of a given amount, in each direction.
+
+    A failure makes amounts at least as large unlikely to go through, and a
+    success makes amounts at most as large likely to. As channel balances
+    change, results lose weight over time, and probabilities go back to the
+    a priori one. Results are stored in the ChannelDB (see EdgeHistory).
+    Our own channels are not tracked, as we know their balances.
+    """
+
+    # probability that a channel we know nothing about forwards a payment
+    APRIORI_PROBABILITY = 0.6
+    # probability that a channel forwards an amount that it just forwarded
+    SUCCESS_PROBABILITY = 0.95
+    # results lose half of their weight in this time (seconds)
+    HALF_LIFE = 3600
+    # channels less likely than this to forward a payment are not used
+    MIN_PROBABILITY = 0.01
+    # cost of a failed payment attempt: a base in msat, plus a proportion
+    # of the amount, in millionths
+    ATTEMPT_COST_MSAT = 100_000
+    ATTEMPT_COST_MILLIONTHS = 1000
 
     def __init__(self, channel_db: ChannelDB):
         Logger.__init__(self)
         self.channel_db = channel_db
-        self.blacklist = dict() # short_chan_id -> timestamp
 
-    def add_to_blacklist(self, short_channel_id: ShortChannelID):
-        self.logger.info(f'blacklisting channel {short_channel_id}')
+    def _get_history(self, short_channel_id: ShortChannelID, start_node: bytes) -> EdgeHistory:
+        key = short_channel_id + start_node
+        return self.channel_db.get_edge_history(key) or EdgeHistory(key, 0, 0, 0, 0)
+
+    def report_success(self, short_channel_id: ShortChannelID, start_node: bytes, amount_msat: int, *,
+                       now: int = None) -> None:
+        """start_node forwarded amount_msat through short_channel_id."""
+        now = int(time.time()) if now is None else now
+        history = self._get_history(short_channel_id, start_node)
+        amount_msat = max(amount_msat, history.success_amount_msat)
+        history = history._replace(success_time=now, success_amount_msat=amount_msat)
+        if history.fail_amount_msat <= amount_msat:
+            history = history._replace(fail_time=0, fail_amount_msat=0)
+        self.channel_db.save_edge_history(history)
+
+    def report_failure(self, short_channel_id: ShortChannelID, start_node: bytes, amount_msat: int, *,
+                       now: int = None) -> None:
+        """start_node could not forward amount_msat through short_channel_id.
+        An amount of 0 means that the failure does not depend on the amount.
+        """
+        self.logger.info(f'payment of {amount_msat} msat failed on channel {short_channel_id}')
+        now = int(time.time()) if now is None else now
+        history = self._get_history(short_channel_id, start_node)
+        history = history._replace(fail_time=now, fail_amount_msat=amount_msat)
+        if history.success_amount_msat >= amount_msat:
+            history = history._replace(success_time=0, success_amount_msat=0)
+        self.channel_db.save_edge_history(history)
+
+    def report_route(self, route: 'LNPaymentRoute', amount_msat: int, *, sender_idx: int = None,
+                     channel_failed: bool = False, failure_depends_on_amount: bool = True) -> None:
+        """Reports the result of a payment of amount_msat along route.
+        If sender_idx is None, the payment reached its destination.
+        Otherwise the node of route[sender_idx] returned an error: the edges
+        up to it forwarded the payment, and if channel_failed, the next one
+        did not.
+        """
+        # amounts forwarded through each edge, as in is_route_sane_to_use
+        amounts = [amount_msat]
+        for route_edge in reversed(route[1:]):
+            amounts.append(amounts[-1] + route_edge.fee_for_edge(amounts[-1]))
+        amounts.reverse()
+        num_forwarded = len(route) if sender_idx is None else sender_idx + 1
         now = int(time.time())
-        self.blacklist[short_channel_id] = now
+        # the first edge is one of our own channels
+        for i in range(1, min(num_forwarded, len(route))):
+            self.report_success(route[i].short_channel_id, route[i - 1].node_id, amounts[i], now=now)
+        if channel_failed and num_forwarded < len(route):
+            i = num_forwarded
+            self.report_failure(route[i].short_channel_id, route[i - 1].node_id,
+                                amounts[i] if failure_depends_on_amount else 0, now=now)
+
+    def clear(self) -> None:
+        self.channel_db.clear_edge_history()
+
+    def get_history_for_graph(self, graph: ChannelGraph) -> Dict[int, EdgeHistory]:
+        """Returns the results of past payments through the channels of graph, by slot."""
+        history_for_slot = {}
+        for history in self.channel_db.get_all_edge_history().values():
+            slot = graph.get_slot(history.short_channel_id, history.start_node)
+            if slot is not None:
+                history_for_slot[slot] = history
+        return history_for_slot
+
+    def get_probability(self, history: Optional[EdgeHistory], amount_msat: int, now: int) -> float:
+        """Probability that the channel forwards amount_msat."""
+        probability = self.APRIORI_PROBABILITY
+        if history is None:
+            return probability
+        if history.success_time and amount_msat <= history.success_amount_msat:
+            weight = 0.5 ** (max(now - history.success_time, 0) / self.HALF_LIFE)
+            probability += (self.SUCCESS_PROBABILITY - probability) * weight
+        elif history.fail_time:
+            weight = 0.5 ** (max(now - history.fail_time, 0) / self.HALF_LIFE)
+            if amount_msat < history.fail_amount_msat:
+                # the balance is somewhere below the failed amount, and above
+                # the amount that went through, if any
+                min_amount_msat = history.success_amount_msat if history.success_time else 0
+                weight *= (amount_msat - min_amount_msat) / (history.fail_amount_msat - min_amount_msat)
+            probability *= 1 - weight
+        return probability
+
+    def get_attempt_cost(self, amount_msat: int) -> float:
+        return self.ATTEMPT_COST_MSAT + amount_msat * self.ATTEMPT_COST_MILLIONTHS / 1_000_000
+
+    def edge_cost(self, history: Optional[EdgeHistory], amount_msat: int, now: int) -> float:
+        """Cost of the failed attempts it takes on average to get amount_msat
+        through the channel, given its history (None if it has none).
+        """
+        probability = self.get_probability(history, amount_msat, now)
+        if probability < self.MIN_PROBABILITY:
+            return float('inf')
+        return self.get_attempt_cost(amount_msat) * (1 / probability - 1)
 
-    def is_blacklisted(self, short_channel_id: ShortChannelID) -> bool:
-        now = int(time.time())
-        t = self.blacklist.get(short_channel_id, 0)
-        return now - t < BLACKLIST_DURATION
+    def is_edge_usable(self, short_channel_id: ShortChannelID, start_node: bytes, amount_msat: int, *,
+                       now: int = None) -> bool:
+        """Whether start_node is likely enough to forward amount_msat through
+        short_channel_id to try it. For edges that are not in the channel
+        graph, such as the ones of invoice routing hints."""
+        now = int(time.time()) if now is None else now
+        history = self.channel_db.get_edge_history(short_channel_id + start_node)
+        return self.get_probability(history, amount_msat, now) >= self.MIN_PROBABILITY
+
+
+class LNPathFinder(Logger):
+
+    def __init__(self, channel_db: ChannelDB):
+        Logger.__init__(self)
+        self.channel_db = channel_db
+        self.mission_control = MissionControl(channel_db)
+        # searches run one at a time, off the event loop; a search that
+        # was given up on stops at its next deadline check
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                              thread_name_prefix='pathfinding')
 
     def _edge_cost(self, short_channel_id: bytes, start_node: bytes, end_node: bytes,
                    payment_amt_msat: int, ignore_costs=False, is_mine=False, *,
@@ -180,10 +394,21 @@ class LNPathFinder(Logger):
         if channel_policy.htlc_maximum_msat is not None and \
                 payment_amt_msat > channel_policy.htlc_maximum_msat:
             return float('inf'), 0  # payment amount too large
-        node_info = self.channel_db.get_node_info_for_node_id(node_id=end_node)
-        route_edge = RouteEdge.from_channel_policy(channel_policy, short_channel_id, end_node,
-                                                   node_info=node_info)
-        if not route_edge.is_sane_to_use(payment_amt_msat):
+        return self._edge_cost_for_policy(fee_base_msat=channel_policy.fee_base_msat,
+                                          fee_proportional_millionths=channel_policy.fee_proportional_millionths,
+                                          cltv_expiry_delta=channel_policy.cltv_expiry_delta,
+                                          payment_amt_msat=payment_amt_msat,
+                                          ignore_costs=ignore_costs)
+
+    @staticmethod
+    def _edge_cost_for_policy(*, fee_base_msat: int, fee_proportional_millionths: int,
+                              cltv_expiry_delta: int, payment_amt_msat: int,
+                              ignore_costs: bool) -> Tuple[float, int]:
+        fee_msat = fee_for_edge_msat(forwarded_amount_msat=payment_amt_msat,
+                                     fee_base_msat=fee_base_msat,
+                                     fee_proportional_millionths=fee_proportional_millionths)
+        if not is_edge_sane_to_use(fee_msat=fee_msat, cltv_expiry_delta=cltv_expiry_delta,
+                                   amount_msat=payment_amt_msat):
             return float('inf'), 0  # thanks but no thanks
 
         # Distance metric notes:  # TODO constants are ad-hoc
@@ -195,100 +420,346 @@ class LNPathFinder(Logger):
         base_cost = 500  # one more edge ~ paying 500 msat more fees
         if ignore_costs:
             return base_cost, 0
-        fee_msat = route_edge.fee_for_edge(payment_amt_msat)
-        cltv_cost = route_edge.cltv_expiry_delta * payment_amt_msat * 15 / 1_000_000_000
+        cltv_cost = cltv_expiry_delta * payment_amt_msat * 15 / 1_000_000_000
         overall_cost = base_cost + fee_msat + cltv_cost
         return overall_cost, fee_msat
 
-    def get_distances(self, nodeA: bytes, nodeB: bytes,
-                      invoice_amount_msat: int, *,
-                      my_channels: Dict[ShortChannelID, 'Channel'] = None
-                      ) -> Dict[bytes, PathEdge]:
-        # note: we don't lock self.channel_db, so while the path finding runs,
-        #       the underlying graph could potentially change... (not good but maybe ~OK?)
-
-        # run Dijkstra
+    def _graph_edge_cost(self, graph: ChannelGraph, edge: int, payment_amt_msat: int,
+                         ignore_costs: bool) -> Tuple[float, int]:
+        """Like _edge_cost, for the channel of the graph slot 'edge', in the
+        direction that uses the policy in that slot.
+        """
+        if graph.policy_flags[edge] != ChannelGraph.POLICY_KNOWN:
+            return float('inf'), 0  # no policy, or channel disabled
+        # channels that did not publish both policies often return temporary channel failure
+        if not graph.policy_flags[edge ^ 1] & ChannelGraph.POLICY_KNOWN:
+            return float('inf'), 0
+        if payment_amt_msat < graph.htlc_minimum_msat[edge]:
+            return float('inf'), 0  # payment amount too little
+        if 0 <= graph.capacity_sat[edge >> 1] < payment_amt_msat // 1000:
+            return float('inf'), 0  # payment amount too large
+        if payment_amt_msat > graph.htlc_maximum_msat[edge]:
+            return float('inf'), 0  # payment amount too large
+        return self._edge_cost_for_policy(fee_base_msat=graph.fee_base_msat[edge],
+                                          fee_proportional_millionths=graph.fee_proportional_millionths[edge],
+                                          cltv_expiry_delta=graph.cltv_expiry_delta[edge],
+                                          payment_amt_msat=payment_amt_msat,
+                                          ignore_costs=ignore_costs)
+
+    def _run_dijkstra(self, search: '_PathSearch') -> None:
+        """Runs Dijkstra from search.node_b until search.node_a is reached,
+        and stores the distances, amounts and tree of the search in 'search'.
+        """
+        graph = search.graph
+        nodeA = search.node_id(search.node_a)
+        my_channels = search.my_channels
+        end = search.node_a
         # The search is run in the REVERSE direction, from nodeB to nodeA,
         # to properly calculate compound routing fees.
-        distance_from_start = defaultdict(lambda: float('inf'))
-        distance_from_start[nodeB] = 0
-        prev_node = {}  # type: Dict[bytes, PathEdge]
-        nodes_to_explore = queue.PriorityQueue()
-        nodes_to_explore.put((0, invoice_amount_msat, nodeB))  # order of fields (in tuple) matters!
-
+        distance_from_start = search.distance
+        amount_at_node = search.amount_msat
+        settled = search.settled
+        prev_edge = search.prev_edge
+        distance_from_start[search.node_b] = 0
+        nodes_to_explore = [(0, search.invoice_amount_msat, search.node_b)]  # order of fields (in tuple) matters!
+
+        num_graph_nodes = graph.num_nodes
+        adjacency_start = graph.adjacency_start
+        adjacent_slots = graph.adjacent_slots
+        slot_node = graph.slot_node
+        short_channel_ids = graph.short_channel_ids
+        skipped_channels = search.skipped_channels
+        graph_edge_cost = self._graph_edge_cost
+        edge_history = search.edge_history
+        history_cost = self.mission_control.edge_cost
+        now = search.now
+        # the cost of edges without history only depends on the amount
+        apriori_cost_factor = 1 / self.mission_control.APRIORI_PROBABILITY - 1
+        get_attempt_cost = self.mission_control.get_attempt_cost
+
+        check_interval = search.CHECK_INTERVAL
+        num_expanded = 0
 
         # main loop of search
-        while nodes_to_explore.qsize() > 0:
-            dist_to_edge_endnode, amount_msat, edge_endnode = nodes_to_explore.get()
-            if edge_endnode == nodeA:
-                break
+        while nodes_to_explore:
+            dist_to_edge_endnode, amount_msat, edge_endnode = heapq.heappop(nodes_to_explore)
             if dist_to_edge_endnode != distance_from_start[edge_endnode]:
-                # queue.PriorityQueue does not implement decrease_priority,
+                # heapq does not implement decrease_priority,
                 # so instead of decreasing priorities, we add items again into the queue.
                 # so there are duplicates in the queue, that we discard now:
                 continue
-            for edge_channel_id in self.channel_db.get_channels_for_node(edge_endnode, my_channels=my_channels):
-                assert isinstance(edge_channel_id, bytes)
-                if self.is_blacklisted(edge_channel_id):
-                    continue
+            num_expanded += 1
+            if num_expanded % check_interval == 0:
+                search.check_deadline()
+            settled[edge_endnode] = 1
+            if edge_endnode == end:
+                break
+            edges = []  # type: List[Tuple[int, ShortChannelID, float, int]]
+            if edge_endnode < num_graph_nodes:
+                apriori_cost = get_attempt_cost(amount_msat) * apriori_cost_factor
+                for slot in adjacent_slots[adjacency_start[edge_endnode]:adjacency_start[edge_endnode + 1]]:
+                    c = slot >> 1
+                    if c in skipped_channels:
+                        continue
+                    # the edge goes from the other end of the channel to edge_endnode,
+                    # and its policy is the one set by the other end
+                    edge = slot ^ 1
+                    edge_startnode = slot_node[edge]
+                    if distance_from_start[edge_startnode] <= dist_to_edge_endnode:
+                        continue  # already explored; edge costs are positive
+                    edge_cost, fee_for_edge_msat = graph_edge_cost(graph, edge, amount_msat,
+                                                                   edge_startnode == end)
+                    if edge in edge_history:
+                        edge_cost += history_cost(edge_history[edge], amount_msat, now)
+                    else:
+                        edge_cost += apriori_cost
+                    edges.append((edge_startnode, short_channel_ids[c], edge_cost, fee_for_edge_msat))
+            for edge_channel_id in search.my_channels_for_node.get(edge_endnode, ()):
+                endnode_id = search.node_id(edge_endnode)
                 channel_info = self.channel_db.get_channel_info(edge_channel_id, my_channels=my_channels)
-                edge_startnode = channel_info.node2_id if channel_info.node1_id == edge_endnode else channel_info.node1_id
-                is_mine = edge_channel_id in my_channels
-                if is_mine:
-                    if edge_startnode == nodeA:  # payment outgoing, on our channel
-                        if not my_channels[edge_channel_id].can_pay(amount_msat, check_frozen=True):
-                            continue
-                    else:  # payment incoming, on our channel. (funny business, cycle weirdness)
-                        assert edge_endnode == nodeA, (bh2u(edge_startnode), bh2u(edge_endnode))
-                        if not my_channels[edge_channel_id].can_receive(amount_msat, check_frozen=True):
-                            continue
+                startnode_id = channel_info.node2_id if channel_info.node1_id == endnode_id else channel_info.node1_id
+                if startnode_id == nodeA:  # payment outgoing, on our channel
+                    if not my_channels[edge_channel_id].can_pay(amount_msat, check_frozen=True):
+                        continue
+                else:  # payment incoming, on our channel. (funny business, cycle weirdness)
+                    assert endnode_id == nodeA, (bh2u(startnode_id), bh2u(endnode_id))
+                    if not my_channels[edge_channel_id].can_receive(amount_msat, check_frozen=True):
+                        continue
                 edge_cost, fee_for_edge_msat = self._edge_cost(
                     edge_channel_id,
-                    start_node=edge_startnode,
-                    end_node=edge_endnode,
+                    start_node=startnode_id,
+                    end_node=endnode_id,
                     payment_amt_msat=amount_msat,
-                    ignore_costs=(edge_startnode == nodeA),
-                    is_mine=is_mine,
+                    ignore_costs=(startnode_id == nodeA),
+                    is_mine=True,
                     my_channels=my_channels)
-                alt_dist_to_neighbour = distance_from_start[edge_endnode] + edge_cost
+                edges.append((search.node_index(startnode_id), ShortChannelID(edge_channel_id), edge_cost, fee_for_edge_msat))
+            for edge_startnode, edge_channel_id, edge_cost, fee_for_edge_msat in edges:
+                alt_dist_to_neighbour = dist_to_edge_endnode + edge_cost
                 if alt_dist_to_neighbour < distance_from_start[edge_startnode]:
                     distance_from_start[edge_startnode] = alt_dist_to_neighbour
-                    prev_node[edge_startnode] = PathEdge(node_id=edge_endnode,
-                                                         short_channel_id=ShortChannelID(edge_channel_id))
+                    prev_edge[edge_startnode] = (edge_endnode, edge_channel_id)
                     amount_to_forward_msat = amount_msat + fee_for_edge_msat
-                    nodes_to_explore.put((alt_dist_to_neighbour, amount_to_forward_msat, edge_startnode))
+                    amount_at_node[edge_startnode] = amount_to_forward_msat
+                    heapq.heappush(nodes_to_explore, (alt_dist_to_neighbour, amount_to_forward_msat, edge_startnode))
+
+    def _find_path_avoiding(self, search: '_PathSearch',
+                            avoided_channels: Set[int]) -> Optional[LNPaymentPath]:
+        """Returns a cheap path from nodeA to nodeB that does not use the
+        graph channels in avoided_channels, reusing the search tree built by
+        _run_dijkstra. This is an A* search from nodeA, with the distances
+        to nodeB found by _run_dijkstra as heuristic: they are exact for
+        settled nodes, and the other nodes are at least as far from nodeB
+        as nodeA. Reaching a settled node whose tree path to nodeB avoids
+        avoided_channels completes a path along the tree. The search stops
+        after expanding the first node that completes a path, and returns
+        the cheapest path completed so far: it is not always the best path,
+        but it usually costs a few node expansions instead of a full search.
+        Returns None if no path is found after scanning a fraction of the
+        graph: a new search is cheaper than a long detour around the tree.
+        """
+        graph = search.graph
+        nodeA = search.node_id(search.node_a)
+        start = search.node_a
+        end = search.node_b
+        bound = search.distance[start]
+        distance_to_end = search.distance
+        settled = search.settled
+
+        def heuristic(n: int) -> float:
+            return distance_to_end[n] if settled[n] else bound
+
+        def amount_at(n: int) -> int:
+            amount_msat = search.amount_msat[n]
+            return amount_msat if amount_msat is not None else search.invoice_amount_msat
+
+        tree_path_ok = {end: True}  # type: Dict[int, bool]
+
+        def is_tree_path_ok(n: int) -> bool:
+            # whether the tree path from settled node n to nodeB avoids avoided_channels
+            walked = []
+            while n not in tree_path_ok:
+                walked.append(n)
+                n, short_channel_id = search.prev_edge[n]
+                c = graph.channel_index.get(short_channel_id)
+                if c is not None and c in avoided_channels:
+                    ok = False
+                    break
+            else:
+                ok = tree_path_ok[n]
+            for n in walked:
+                tree_path_ok[n] = ok
+            return ok
+
+        # no need to search if all the channels of nodeB are used already
+        if end < graph.num_nodes and end not in search.my_channels_for_node:
+            end_slots = graph.adjacent_slots[graph.adjacency_start[end]:graph.adjacency_start[end + 1]]
+            end_channels = set(slot >> 1 for slot in end_slots)
+            if not (end_channels - avoided_channels - search.skipped_channels):
+                return None
+        distance_from_start = {start: 0}  # type: Dict[int, float]
+        prev_edge = {}  # type: Dict[int, Tuple[int, ShortChannelID]]
+        explored = set()  # type: Set[int]
+        best_cost = float('inf')
+        best_edge = None  # type: Optional[Tuple[int, ShortChannelID, int]]
+        nodes_to_explore = [(heuristic(start), 0, start)]
+        edges_left = max(len(graph.adjacent_slots) // 8, 1000)
+        while nodes_to_explore and best_edge is None and edges_left > 0:
+            _, dist_to_node, node = heapq.heappop(nodes_to_explore)
+            if dist_to_node != distance_from_start[node]:
+                continue
+            explored.add(node)
+            if len(explored) % search.CHECK_INTERVAL == 0:
+                search.check_deadline()
+            edges = []  # type: List[Tuple[int, ShortChannelID, float]]
+            if node < graph.num_nodes:
+                for slot in graph.adjacent_slots[graph.adjacency_start[node]:graph.adjacency_start[node + 1]]:
+                    c = slot >> 1
+                    if c in search.skipped_channels or c in avoided_channels:
+                        continue
+                    next_node = graph.slot_node[slot ^ 1]
+                    if next_node in explored:
+                        continue
+                    edges_left -= 1
+                    edge_cost, _ = self._graph_edge_cost(graph, slot, amount_at(next_node), node == start)
+                    edge_cost += self.mission_control.edge_cost(
+                        search.edge_history.get(slot), amount_at(next_node), search.now)
+                    edges.append((next_node, graph.short_channel_ids[c], edge_cost))
+            if node == start:
+                for edge_channel_id in search.my_channels_for_node.get(node, ()):
+                    chan = search.my_channels[edge_channel_id]
+                    next_node = search.node_index(chan.node_id)
+                    if not chan.can_pay(amount_at(next_node), check_frozen=True):
+                        continue
+                    edge_cost, _ = self._edge_cost(
+                        edge_channel_id,
+                        start_node=nodeA,
+                        end_node=chan.node_id,
+                        payment_amt_msat=amount_at(next_node),
+                        ignore_costs=True,
+                        is_mine=True,
+                        my_channels=search.my_channels)
+                    edges.append((next_node, ShortChannelID(edge_channel_id), edge_cost))
+            for next_node, short_channel_id, edge_cost in edges:
+                alt_dist = dist_to_node + edge_cost
+                if settled[next_node] and next_node != start and alt_dist + distance_to_end[next_node] < best_cost \
+                        and is_tree_path_ok(next_node):
+                    best_cost = alt_dist + distance_to_end[next_node]
+                    best_edge = (node, short_channel_id, next_node)
+                if alt_dist < distance_from_start.get(next_node, float('inf')):
+                    distance_from_start[next_node] = alt_dist
+                    prev_edge[next_node] = (node, short_channel_id)
+                    heapq.heappush(nodes_to_explore, (alt_dist + heuristic(next_node), alt_dist, next_node))
+        if best_edge is None:
+            return None  # no path found
+        # the path is made of the A* path from nodeA to 'node', the edge to
+        # 'next_node', and the tree path from 'next_node' to nodeB
+        node, short_channel_id, next_node = best_edge
+        path = [PathEdge(node_id=search.node_id(next_node), short_channel_id=short_channel_id)]
+        n = node
+        while n != start:
+            prev_node, short_channel_id = prev_edge[n]
+            path.append(PathEdge(node_id=search.node_id(n), short_channel_id=short_channel_id))
+            n = prev_node
+        path.reverse()
+        node = next_node
+        while node != end:
+            node, short_channel_id = search.prev_edge[node]
+            path.append(PathEdge(node_id=search.node_id(node), short_channel_id=short_channel_id))
+        if len(set(edge.node_id for edge in path)) != len(path):
+            return None  # the tree path goes back through the A* path
+        return path
+
+    def _search(self, nodeA: bytes, nodeB: bytes, invoice_amount_msat: int, *,
+                my_channels: Dict[ShortChannelID, 'Channel'],
+                graph: ChannelGraph = None, deadline: float = None,
+                cancel_event: threading.Event = None) -> '_PathSearch':
+        if graph is None:
+            graph = self.channel_db.get_channel_graph()
+        search = _PathSearch(graph, nodeA, nodeB, invoice_amount_msat, my_channels=my_channels,
+                             deadline=deadline, cancel_event=cancel_event)
+        search.edge_history = self.mission_control.get_history_for_graph(search.graph)
+        self._run_dijkstra(search)
+        return search
 
-        return prev_node
+    def get_distances(self, nodeA: bytes, nodeB: bytes,
+                      invoice_amount_msat: int, *,
+                      my_channels: Dict[ShortChannelID, 'Channel'] = None
+                      ) -> Dict[bytes, PathEdge]:
+        if my_channels is None:
+            my_channels = {}
+        search = self._search(nodeA, nodeB, invoice_amount_msat, my_channels=my_channels)
+        return {search.node_id(n): PathEdge(node_id=search.node_id(m), short_channel_id=short_channel_id)
+                for n, (m, short_channel_id) in search.prev_edge.items()}
 
     @profiler
     def find_path_for_payment(self, nodeA: bytes, nodeB: bytes,
                               invoice_amount_msat: int, *,
-                              my_channels: Dict[ShortChannelID, 'Channel'] = None) \
+                              my_channels: Dict[ShortChannelID, 'Channel'] = None,
+                              graph: ChannelGraph = None, deadline: float = None,
+                              cancel_event: threading.Event = None) \
             -> Optional[LNPaymentPath]:
-        """Return a path from nodeA to nodeB."""
+        """Return a path from nodeA to nodeB.
+        The search runs on 'graph', a snapshot of the channel graph
+        (the current one by default). It raises PathFindingTimeout once
+        time.monotonic() is past 'deadline', and CancelledError once
+        'cancel_event' is set.
+        """
         assert type(nodeA) is bytes
         assert type(nodeB) is bytes
         assert type(invoice_amount_msat) is int
         if my_channels is None:
             my_channels = {}
 
-        prev_node = self.get_distances(nodeA, nodeB, invoice_amount_msat, my_channels=my_channels)
+        search = self._search(nodeA, nodeB, invoice_amount_msat, my_channels=my_channels,
+                              graph=graph, deadline=deadline, cancel_event=cancel_event)
+        return search.get_shortest_path()
 
-        if nodeA not in prev_node:
-            return None  # no path found
+    @profiler
+    def find_paths_for_payment(self, nodeA: bytes, nodeB: bytes,
+                               invoice_amount_msat: int, *, num_paths: int,
+                               my_channels: Dict[ShortChannelID, 'Channel'] = None,
+                               graph: ChannelGraph = None, deadline: float = None,
+                               cancel_event: threading.Event = None) -> List[LNPaymentPath]:
+        """Return up to num_paths paths from nodeA to nodeB, best first.
+        The first one is the path find_path_for_payment returns. The paths
+        do not share any channel, except for our own channels, so that if
+        one of them fails, the next ones can be tried without searching again.
+        If the deadline passes after the first path was found, the paths
+        found so far are returned.
+        """
+        assert type(nodeA) is bytes
+        assert type(nodeB) is bytes
+        assert type(invoice_amount_msat) is int
+        if my_channels is None:
+            my_channels = {}
 
-        # backtrack from search_end (nodeA) to search_start (nodeB)
-        # FIXME paths cannot be longer than 20 edges (onion packet)...
-        edge_startnode = nodeA
-        path = []
-        while edge_startnode != nodeB:
-            edge = prev_node[edge_startnode]
-            path += [edge]
-            edge_startnode = edge.node_id
-        return path
+        search = self._search(nodeA, nodeB, invoice_amount_msat, my_channels=my_channels,
+                              graph=graph, deadline=deadline, cancel_event=cancel_event)
+        path = search.get_shortest_path()
+        paths = []
+        avoided_channels = set()  # type: Set[int]
+        while path is not None and path not in paths:
+            paths.append(path)
+            if len(paths) >= num_paths:
+                break
+            for edge in path:
+                c = search.graph.channel_index.get(edge.short_channel_id)
+                if c is not None and edge.short_channel_id not in my_channels:
+                    avoided_channels.add(c)
+            try:
+                path = self._find_path_avoiding(search, avoided_channels)
+            except PathFindingTimeout:
+                break
+        return paths
 
     def create_route_from_path(self, path: Optional[LNPaymentPath], from_node_id: bytes, *,
-                               my_channels: Dict[ShortChannelID, 'Channel'] = None) -> LNPaymentRoute:
+                               my_channels: Dict[ShortChannelID, 'Channel'] = None,
+                               graph: ChannelGraph = None) -> LNPaymentRoute:
+        """Return the route along 'path'. The policies of public channels
+        are read from 'graph' if given, so that the route uses the fees
+        the path was found with, even if gossip updated them since.
+        """
         assert isinstance(from_node_id, bytes)
         if path is None:
             raise Exception('cannot create route from None path')
@@ -297,6 +768,21 @@ class LNPathFinder(Logger):
         for edge in path:
             node_id = edge.node_id
             short_channel_id = edge.short_channel_id
+            node_info = self.channel_db.get_node_info_for_node_id(node_id=node_id)
+            slot = None
+            if graph is not None and not (my_channels and short_channel_id in my_channels):
+                slot = graph.get_slot(short_channel_id, prev_node_id)
+            if slot is not None and graph.policy_flags[slot] & ChannelGraph.POLICY_KNOWN:
+                if graph.node_ids[graph.slot_node[slot ^ 1]] != node_id:
+                    raise LNPathInconsistent("edges do not chain together")
+                route.append(RouteEdge(node_id=node_id,
+                                       short_channel_id=ShortChannelID.normalize(short_channel_id),
+                                       fee_base_msat=graph.fee_base_msat[slot],
+                                       fee_proportional_millionths=graph.fee_proportional_millionths[slot],
+                                       cltv_expiry_delta=graph.cltv_expiry_delta[slot],
+                                       node_features=node_info.features if node_info else 0))
+                prev_node_id = node_id
+                continue
             _endnodes = self.channel_db.get_endnodes_for_chan(short_channel_id, my_channels=my_channels)
             if _endnodes and sorted(_endnodes) != sorted([prev_node_id, node_id]):
                 raise LNPathInconsistent("edges do not chain together")
@@ -305,7 +791,6 @@ class LNPathFinder(Logger):
                                                                  my_channels=my_channels)
             if channel_policy is None:
                 raise NoChannelPolicy(short_channel_id)
-            node_info = self.channel_db.get_node_info_for_node_id(node_id=node_id)
             route.append(RouteEdge.from_channel_policy(channel_policy, short_channel_id, node_id,
                                                        node_info=node_info))
             prev_node_id = node_id
@@ -25,7 +25,8 @@
 
 import asyncio
 import threading
-from typing import TYPE_CHECKING, Dict, Set
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Set, Sequence, Tuple, List
 
 import aiorpcx
 
@@ -37,7 +38,7 @@ from .lnutil import funding_output_script_from_keys, ShortChannelID
 from .verifier import verify_tx_is_in_block, MerkleVerificationFailure
 from .transaction import Transaction
 from .interface import GracefulDisconnect
-from .crypto import sha256d
+from .crypto import sha256, sha256d
 from .lnmsg import decode_msg, encode_msg
 
 if TYPE_CHECKING:
@@ -176,10 +177,91 @@ class LNChannelVerifier(NetworkJobOnDefaultServer):
 
 
 def verify_sig_for_channel_update(chan_upd: dict, node_id: bytes) -> bool:
-    msg_bytes = chan_upd['raw']
-    pre_hash = msg_bytes[2+64:]
-    h = sha256d(pre_hash)
-    sig = chan_upd['signature']
-    if not ecc.verify_signature(node_id, sig, h):
+    return verify_sigs_for_channel_updates([(chan_upd, node_id)])[0]
+
+
+def verify_sigs_for_channel_updates(chan_upds: Sequence[Tuple[dict, bytes]]) -> List[bool]:
+    """Verifies (chan_upd, node_id) pairs in one batch. Returns one bool per pair."""
+    items = []
+    for chan_upd, node_id in chan_upds:
+        msg_bytes = chan_upd['raw']
+        pre_hash = msg_bytes[2+64:]
+        h = sha256d(pre_hash)
+        items.append((node_id, chan_upd['signature'], h))
+    return ecc.verify_signatures(items)
+
+
+class VerifiedGossipCache:
+    """Hashes of gossip messages whose signatures have been verified,
+    shared by all peers, so that an announcement relayed by several peers
+    is only verified once. Messages are keyed by the hash of the whole
+    message, signatures included. The cache is an LRU bounded by the
+    number of entries.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # type: OrderedDict[bytes, None]
+
+    def __contains__(self, msg_hash: bytes) -> bool:
+        with self._lock:
+            if msg_hash not in self._entries:
+                return False
+            self._entries.move_to_end(msg_hash)
+            return True
+
+    def add(self, msg_hash: bytes) -> None:
+        with self._lock:
+            self._entries[msg_hash] = None
+            self._entries.move_to_end(msg_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+verified_gossip_cache = VerifiedGossipCache(max_entries=500_000)
+
+
+def _sig_items_for_channel_announcement(payload: dict) -> List[Tuple[bytes, bytes, bytes]]:
+    h = sha256d(payload['raw'][2+256:])
+    pubkeys = [payload['node_id_1'], payload['node_id_2'], payload['bitcoin_key_1'], payload['bitcoin_key_2']]
+    sigs = [payload['node_signature_1'], payload['node_signature_2'], payload['bitcoin_signature_1'], payload['bitcoin_signature_2']]
+    return [(pubkey, sig, h) for pubkey, sig in zip(pubkeys, sigs)]
+
+
+def _sig_items_for_node_announcement(payload: dict) -> List[Tuple[bytes, bytes, bytes]]:
+    h = sha256d(payload['raw'][66:])
+    return [(payload['node_id'], payload['signature'], h)]
+
+
+def verify_sigs_for_gossip(chan_anns: Sequence[dict], node_anns: Sequence[dict], *,
+                           cache: VerifiedGossipCache = None) -> bool:
+    """Verifies the signatures of channel and node announcements in one batch.
+    Announcements are de-duplicated by hash, and those in the cache are not
+    verified again. Returns True if all signatures are valid; if so, the
+    announcements are added to the cache.
+    This does not need the event loop, and is meant to run in a worker thread.
+    """
+    if cache is None:
+        cache = verified_gossip_cache
+    todo = {}  # type: Dict[bytes, List[Tuple[bytes, bytes, bytes]]]
+    for payloads, get_sig_items in ((chan_anns, _sig_items_for_channel_announcement),
+                                    (node_anns, _sig_items_for_node_announcement)):
+        for payload in payloads:
+            msg_hash = sha256(payload['raw'])
+            if msg_hash in todo or msg_hash in cache:
+                continue
+            todo[msg_hash] = get_sig_items(payload)
+    items = [item for sig_items in todo.values() for item in sig_items]
+    if not all(ecc.verify_signatures(items)):
         return False
+    for msg_hash in todo:
+        cache.add(msg_hash)
     return True
@@ -6,7 +6,7 @@ from typing import NamedTuple, Iterable, TYPE_CHECKING
 import os
 import asyncio
 from enum import IntEnum, auto
-from typing import NamedTuple, Dict
+from typing import NamedTuple, Dict, Set, Tuple, Optional
 
 from . import util
 from .sql_db import SqlDB, sql
@@ -78,7 +78,6 @@ class SweepStore(SqlDB):
         c = self.conn.cursor()
         assert Transaction(raw_tx).is_complete()
         c.execute("""INSERT INTO sweep_txs (funding_outpoint, ctn, prevout, tx) VALUES (?,?,?,?)""", (funding_outpoint, ctn, prevout, bfh(raw_tx)))
-        self.conn.commit()
 
     @sql
     def get_num_tx(self, funding_outpoint):
@@ -98,18 +97,15 @@ class SweepStore(SqlDB):
     def remove_sweep_tx(self, funding_outpoint):
         c = self.conn.cursor()
         c.execute("DELETE FROM sweep_txs WHERE funding_outpoint=?", (funding_outpoint,))
-        self.conn.commit()
 
     def _add_channel(self, outpoint, address):
         c = self.conn.cursor()
         c.execute("INSERT INTO channel_info (address, outpoint) VALUES (?,?)", (address, outpoint))
-        self.conn.commit()
 
     @sql
     def remove_channel(self, outpoint):
         c = self.conn.cursor()
         c.execute("DELETE FROM channel_info WHERE outpoint=?", (outpoint,))
-        self.conn.commit()
 
     def _has_channel(self, outpoint):
         c = self.conn.cursor()
@@ -134,11 +130,21 @@ class SweepStore(SqlDB):
 
 class LNWatcher(AddressSynchronizer):
     LOGGING_SHORTCUT = 'W'
+    # on_network_update waits this long before running the callbacks,
+    # so that a burst of events results in a single run
+    CALLBACK_COALESCE_DELAY = 0.1
 
     def __init__(self, network: 'Network'):
         AddressSynchronizer.__init__(self, WalletDB({}, manual_upgrades=False))
         self.config = network.config
         self.callbacks = {} # address -> lambda: coroutine
+        self._callbacks_scheduled = False
+        # addresses whose callback runs on the next update
+        self._pending_callbacks = set()  # type: Set[str]
+        # address -> (txids, addresses) the last run of its callback looked at
+        self._callback_deps = {}  # type: Dict[str, Tuple[Set[str], Set[str]]]
+        # addresses whose callback depends on the block height, and runs on every new block
+        self._unsettled_callbacks = set()  # type: Set[str]
         self.network = network
         util.register_callback(
             self.on_network_update,
@@ -166,10 +172,46 @@ class LNWatcher(AddressSynchronizer):
 
     def remove_callback(self, address):
         self.callbacks.pop(address, None)
+        self._callback_deps.pop(address, None)
+        self._unsettled_callbacks.discard(address)
+        self._pending_callbacks.discard(address)
 
     def add_callback(self, address, callback):
         self.add_address(address)
         self.callbacks[address] = callback
+        self._pending_callbacks.add(address)
+
+    def _set_callback_deps(self, address: str, spenders: Dict[str, Optional[str]], *, settled: bool) -> None:
+        """Records the txs and addresses the callback of address depends on.
+        A settled callback only runs again when one of them changes.
+        """
+        txids = {outpoint.split(':')[0] for outpoint in spenders}
+        txids.update(txid for txid in spenders.values() if txid)
+        addresses = {address}
+        for txid in txids:
+            tx = self.db.get_transaction(txid)
+            if tx:
+                addresses.update(o.address for o in tx.outputs() if o.address)
+        self._callback_deps[address] = (txids, addresses)
+        if settled:
+            self._unsettled_callbacks.discard(address)
+        else:
+            self._unsettled_callbacks.add(address)
+
+    def _schedule_callbacks(self, *, txid: str = None, address: str = None) -> None:
+        if address in self.callbacks:
+            self._pending_callbacks.add(address)
+        for cb_address, (txids, addresses) in list(self._callback_deps.items()):
+            if txid in txids or address in addresses:
+                self._pending_callbacks.add(cb_address)
+
+    def receive_history_callback(self, addr, hist, tx_fees, **kwargs):
+        super().receive_history_callback(addr, hist, tx_fees, **kwargs)
+        self._schedule_callbacks(address=addr)
+
+    def _mark_address_history_changed(self, addr):
+        super()._mark_address_history_changed(addr)
+        self._schedule_callbacks(address=addr)
 
     @log_exceptions
     async def on_network_update(self, event, *args):
@@ -179,8 +221,26 @@ class LNWatcher(AddressSynchronizer):
         if not self.synchronizer:
             self.logger.info("synchronizer not set yet")
             return
-        for address, callback in list(self.callbacks.items()):
-            await callback()
+        # only run the callbacks this event may affect. History changes were
+        # recorded as they were received, and are run on 'wallet_updated'.
+        if event == 'verified':
+            self._schedule_callbacks(txid=args[1])
+        elif event in ('network_updated', 'blockchain_updated', 'fee'):
+            self._pending_callbacks |= self._unsettled_callbacks
+        if not self._pending_callbacks:
+            return
+        if self._callbacks_scheduled:
+            return  # the pending run will take this update into account
+        self._callbacks_scheduled = True
+        try:
+            await asyncio.sleep(self.CALLBACK_COALESCE_DELAY)
+        finally:
+            self._callbacks_scheduled = False
+        pending, self._pending_callbacks = self._pending_callbacks, set()
+        for address in pending:
+            callback = self.callbacks.get(address)
+            if callback:
+                await callback()
 
     async def check_onchain_situation(self, address, funding_outpoint):
         # early return if address has not been added yet
@@ -189,11 +249,15 @@ class LNWatcher(AddressSynchronizer):
         spenders = self.inspect_tx_candidate(funding_outpoint, 0)
         # inspect_tx_candidate might have added new addresses, in which case we return ealy
         if not self.is_up_to_date():
+            self._pending_callbacks.add(address)
             return
         funding_txid = funding_outpoint.split(':')[0]
         funding_height = self.get_tx_height(funding_txid)
         closing_txid = spenders.get(funding_outpoint)
         closing_height = self.get_tx_height(closing_txid)
+        # an open channel stops depending on new blocks once its funding tx is deeply mined
+        self._set_callback_deps(address, spenders,
+                                settled=closing_txid is None and self.is_deeply_mined(funding_txid))
         if closing_txid:
             closing_tx = self.db.get_transaction(closing_txid)
             if closing_tx:
@@ -276,6 +340,10 @@ class WatchTower(LNWatcher):
         # and a queue for seeing which txs are being published
         self.tx_progress = {} # type: Dict[str, ListenerItem]
 
+    def stop(self):
+        super().stop()
+        self.sweepstore.stop()
+
     async def start_watching(self):
         # I need to watch the addresses from sweepstore
         l = await self.sweepstore.list_channels()
@@ -6,14 +6,16 @@ import asyncio
 import os
 from decimal import Decimal
 import random
+import itertools
 import time
-from typing import Optional, Sequence, Tuple, List, Dict, TYPE_CHECKING, NamedTuple, Union, Mapping
+from typing import (Optional, Sequence, Tuple, List, Dict, TYPE_CHECKING, NamedTuple, Union, Mapping,
+                    Set, Iterable, Deque)
 import threading
 import socket
 import json
 from datetime import datetime, timezone
 from functools import partial
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
 import concurrent
 from concurrent import futures
 
@@ -80,6 +82,10 @@ SAVED_PR_STATUS = [PR_PAID, PR_UNPAID, PR_INFLIGHT] # status that are persisted
 
 NUM_PEERS_TARGET = 4
 
+# seconds a payment may spend finding routes, before each attempt
+# (config key 'lightning_pathfinding_time_budget')
+PATHFINDING_TIME_BUDGET = 20
+
 
 FALLBACK_NODE_LIST_TESTNET = (
     LNPeerAddr(host='203.132.95.10', port=9735, pubkey=bfh('038863cf8ab91046230f561cd5b386cbff8309fa02e3f0c3ed161a3aeb64a643b9')),
@@ -422,9 +428,122 @@ class LNWorker(Logger, NetworkRetryManager[LNPeerAddr]):
         return peer
 
 
+class GossipSyncScheduler:
+    """Decides which short channel ids are queried from which gossip peer.
+
+    Unknown ids are handed out in sorted batches, so that every peer is
+    asked about a disjoint range of channels, and no id is queried from
+    two peers at once. A peer has at most one batch in flight (BOLT-07
+    does not allow concurrent query_short_channel_ids), and it is given
+    its next batch as soon as it has answered the previous one. The
+    batch of a peer that goes away is handed out again.
+
+    Replies to our queries overlap with the gossip that peers send us
+    anyway, so the scheduler also remembers the hashes of gossip messages
+    that have been handed to the ChannelDB, and filters them out when
+    other peers send them again.
+    """
+
+    BATCH_SIZE = 500
+    MAX_SEEN_MESSAGES = 200_000
+    RATE_WINDOW = 60  # seconds
+
+    def __init__(self):
+        self.unknown_ids = set()  # type: Set[ShortChannelID]  # not handed out yet
+        self._sorted_unknown_ids = []  # type: List[ShortChannelID]  # unknown_ids, sorted (lazily)
+        self.in_flight = {}  # type: Dict[bytes, List[ShortChannelID]]  # node_id -> batch
+        self._ids_added = asyncio.Event()
+        self._seen = OrderedDict()  # type: OrderedDict[bytes, None]  # hashes of messages
+        self._started = None  # type: Optional[float]
+        self._answered = deque()  # type: Deque[Tuple[float, int]]  # (time, num ids)
+
+    def num_unresolved(self) -> int:
+        return len(self.unknown_ids) + sum(map(len, self.in_flight.values()))
+
+    def add_ids(self, ids: Iterable[ShortChannelID]) -> None:
+        in_flight = set().union(*self.in_flight.values())
+        new = set(ids) - self.unknown_ids - in_flight
+        if not new:
+            return
+        self.unknown_ids |= new
+        self._sorted_unknown_ids = None
+        self._notify()
+
+    def _notify(self):
+        self._ids_added.set()
+        self._ids_added = asyncio.Event()
+
+    async def wait_for_ids(self) -> None:
+        await self._ids_added.wait()
+
+    def assign(self, node_id: bytes) -> List[ShortChannelID]:
+        """Returns the next batch of ids to query from node_id."""
+        assert node_id not in self.in_flight
+        if not self.unknown_ids:
+            return []
+        if self._sorted_unknown_ids is None:
+            self._sorted_unknown_ids = sorted(self.unknown_ids, reverse=True)
+        batch = []
+        while self._sorted_unknown_ids and len(batch) < self.BATCH_SIZE:
+            batch.append(self._sorted_unknown_ids.pop())
+        self.unknown_ids.difference_update(batch)
+        self.in_flight[node_id] = batch
+        if self._started is None:
+            self._started = time.monotonic()
+        return batch
+
+    def answered(self, node_id: bytes) -> None:
+        """node_id has sent reply_short_channel_ids_end for its batch."""
+        batch = self.in_flight.pop(node_id, [])
+        now = time.monotonic()
+        self._answered.append((now, len(batch)))
+        while self._answered[0][0] < now - self.RATE_WINDOW:
+            self._answered.popleft()
+
+    def release(self, node_id: bytes) -> None:
+        """Hands out the batch of node_id again, e.g. because it disconnected."""
+        batch = self.in_flight.pop(node_id, None)
+        if batch:
+            self.add_ids(batch)
+
+    def get_sync_rate(self) -> Optional[float]:
+        """Returns the number of channel ids answered per second, recently."""
+        if self._started is None:
+            return None
+        now = time.monotonic()
+        window = min(self.RATE_WINDOW, now - self._started)
+        if window <= 0:
+            return None
+        return sum(n for t, n in self._answered if t >= now - window) / window
+
+    def remove_seen(self, msg_payloads: Sequence[dict]) -> List[dict]:
+        """Filters out messages that were already handed to the ChannelDB,
+        or that are repeated in msg_payloads."""
+        ret = []
+        hashes = set()
+        for payload in msg_payloads:
+            h = sha256(payload['raw'])
+            if h in self._seen or h in hashes:
+                continue
+            hashes.add(h)
+            ret.append(payload)
+        return ret
+
+    def add_seen(self, msg_payloads: Iterable[dict]) -> None:
+        """Remembers messages that were handed to the ChannelDB.
+        Only add messages that will be handled the same way if they are seen
+        again: e.g. not channel updates for channels we do not know yet."""
+        for payload in msg_payloads:
+            self._seen[sha256(payload['raw'])] = None
+        while len(self._seen) > self.MAX_SEEN_MESSAGES:
+            self._seen.popitem(last=False)
+
+
 class LNGossip(LNWorker):
     max_age = 14*24*3600
     LOGGING_SHORTCUT = 'g'
+    PRUNE_SLICE_SIZE = 1000
+    PRUNE_SLICE_DELAY = 0.1  # seconds
 
     def __init__(self):
         seed = os.urandom(32)
@@ -433,7 +552,11 @@ class LNGossip(LNWorker):
         super().__init__(xprv)
         self.features |= LnFeatures.GOSSIP_QUERIES_OPT
         self.features |= LnFeatures.GOSSIP_QUERIES_REQ
-        self.unknown_ids = set()
+        self.sync_scheduler = GossipSyncScheduler()
+
+    @property
+    def unknown_ids(self) -> Set[ShortChannelID]:
+        return self.sync_scheduler.unknown_ids
 
     def start_network(self, network: 'Network'):
         assert network
@@ -443,37 +566,48 @@ class LNGossip(LNWorker):
     async def maintain_db(self):
         await self.channel_db.load_data()
         while True:
-            if len(self.unknown_ids) == 0:
-                self.channel_db.prune_old_policies(self.max_age)
-                self.channel_db.prune_orphaned_channels()
+            if self.sync_scheduler.num_unresolved() == 0:
+                # prune in small slices, so that neither the event loop nor the sql thread stall
+                while not self.channel_db.prune_old_policies(self.max_age, max_num=self.PRUNE_SLICE_SIZE):
+                    await asyncio.sleep(self.PRUNE_SLICE_DELAY)
+                while not self.channel_db.prune_orphaned_channels(max_num=self.PRUNE_SLICE_SIZE):
+                    await asyncio.sleep(self.PRUNE_SLICE_DELAY)
             await asyncio.sleep(120)
 
     async def add_new_ids(self, ids):
         known = self.channel_db.get_channel_ids()
         new = set(ids) - set(known)
-        self.unknown_ids.update(new)
+        self.sync_scheduler.add_ids(new)
         util.trigger_callback('unknown_channels', len(self.unknown_ids))
         util.trigger_callback('gossip_peers', self.num_peers())
         util.trigger_callback('ln_gossip_sync_progress')
 
-    def get_ids_to_query(self):
-        N = 500
-        l = list(self.unknown_ids)
-        self.unknown_ids = set(l[N:])
+    def get_ids_to_query(self, node_id: bytes) -> List[ShortChannelID]:
+        ids = self.sync_scheduler.assign(node_id)
         util.trigger_callback('unknown_channels', len(self.unknown_ids))
         util.trigger_callback('ln_gossip_sync_progress')
-        return l[0:N]
+        return ids
+
+    def on_ids_queried(self, node_id: bytes) -> None:
+        self.sync_scheduler.answered(node_id)
+
+    def peer_closed(self, peer: Peer) -> None:
+        self.sync_scheduler.release(peer.pubkey)
+        super().peer_closed(peer)
 
-    def get_sync_progress_estimate(self) -> Tuple[Optional[int], Optional[int]]:
+    def get_sync_progress_estimate(self) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+        """Returns (current, total, rate): the estimated number of channels
+        we have and that there are, and how many channel ids are answered
+        per second by our gossip peers."""
         if self.num_peers() == 0:
-            return None, None
+            return None, None, None
         nchans_with_0p, nchans_with_1p, nchans_with_2p = self.channel_db.get_num_channels_partitioned_by_policy_count()
         num_db_channels = nchans_with_0p + nchans_with_1p + nchans_with_2p
         # some channels will never have two policies (only one is in gossip?...)
         # so if we have at least 1 policy for a channel, we consider that channel "complete" here
         current_est = num_db_channels - nchans_with_0p
-        total_est = len(self.unknown_ids) + num_db_channels
-        return current_est, total_est
+        total_est = self.sync_scheduler.num_unresolved() + num_db_channels
+        return current_est, total_est, self.sync_scheduler.get_sync_rate()
 
 
 class LNWallet(LNWorker):
@@ -502,6 +636,8 @@ class LNWallet(LNWorker):
             self._channels[bfh(channel_id)] = Channel(c, sweep_address=self.sweep_address, lnworker=self)
 
         self.pending_payments = defaultdict(asyncio.Future)  # type: Dict[bytes, asyncio.Future[BarePaymentAttemptLog]]
+        # payment_hash -> (route, amount_msat), for the results of our payments
+        self.pending_payment_routes = {}  # type: Dict[bytes, Tuple[LNPaymentRoute, int]]
 
     @property
     def channels(self) -> Mapping[bytes, Channel]:
@@ -831,13 +967,19 @@ class LNWallet(LNWorker):
         self.logs[key] = log = []
         success = False
         reason = ''
+        routes = []  # type: List[LNPaymentRoute]
         for i in range(attempts):
             try:
-                # note: path-finding runs in a separate thread so that we don't block the asyncio loop
-                # graph updates might occur during the computation
-                self.set_invoice_status(key, PR_ROUTING)
-                util.trigger_callback('invoice_status', key)
-                route = await run_in_thread(partial(self._create_route_from_invoice, lnaddr, full_path=full_path))
+                # routes found by one search are tried in turn; after a failure,
+                # the ones that cannot fail the same way are kept
+                # (see _filter_routes_after_failure), and we only search again
+                # once none is left.
+                if not routes:
+                    self.set_invoice_status(key, PR_ROUTING)
+                    util.trigger_callback('invoice_status', key)
+                    routes = await self.create_routes_for_payment(lnaddr, full_path=full_path,
+                                                                  num_routes=attempts - i)
+                route = routes.pop(0)
                 self.set_invoice_status(key, PR_INFLIGHT)
                 util.trigger_callback('invoice_status', key)
                 payment_attempt_log = await self._pay_to_route(route, lnaddr)
@@ -850,6 +992,7 @@ class LNWallet(LNWorker):
             success = payment_attempt_log.success
             if success:
                 break
+            routes = self._filter_routes_after_failure(routes, payment_attempt_log, lnaddr)
         else:
             reason = _('Failed after {} attempts').format(attempts)
         util.trigger_callback('invoice_status', key)
@@ -859,6 +1002,35 @@ class LNWallet(LNWorker):
             util.trigger_callback('payment_failed', key, reason)
         return success, log
 
+    def _filter_routes_after_failure(self, routes: List[LNPaymentRoute], payment_attempt_log: PaymentAttemptLog,
+                                     lnaddr: LnAddr) -> List[LNPaymentRoute]:
+        """Returns the remaining candidate routes that do not go through the
+        channel that failed, nor the node that reported the failure.
+        Returns no route, so that we search again, if we do not know where
+        the payment failed, or if it failed on one of our channels or on a
+        channel of the invoice routing hints: the search has more recent
+        information about those than the other routes were created with.
+        """
+        failure_details = payment_attempt_log.failure_details
+        route = payment_attempt_log.route
+        if failure_details is None or failure_details.sender_idx is None:
+            return []
+        sender_idx = failure_details.sender_idx
+        if sender_idx + 1 >= len(route):
+            # the destination reported the error
+            return []
+        failing_scid = route[sender_idx + 1].short_channel_id
+        reporting_node = route[sender_idx].node_id
+        if self.get_channel_by_short_id(failing_scid):
+            return []
+        hint_scids = {ShortChannelID(edge[1]) for tag, private_route in lnaddr.tags if tag == 'r'
+                      for edge in private_route}
+        if failing_scid in hint_scids:
+            return []
+        return [r for r in routes
+                if all(edge.short_channel_id != failing_scid and edge.node_id != reporting_node
+                       for edge in r)]
+
     async def _pay_to_route(self, route: LNPaymentRoute, lnaddr: LnAddr) -> PaymentAttemptLog:
         short_channel_id = route[0].short_channel_id
         chan = self.get_channel_by_short_id(short_channel_id)
@@ -866,31 +1038,27 @@ class LNWallet(LNWorker):
         if not peer:
             raise Exception('Dropped peer')
         await peer.initialized
+        amount_msat = int(lnaddr.amount * COIN * 1000)
         htlc = peer.pay(route=route,
                         chan=chan,
-                        amount_msat=int(lnaddr.amount * COIN * 1000),
+                        amount_msat=amount_msat,
                         payment_hash=lnaddr.paymenthash,
                         min_final_cltv_expiry=lnaddr.get_min_final_cltv_expiry(),
                         payment_secret=lnaddr.payment_secret)
+        self.pending_payment_routes[lnaddr.paymenthash] = route, amount_msat
         util.trigger_callback('htlc_added', htlc, lnaddr, SENT)
-        payment_attempt = await self.await_payment(lnaddr.paymenthash)
+        try:
+            payment_attempt = await self.await_payment(lnaddr.paymenthash)
+        finally:
+            self.pending_payment_routes.pop(lnaddr.paymenthash, None)
         if payment_attempt.success:
             failure_log = None
         else:
             if payment_attempt.error_bytes:
                 # TODO "decode_onion_error" might raise, catch and maybe blacklist/penalise someone?
                 failure_msg, sender_idx = chan.decode_onion_error(payment_attempt.error_bytes, route, htlc.htlc_id)
-                is_blacklisted = self.handle_error_code_from_failed_htlc(failure_msg, sender_idx, route, peer)
-                if is_blacklisted:
-                    # blacklist channel after reporter node
-                    # TODO this should depend on the error (even more granularity)
-                    # also, we need finer blacklisting (directed edges; nodes)
-                    try:
-                        short_chan_id = route[sender_idx + 1].short_channel_id
-                    except IndexError:
-                        self.logger.info("payment destination reported error")
-                    else:
-                        self.network.path_finder.add_to_blacklist(short_chan_id)
+                is_blacklisted = self.handle_error_code_from_failed_htlc(failure_msg, sender_idx, route, peer,
+                                                                         amount_msat=amount_msat)
             else:
                 # probably got "update_fail_malformed_htlc". well... who to penalise now?
                 assert payment_attempt.failure_message is not None
@@ -905,10 +1073,27 @@ class LNWallet(LNWorker):
                                  preimage=payment_attempt.preimage,
                                  failure_details=failure_log)
 
-    def handle_error_code_from_failed_htlc(self, failure_msg, sender_idx, route, peer):
+    def handle_error_code_from_failed_htlc(self, failure_msg, sender_idx, route, peer, *, amount_msat: int):
+        """Handles the error returned by route[sender_idx] for a payment of
+        amount_msat. Returns whether the channel after that node failed.
+        """
         code, data = failure_msg.code, failure_msg.data
         self.logger.info(f"UPDATE_FAIL_HTLC {repr(code)} {data}")
         self.logger.info(f"error reported by {bh2u(route[sender_idx].node_id)}")
+        blacklist = self._handle_error_code_from_failed_htlc(failure_msg, sender_idx, route, peer)
+        if sender_idx + 1 == len(route):
+            self.logger.info("payment destination reported error")
+        # a temporary channel failure is most likely a lack of liquidity:
+        # the channel failed even if it sent a new channel update, but
+        # smaller amounts may still go through
+        is_temporary_channel_failure = code == OnionFailureCode.TEMPORARY_CHANNEL_FAILURE
+        self.network.path_finder.mission_control.report_route(
+            route, amount_msat, sender_idx=sender_idx, channel_failed=blacklist or is_temporary_channel_failure,
+            failure_depends_on_amount=is_temporary_channel_failure)
+        return blacklist
+
+    def _handle_error_code_from_failed_htlc(self, failure_msg, sender_idx, route, peer) -> bool:
+        code, data = failure_msg.code, failure_msg.data
         # handle some specific error codes
         failure_codes = {
             OnionFailureCode.TEMPORARY_CHANNEL_FAILURE: 0,
@@ -974,96 +1159,152 @@ class LNWallet(LNWorker):
                 f"min_final_cltv_expiry: {addr.get_min_final_cltv_expiry()}"))
         return addr
 
-    @profiler
+    async def create_routes_for_payment(self, decoded_invoice: 'LnAddr', *, full_path: LNPaymentPath = None,
+                                        num_routes: int = 1) -> List[LNPaymentRoute]:
+        """Runs _create_routes_from_invoice in the path finding thread, so that
+        the asyncio loop is not blocked. The search is given up, and raises
+        PathFindingTimeout, once it has run for the time budget in the config;
+        time spent waiting for other searches does not count. If this
+        coroutine is cancelled, the search stops too.
+        """
+        time_budget = self.network.config.get('lightning_pathfinding_time_budget', PATHFINDING_TIME_BUDGET)
+        cancel_event = threading.Event()
+        path_finder = self.network.path_finder
+        try:
+            return await self.network.asyncio_loop.run_in_executor(
+                path_finder.executor,
+                partial(self._create_routes_from_invoice, decoded_invoice, full_path=full_path,
+                        num_routes=num_routes, time_budget=time_budget, cancel_event=cancel_event))
+        finally:
+            cancel_event.set()
+
     def _create_route_from_invoice(self, decoded_invoice: 'LnAddr',
                                    *, full_path: LNPaymentPath = None) -> LNPaymentRoute:
+        return self._create_routes_from_invoice(decoded_invoice, full_path=full_path)[0]
+
+    @profiler
+    def _create_routes_from_invoice(self, decoded_invoice: 'LnAddr', *, full_path: LNPaymentPath = None,
+                                    num_routes: int = 1, time_budget: float = None,
+                                    cancel_event: threading.Event = None) -> List[LNPaymentRoute]:
+        """Returns up to num_routes routes, best first. If the invoice has
+        routing hints, the routes are spread across the hints, in a random
+        order; routes to the same hint, or found without a hint, do not
+        share public channels (see LNPathFinder.find_paths_for_payment).
+        Hints through a channel that mission control gave up on are skipped.
+        All the searches use the same snapshot of the channel graph, even
+        if gossip arrives in the meantime, and together they may take up to
+        time_budget seconds."""
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        # a path given by the user is not searched for, and uses the current policies
+        graph = self.channel_db.get_channel_graph() if not full_path else None
         amount_msat = int(decoded_invoice.amount * COIN * 1000)
         invoice_pubkey = decoded_invoice.pubkey.serialize()
         # use 'r' field from invoice
-        route = None  # type: Optional[LNPaymentRoute]
         # only want 'r' tags
         r_tags = list(filter(lambda x: x[0] == 'r', decoded_invoice.tags))
         # strip the tag type, it's implicitly 'r' now
         r_tags = list(map(lambda x: x[1], r_tags))
-        # if there are multiple hints, we will use the first one that works,
-        # from a random permutation
+        # if there are multiple hints, we try them in a random order
         random.shuffle(r_tags)
+        # a path given by the user is tried even if it failed before
+        mission_control = self.network.path_finder.mission_control
+        r_tags = [private_route for private_route in r_tags
+                  if 0 < len(private_route) <= NUM_MAX_EDGES_IN_PAYMENT_PATH
+                  and (full_path or all(mission_control.is_edge_usable(ShortChannelID(edge[1]), edge[0], amount_msat)
+                                        for edge in private_route))]
+        # routes of each hint, to be interleaved
+        routes_per_hint = []  # type: List[List[LNPaymentRoute]]
+        num_routes_per_hint = -(-num_routes // len(r_tags)) if r_tags else 0
         channels = list(self.channels.values())
         scid_to_my_channels = {chan.short_channel_id: chan for chan in channels
                                if chan.short_channel_id is not None}
         for private_route in r_tags:
-            if len(private_route) == 0:
-                continue
-            if len(private_route) > NUM_MAX_EDGES_IN_PAYMENT_PATH:
-                continue
+            hint_routes = []  # type: List[LNPaymentRoute]
             border_node_pubkey = private_route[0][0]
             if full_path:
                 # user pre-selected path. check that end of given path coincides with private_route:
                 if [edge.short_channel_id for edge in full_path[-len(private_route):]] != [edge[1] for edge in private_route]:
                     continue
-                path = full_path[:-len(private_route)]
+                paths = [full_path[:-len(private_route)]]
             else:
-                # find path now on public graph, to border node
-                path = self.network.path_finder.find_path_for_payment(self.node_keypair.pubkey, border_node_pubkey, amount_msat,
-                                                                      my_channels=scid_to_my_channels)
-            if not path:
-                continue
-            try:
-                route = self.network.path_finder.create_route_from_path(path, self.node_keypair.pubkey,
-                                                                        my_channels=scid_to_my_channels)
-            except NoChannelPolicy:
-                continue
-            # we need to shift the node pubkey by one towards the destination:
-            private_route_nodes = [edge[0] for edge in private_route][1:] + [invoice_pubkey]
-            private_route_rest = [edge[1:] for edge in private_route]
-            prev_node_id = border_node_pubkey
-            for node_pubkey, edge_rest in zip(private_route_nodes, private_route_rest):
-                short_channel_id, fee_base_msat, fee_proportional_millionths, cltv_expiry_delta = edge_rest
-                short_channel_id = ShortChannelID(short_channel_id)
-                # if we have a routing policy for this edge in the db, that takes precedence,
-                # as it is likely from a previous failure
-                channel_policy = self.channel_db.get_policy_for_node(short_channel_id=short_channel_id,
-                                                                     node_id=prev_node_id,
-                                                                     my_channels=scid_to_my_channels)
-                if channel_policy:
-                    fee_base_msat = channel_policy.fee_base_msat
-                    fee_proportional_millionths = channel_policy.fee_proportional_millionths
-                    cltv_expiry_delta = channel_policy.cltv_expiry_delta
-                node_info = self.channel_db.get_node_info_for_node_id(node_id=node_pubkey)
-                route.append(RouteEdge(node_id=node_pubkey,
-                                       short_channel_id=short_channel_id,
-                                       fee_base_msat=fee_base_msat,
-                                       fee_proportional_millionths=fee_proportional_millionths,
-                                       cltv_expiry_delta=cltv_expiry_delta,
-                                       node_features=node_info.features if node_info else 0))
-                prev_node_id = node_pubkey
-            # test sanity
-            if not is_route_sane_to_use(route, amount_msat, decoded_invoice.get_min_final_cltv_expiry()):
-                self.logger.info(f"rejecting insane route {route}")
-                route = None
-                continue
-            break
+                # find paths now on public graph, to border node
+                paths = self.network.path_finder.find_paths_for_payment(self.node_keypair.pubkey, border_node_pubkey, amount_msat,
+                                                                        num_paths=num_routes_per_hint,
+                                                                        my_channels=scid_to_my_channels,
+                                                                        graph=graph, deadline=deadline,
+                                                                        cancel_event=cancel_event)
+            for path in paths:
+                if not path:
+                    continue
+                try:
+                    route = self.network.path_finder.create_route_from_path(path, self.node_keypair.pubkey,
+                                                                            my_channels=scid_to_my_channels,
+                                                                            graph=graph)
+                except NoChannelPolicy:
+                    continue
+                # we need to shift the node pubkey by one towards the destination:
+                private_route_nodes = [edge[0] for edge in private_route][1:] + [invoice_pubkey]
+                private_route_rest = [edge[1:] for edge in private_route]
+                prev_node_id = border_node_pubkey
+                for node_pubkey, edge_rest in zip(private_route_nodes, private_route_rest):
+                    short_channel_id, fee_base_msat, fee_proportional_millionths, cltv_expiry_delta = edge_rest
+                    short_channel_id = ShortChannelID(short_channel_id)
+                    # if we have a routing policy for this edge in the db, that takes precedence,
+                    # as it is likely from a previous failure
+                    channel_policy = self.channel_db.get_policy_for_node(short_channel_id=short_channel_id,
+                                                                         node_id=prev_node_id,
+                                                                         my_channels=scid_to_my_channels)
+                    if channel_policy:
+                        fee_base_msat = channel_policy.fee_base_msat
+                        fee_proportional_millionths = channel_policy.fee_proportional_millionths
+                        cltv_expiry_delta = channel_policy.cltv_expiry_delta
+                    node_info = self.channel_db.get_node_info_for_node_id(node_id=node_pubkey)
+                    route.append(RouteEdge(node_id=node_pubkey,
+                                           short_channel_id=short_channel_id,
+                                           fee_base_msat=fee_base_msat,
+                                           fee_proportional_millionths=fee_proportional_millionths,
+                                           cltv_expiry_delta=cltv_expiry_delta,
+                                           node_features=node_info.features if node_info else 0))
+                    prev_node_id = node_pubkey
+                # test sanity
+                if not is_route_sane_to_use(route, amount_msat, decoded_invoice.get_min_final_cltv_expiry()):
+                    self.logger.info(f"rejecting insane route {route}")
+                    continue
+                hint_routes.append(route)
+            routes_per_hint.append(hint_routes)
+        # the best route of each hint first, then the second best, etc.
+        routes = [route for routes_of_rank in itertools.zip_longest(*routes_per_hint)
+                  for route in routes_of_rank if route is not None][:num_routes]
         # if could not find route using any hint; try without hint now
-        if route is None:
+        if not routes:
             if full_path:  # user pre-selected path
-                path = full_path
-            else:  # find path now
-                path = self.network.path_finder.find_path_for_payment(self.node_keypair.pubkey, invoice_pubkey, amount_msat,
-                                                                      my_channels=scid_to_my_channels)
-            if not path:
+                paths = [full_path]
+            else:  # find paths now
+                paths = self.network.path_finder.find_paths_for_payment(self.node_keypair.pubkey, invoice_pubkey, amount_msat,
+                                                                        num_paths=num_routes,
+                                                                        my_channels=scid_to_my_channels,
+                                                                        graph=graph, deadline=deadline,
+                                                                        cancel_event=cancel_event)
+            if not paths or not paths[0]:
                 raise NoPathFound()
-            route = self.network.path_finder.create_route_from_path(path, self.node_keypair.pubkey,
-                                                                    my_channels=scid_to_my_channels)
-            if not is_route_sane_to_use(route, amount_msat, decoded_invoice.get_min_final_cltv_expiry()):
-                self.logger.info(f"rejecting insane route {route}")
+            for path in paths:
+                route = self.network.path_finder.create_route_from_path(path, self.node_keypair.pubkey,
+                                                                        my_channels=scid_to_my_channels,
+                                                                        graph=graph)
+                if not is_route_sane_to_use(route, amount_msat, decoded_invoice.get_min_final_cltv_expiry()):
+                    self.logger.info(f"rejecting insane route {route}")
+                    continue
+                routes.append(route)
+            if not routes:
                 raise NoPathFound()
-        assert len(route) > 0
-        if route[-1].node_id != invoice_pubkey:
-            raise LNPathInconsistent("last node_id != invoice pubkey")
         # add features from invoice
         invoice_features = decoded_invoice.get_tag('9') or 0
-        route[-1].node_features |= invoice_features
-        return route
+        for route in routes:
+            assert len(route) > 0
+            if route[-1].node_id != invoice_pubkey:
+                raise LNPathInconsistent("last node_id != invoice pubkey")
+            route[-1].node_features |= invoice_features
+        return routes
 
     def add_request(self, amount_sat, message, expiry):
         coro = self._add_request_coro(amount_sat, message, expiry)
@@ -1194,6 +1435,9 @@ class LNWallet(LNWorker):
 
     def payment_sent(self, chan, payment_hash: bytes):
         self.set_payment_status(payment_hash, PR_PAID)
+        if payment_hash in self.pending_payment_routes:
+            route, amount_msat = self.pending_payment_routes.pop(payment_hash)
+            self.network.path_finder.mission_control.report_route(route, amount_msat)
         preimage = self.get_preimage(payment_hash)
         f = self.pending_payments.get(payment_hash)
         if f and not f.cancelled():
@@ -1191,6 +1191,16 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         try:
             fut.result(timeout=2)
         except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError): pass
+        # let the sql threads commit what is queued, and exit
+        sql_dbs = []
+        if self.local_watchtower:
+            self.local_watchtower.stop()
+            sql_dbs.append(self.local_watchtower.sweepstore)
+        if self.channel_db:
+            self.channel_db.stop()
+            sql_dbs.append(self.channel_db)
+        for db in sql_dbs:
+            db.sql_thread.join(timeout=2)
 
     async def _ensure_there_is_a_main_interface(self):
         if self.is_connected():
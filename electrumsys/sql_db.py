@@ -17,8 +17,33 @@ def sql(func):
         return f
     return wrapper
 
+
+def _set_future_results(results):
+    # runs on the event loop
+    for future, result, exception in results:
+        if future.cancelled():
+            continue
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+
 class SqlDB(Logger):
-    
+
+    # number of requests run in one transaction, unless commit_interval is given
+    MAX_BATCH_SIZE = 1000
+    # when idle, the sql thread wakes up this often to see if the event loop has stopped
+    IDLE_CHECK_INTERVAL = 1.0
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",  # in WAL mode, only checkpoints are fsynced
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-16384",  # KiB
+    )
+    # sqlite3 keeps this many prepared statements, keyed by their SQL text
+    CACHED_STATEMENTS = 256
+
     def __init__(self, asyncio_loop, path, commit_interval=None):
         Logger.__init__(self)
         self.asyncio_loop = asyncio_loop
@@ -29,36 +54,67 @@ class SqlDB(Logger):
         self.sql_thread.start()
 
     def filesize(self):
-        return os.stat(self.path).st_size
+        size = os.stat(self.path).st_size
+        if os.path.exists(self.path + '-wal'):
+            size += os.stat(self.path + '-wal').st_size
+        return size
+
+    def stop(self):
+        """Makes the sql thread commit and exit, after the requests queued so far."""
+        self.db_requests.put(None)
 
     def run_sql(self):
         self.logger.info("SQL thread started")
-        self.conn = sqlite3.connect(self.path)
+        self.conn = sqlite3.connect(self.path, cached_statements=self.CACHED_STATEMENTS)
+        for pragma in self.PRAGMAS:
+            self.conn.execute(pragma)
         self.logger.info("Creating database")
         self.create_database()
-        i = 0
-        while self.asyncio_loop.is_running():
+        max_batch_size = self.commit_interval or self.MAX_BATCH_SIZE
+        stopping = False
+        while not stopping and self.asyncio_loop.is_running():
             try:
-                future, func, args, kwargs = self.db_requests.get(timeout=0.1)
+                request = self.db_requests.get(timeout=self.IDLE_CHECK_INTERVAL)
             except queue.Empty:
                 continue
-            try:
-                result = func(self, *args, **kwargs)
-            except BaseException as e:
-                future.set_exception(e)
-                continue
-            if not future.cancelled():
-                future.set_result(result)
-            # note: in sweepstore session.commit() is called inside
-            # the sql-decorated methods, so commiting to disk is awaited
-            if self.commit_interval:
-                i = (i + 1) % self.commit_interval
-                if i == 0:
-                    self.conn.commit()
+            # run whatever else is queued in the same transaction
+            batch = []
+            while request is not None:
+                batch.append(request)
+                if len(batch) >= max_batch_size:
+                    break
+                try:
+                    request = self.db_requests.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                stopping = True
+            self._run_batch(batch)
         # write
         self.conn.commit()
         self.conn.close()
         self.logger.info("SQL thread terminated")
 
+    def _run_batch(self, batch):
+        results = []
+        for future, func, args, kwargs in batch:
+            try:
+                results.append((future, func(self, *args, **kwargs), None))
+            except BaseException as e:
+                results.append((future, None, e))
+        # note: futures are resolved after the commit, so awaiting
+        #       a write means that it has been committed
+        try:
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.logger.exception('commit failed')
+            # do not leave the failed transaction open for the next batch
+            try:
+                self.conn.rollback()
+            except sqlite3.Error:
+                self.logger.exception('rollback failed')
+            results = [(future, None, exc or e) for future, result, exc in results]
+        self.asyncio_loop.call_soon_threadsafe(_set_future_results, results)
+
     def create_database(self):
         raise NotImplementedError()
@@ -24,7 +24,7 @@
 # SOFTWARE.
 import asyncio
 import hashlib
-from typing import Dict, List, TYPE_CHECKING, Tuple
+from typing import Dict, List, TYPE_CHECKING, Tuple, Sequence
 from collections import defaultdict
 import logging
 
@@ -59,6 +59,9 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
     """Subscribe over the network to a set of addresses, and monitor their statuses.
     Every time a status changes, run a coroutine provided by the subclass.
     """
+    # maximum number of subscriptions sent in one JSON-RPC batch
+    SUBSCRIPTION_BATCH_SIZE = 100
+
     def __init__(self, network: 'Network'):
         self.asyncio_loop = network.asyncio_loop
         self._reset_request_counters()
@@ -71,6 +74,8 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
         self.scripthash_to_address = {}
         self._processed_some_notifications = False  # so that we don't miss them
         self._reset_request_counters()
+        # set when the subscription state might have changed; main() waits on it
+        self._state_changed = asyncio.Event()
         # Queues
         self.add_queue = asyncio.Queue()
         self.status_queue = asyncio.Queue()
@@ -90,35 +95,53 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
         self._requests_answered = 0
 
     def add(self, addr):
-        asyncio.run_coroutine_threadsafe(self._add_address(addr), self.asyncio_loop)
+        self.add_addresses([addr])
+
+    def add_addresses(self, addrs: Sequence[str]):
+        asyncio.run_coroutine_threadsafe(self._add_addresses(addrs), self.asyncio_loop)
+
+    async def _add_addresses(self, addrs: Sequence[str]):
+        new_addrs = []
+        for addr in addrs:
+            if not is_address(addr): raise ValueError(f"invalid syscoin address {addr}")
+            if addr in self.requested_addrs: continue
+            self.requested_addrs.add(addr)
+            new_addrs.append(addr)
+        if not new_addrs:
+            return
+        self._state_changed.set()
+        await self.add_queue.put(new_addrs)
 
     async def _add_address(self, addr: str):
-        if not is_address(addr): raise ValueError(f"invalid syscoin address {addr}")
-        if addr in self.requested_addrs: return
-        self.requested_addrs.add(addr)
-        await self.add_queue.put(addr)
+        await self._add_addresses([addr])
 
     async def _on_address_status(self, addr, status):
         """Handle the change of the status of an address."""
         raise NotImplementedError()  # implemented by subclasses
 
     async def send_subscriptions(self):
-        async def subscribe_to_address(addr):
-            h = address_to_scripthash(addr)
-            self.scripthash_to_address[h] = addr
-            self._requests_sent += 1
+        async def subscribe_to_addresses(addrs):
+            params_list = []
+            for addr in addrs:
+                h = address_to_scripthash(addr)
+                self.scripthash_to_address[h] = addr
+                params_list.append([h])
+            self._requests_sent += len(addrs)
             try:
-                await self.session.subscribe('blockchain.scripthash.subscribe', [h], self.status_queue)
+                await self.session.subscribe_many('blockchain.scripthash.subscribe', params_list, self.status_queue)
             except RPCError as e:
                 if e.message == 'history too large':  # no unique error code
                     raise GracefulDisconnect(e, log_level=logging.ERROR) from e
                 raise
-            self._requests_answered += 1
-            self.requested_addrs.remove(addr)
+            self._requests_answered += len(addrs)
+            self.requested_addrs.difference_update(addrs)
+            self._state_changed.set()
 
         while True:
-            addr = await self.add_queue.get()
-            await self.taskgroup.spawn(subscribe_to_address, addr)
+            # addresses added together are subscribed to in batches
+            addrs = await self.add_queue.get()
+            for i in range(0, len(addrs), self.SUBSCRIPTION_BATCH_SIZE):
+                await self.taskgroup.spawn(subscribe_to_addresses, addrs[i:i + self.SUBSCRIPTION_BATCH_SIZE])
 
     async def handle_status(self):
         while True:
@@ -126,6 +149,7 @@ class SynchronizerBase(NetworkJobOnDefaultServer):
             addr = self.scripthash_to_address[h]
             await self.taskgroup.spawn(self._on_address_status, addr, status)
             self._processed_some_notifications = True
+            self._state_changed.set()
 
     def num_requests_sent_and_answered(self) -> Tuple[int, int]:
         return self._requests_sent, self._requests_answered
@@ -142,9 +166,25 @@ class Synchronizer(SynchronizerBase):
     we don't have the full history of, and requests binary transaction
     data of any transactions the wallet doesn't have.
     '''
+    # After being woken up, main() waits this long before doing any work,
+    # so that a burst of events results in a single update.
+    UPDATE_COALESCE_DELAY = 0.1
+
     def __init__(self, wallet: 'AddressSynchronizer'):
         self.wallet = wallet
         SynchronizerBase.__init__(self, wallet.network)
+        util.register_callback(self._on_chain_event, ['blockchain_updated', 'verified'])
+
+    async def stop(self):
+        util.unregister_callback(self._on_chain_event)
+        await super().stop()
+
+    def _on_chain_event(self, event, *args):
+        # new headers and SPV-verified txs change confirmation counts,
+        # which might make addresses "old" and require extending the gap limit window
+        if event == 'verified' and args[0] != self.wallet:
+            return
+        self._state_changed.set()
 
     def _reset(self):
         super()._reset()
@@ -160,8 +200,7 @@ class Synchronizer(SynchronizerBase):
                 and not self.requested_tx)
 
     async def _on_address_status(self, addr, status):
-        history = self.wallet.db.get_addr_history(addr)
-        if history_status(history) == status:
+        if self.wallet.db.get_addr_history_status(addr) == status:
             return
         if (addr, status) in self.requested_histories:
             return
@@ -185,12 +224,15 @@ class Synchronizer(SynchronizerBase):
             self.logger.info(f"error: status mismatch: {addr}")
         else:
             # Store received history
-            self.wallet.receive_history_callback(addr, hist, tx_fees)
+            self.wallet.receive_history_callback(addr, hist, tx_fees, status=status)
+            # Let main() extend the gap limit window, without waiting for the txs
+            self._state_changed.set()
             # Request transactions we don't have
             await self._request_missing_txs(hist)
 
         # Remove request; this allows up_to_date to be True
         self.requested_histories.discard((addr, status))
+        self._state_changed.set()
 
     async def _request_missing_txs(self, hist, *, allow_server_not_finding_tx=False):
         # "hist" is a list of [tx_hash, tx_height] lists
@@ -217,6 +259,7 @@ class Synchronizer(SynchronizerBase):
             # most likely, "No such mempool or blockchain transaction"
             if allow_server_not_finding_tx:
                 self.requested_tx.pop(tx_hash)
+                self._state_changed.set()
                 return
             else:
                 raise
@@ -227,6 +270,7 @@ class Synchronizer(SynchronizerBase):
             raise SynchronizerFailure(f"received tx does not match expected txid ({tx_hash} != {tx.txid()})")
         tx_height = self.requested_tx.pop(tx_hash)
         self.wallet.receive_tx_callback(tx_hash, tx, tx_height)
+        self._state_changed.set()
         self.logger.info(f"received tx {tx_hash} height: {tx_height} bytes: {len(raw_tx)}")
         # callbacks
         util.trigger_callback('new_transaction', self.wallet, tx)
@@ -241,11 +285,13 @@ class Synchronizer(SynchronizerBase):
             if history == ['*']: continue
             await self._request_missing_txs(history, allow_server_not_finding_tx=True)
         # add addresses to bootstrap
-        for addr in self.wallet.get_addresses():
-            await self._add_address(addr)
-        # main loop
+        await self._add_addresses(self.wallet.get_addresses())
+        # main loop. it only runs when something happened: idle wallets cost nothing
+        self._state_changed.set()  # initial run
         while True:
-            await asyncio.sleep(0.1)
+            await self._state_changed.wait()
+            await asyncio.sleep(self.UPDATE_COALESCE_DELAY)
+            self._state_changed.clear()
             await run_in_thread(self.wallet.synchronize)
             up_to_date = self.is_up_to_date()
             if (up_to_date != self.wallet.is_up_to_date()
@@ -268,8 +314,7 @@ class Notifier(SynchronizerBase):
 
     async def main(self):
         # resend existing subscriptions if we were restarted
-        for addr in self.watched_addresses:
-            await self._add_address(addr)
+        await self._add_addresses(list(self.watched_addresses))
         # main loop
         while True:
             addr, url = await self._start_watching_queue.get()
@@ -2,6 +2,7 @@ import unittest
 import threading
 import tempfile
 import shutil
+import time
 
 from electrumsys import constants
 
@@ -13,6 +14,17 @@ from electrumsys import constants
 FAST_TESTS = False
 
 
+def wait_for_future(fut, *, timeout=5):
+    """Waits for a future that is resolved by an event loop running
+    in another thread, and returns its result."""
+    deadline = time.monotonic() + timeout
+    while not fut.done():
+        if time.monotonic() > deadline:
+            raise TimeoutError('future not done')
+        time.sleep(0.01)
+    return fut.result()
+
+
 # some unit tests are modifying globals...
 class SequentialTestCase(unittest.TestCase):
 
@@ -36,10 +36,8 @@ class Test_auxpow(SequentialTestCase):
     def clear_coinbase_outputs(auxpow_header: dict, fix_merkle_root=True) -> None:
         """Clears the auxpow coinbase outputs
 
-        Set the outputs of the auxpow coinbase to an empty list.  This is
-        necessary when the coinbase has been modified and needs to be
-        re-serialised, since present outputs are invalid due to the
-        fast_tx_deserialize optimisation."""
+        Set the outputs of the auxpow coinbase to an empty list, and
+        re-serialise the coinbase after it has been modified."""
 
         auxpow_header['parent_coinbase_tx']._outputs = []
 
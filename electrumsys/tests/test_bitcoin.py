@@ -1,5 +1,6 @@
 import base64
 import sys
+from unittest import mock
 
 from electrumsys.bitcoin import (public_key_to_p2pkh, address_from_private_key,
                               is_address, is_private_key,
@@ -18,6 +19,7 @@ from electrumsys.crypto import sha256d, SUPPORTED_PW_HASH_VERSIONS
 from electrumsys import ecc, crypto, constants
 from electrumsys.util import bfh, bh2u, InvalidPassword, randrange
 from electrumsys.storage import WalletStorage
+from electrumsys import keystore
 from electrumsys.keystore import xtype_from_derivation
 
 from electrumsys import ecc_fast
@@ -218,6 +220,35 @@ class Test_bitcoin(ElectrumSysTestCase):
         sig2 = eckey2.sign_transaction(bfh('642a2e66332f507c92bda910158dfe46fc10afbf72218764899d3af99a043fac'))
         self.assertEqual('30440220618513f4cfc87dde798ce5febae7634c23e7b9254a1eabf486be820f6a7c2c4702204fef459393a2b931f949e63ced06888f35e286e446dc46feb24b5b5f81c6ed52', sig2.hex())
 
+    def test_verify_signatures_batch(self):
+        items = []
+        for k in range(1, 201):
+            privkey = ecc.ECPrivkey(k.to_bytes(32, 'big'))
+            pubkey = privkey.get_public_key_bytes(compressed=k % 2 == 0)
+            msg_hash = sha256d(bytes([k % 256]))
+            sig = privkey.sign(msg_hash, sigencode=ecc.sig_string_from_r_and_s)
+            items.append((pubkey, sig, msg_hash))
+        # wrong hash, wrong pubkey, malformed sig, invalid pubkey, truncated hash
+        items[3] = (items[3][0], items[3][1], items[4][2])
+        items[10] = (items[11][0], items[10][1], items[10][2])
+        items[20] = (items[20][0], items[20][1][:63], items[20][2])
+        items[30] = (b'\x02' + b'\xff' * 32, items[30][1], items[30][2])
+        items[40] = (items[40][0], items[40][1], items[40][2][:31])
+        expected = [ecc.verify_signature(*item) for item in items]
+        self.assertEqual(5, expected.count(False))
+        self.assertEqual(expected, ecc.verify_signatures(items))
+        with mock.patch.object(ecc, '_MIN_BATCH_SIZE_PER_THREAD', 16), \
+                mock.patch.object(ecc.os, 'cpu_count', return_value=4):
+            self.assertEqual(expected, ecc.verify_signatures(items))
+            # the pool is capped, and recreated if used after being shut down
+            self.assertEqual(4, ecc.num_signature_threads())
+            with mock.patch.object(ecc, 'MAX_SIGNATURE_THREADS', 2):
+                self.assertEqual(2, ecc.num_signature_threads())
+            ecc.shutdown_signature_executor()
+            self.assertIsNone(ecc._signature_executor)
+            self.assertEqual(expected, ecc.verify_signatures(items))
+        self.assertEqual([], ecc.verify_signatures([]))
+
     @needs_test_with_all_aes_implementations
     def test_aes_homomorphic(self):
         """Make sure AES is homomorphic."""
@@ -655,6 +686,33 @@ class Test_xprv_xpub(ElectrumSysTestCase):
             self.assertTrue(xkey_b58.startswith(xpub_headers_b58[xtype]))
 
 
+class Test_DerivationCache(ElectrumSysTestCase):
+
+    def test_derive_pubkey_uses_shared_cache(self):
+        xpub = 'xpub6H1LXWLaKsWFhvm6RVpEL9P4KfRZSW7abD2ttkWP3SSQvnyA8FSVqNTEcYFgJS2UaFcxupHiYkro49S8yGasTvXEYBVPamhGW6cFJodrTHy'
+        ks1 = keystore.from_master_key(xpub)
+        ks2 = keystore.from_master_key(xpub)
+        keystore.derivation_cache.clear()
+        pubkey = ks1.derive_pubkey(1, 7)
+        self.assertEqual(BIP32Node.from_xkey(xpub).subkey_at_public_derivation('m/1/7').eckey.get_public_key_bytes(),
+                         pubkey)
+        self.assertEqual(pubkey, keystore.derivation_cache.get(xpub, 1, 7))
+        self.assertEqual(pubkey, ks2.derive_pubkey(1, 7))
+        self.assertEqual([ks1.derive_pubkey(0, n) for n in range(3, 8)], ks2.derive_pubkeys(0, 3, 5))
+
+    def test_cache_is_bounded_by_bytes(self):
+        entry_size = 33 + keystore.DerivationCache.ENTRY_OVERHEAD
+        cache = keystore.DerivationCache(max_bytes=3 * entry_size)
+        for n in range(3):
+            cache.put('mpk', 0, n, bytes(33))
+        cache.get('mpk', 0, 0)  # touch, so that n=1 is the least recently used
+        cache.put('mpk', 0, 3, bytes(33))
+        self.assertEqual(3 * entry_size, cache.get_size())
+        self.assertIsNone(cache.get('mpk', 0, 1))
+        for n in (0, 2, 3):
+            self.assertEqual(bytes(33), cache.get('mpk', 0, n))
+
+
 class Test_xprv_xpub_testnet(TestCaseForTestnet):
 
     def test_version_bytes(self):
@@ -1,9 +1,21 @@
-from electrumsys.coinchooser import CoinChooserPrivacy
+from electrumsys.bitcoin import hash_to_segwit_addr
+from electrumsys.coinchooser import CoinChooserPrivacy, CoinChooserBranchAndBound, COIN_CHOOSERS
+from electrumsys.transaction import PartialTxInput, PartialTxOutput, TxOutpoint
 from electrumsys.util import NotEnoughFunds
 
 from . import ElectrumSysTestCase
 
 
+def _make_coin(n: int, value: int, *, height: int = 100) -> PartialTxInput:
+    addr = hash_to_segwit_addr(n.to_bytes(20, 'big'), 0)
+    txin = PartialTxInput(prevout=TxOutpoint(txid=n.to_bytes(32, 'big'), out_idx=0))
+    txin.script_type = 'address'
+    txin._trusted_address = addr
+    txin._trusted_value_sats = value
+    txin.block_height = height
+    return txin
+
+
 class TestCoinChooser(ElectrumSysTestCase):
 
     def test_bucket_candidates_with_empty_buckets(self):
@@ -18,3 +30,66 @@ class TestCoinChooser(ElectrumSysTestCase):
             coin_chooser.bucket_candidates_any([], sufficient_funds)
         with self.assertRaises(NotEnoughFunds):
             coin_chooser.bucket_candidates_prefer_confirmed([], sufficient_funds)
+
+    def test_make_batch_reserves_coins(self):
+        coins = [_make_coin(n, 1_000_000) for n in range(1, 11)]
+        dest_addr = hash_to_segwit_addr(b'\x99' * 20, 0)
+        change_addrs_list = [[hash_to_segwit_addr(bytes([0x98, i]) * 10, 0)] for i in range(3)]
+        def make_batch(amounts):
+            return CoinChooserPrivacy().make_batch(
+                coins=coins,
+                outputs_list=[[PartialTxOutput.from_address_and_value(dest_addr, amount)] for amount in amounts],
+                change_addrs_list=change_addrs_list,
+                fee_estimator_vb=lambda size: int(size),
+                dust_threshold=546)
+        txs = make_batch([2_500_000, 1_500_000, 3_000_000])
+        self.assertEqual(3, len(txs))
+        spent = [txin.prevout for tx in txs for txin in tx.inputs()]
+        self.assertEqual(len(spent), len(set(spent)))
+        for tx, amount, change_addrs in zip(txs, [2_500_000, 1_500_000, 3_000_000], change_addrs_list):
+            self.assertEqual(amount, sum(o.value for o in tx.outputs() if o.address == dest_addr))
+            self.assertEqual(change_addrs, [o.address for o in tx.outputs() if o.address != dest_addr])
+            self.assertTrue(tx.get_fee() > 0)
+        # each tx needs at least one more coin than its amount, so this cannot fit
+        with self.assertRaises(NotEnoughFunds):
+            make_batch([3_000_000, 3_000_000, 3_000_000])
+
+
+class TestCoinChooserBranchAndBound(ElectrumSysTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.change_addr = hash_to_segwit_addr(b'\x98' * 20, 0)
+        self.dest_addr = hash_to_segwit_addr(b'\x99' * 20, 0)
+
+    def _make_tx(self, coins, amount):
+        outputs = [PartialTxOutput.from_address_and_value(self.dest_addr, amount)]
+        return CoinChooserBranchAndBound().make_tx(coins=coins, inputs=[], outputs=outputs,
+                                                   change_addrs=[self.change_addr],
+                                                   fee_estimator_vb=lambda size: int(size),
+                                                   dust_threshold=546)
+
+    def test_registered(self):
+        self.assertIs(CoinChooserBranchAndBound, COIN_CHOOSERS['Changeless'])
+
+    def test_finds_changeless_solution(self):
+        coins = [_make_coin(1, 1_000_000), _make_coin(2, 2_000_000), _make_coin(3, 5_000_000)]
+        tx = self._make_tx(coins, 3_000_000 - 300)
+        self.assertEqual(1, len(tx.outputs()))
+        self.assertEqual({1_000_000, 2_000_000}, {txin.value_sats() for txin in tx.inputs()})
+        self.assertTrue(0 < tx.get_fee() < 300 + 546)
+
+    def test_prefers_confirmed_coins(self):
+        coins = [_make_coin(1, 1_000_000, height=0), _make_coin(2, 2_000_000, height=0),
+                 _make_coin(3, 3_000_000), _make_coin(4, 5_000_000)]
+        tx = self._make_tx(coins, 3_000_000 - 300)
+        self.assertEqual(1, len(tx.outputs()))
+        self.assertEqual([3_000_000], [txin.value_sats() for txin in tx.inputs()])
+
+    def test_falls_back_to_change(self):
+        coins = [_make_coin(1, 1_000_000), _make_coin(2, 2_000_000), _make_coin(3, 5_000_000)]
+        tx = self._make_tx(coins, 4_000_000)
+        self.assertEqual(2, len(tx.outputs()))
+        self.assertEqual(4_000_000, sum(o.value for o in tx.outputs() if o.address == self.dest_addr))
+        with self.assertRaises(NotEnoughFunds):
+            self._make_tx(coins, 9_000_000)
@@ -7,6 +7,9 @@ from electrumsys.commands import Commands, eval_bool
 from electrumsys import storage, wallet
 from electrumsys.wallet import restore_wallet_from_text
 from electrumsys.simple_config import SimpleConfig
+from electrumsys.address_synchronizer import TX_HEIGHT_UNCONFIRMED
+from electrumsys.transaction import (Transaction, PartialTransaction, PartialTxInput, PartialTxOutput,
+                                     TxOutpoint, tx_from_any)
 
 from . import TestCaseForTestnet, ElectrumSysTestCase
 
@@ -194,3 +197,29 @@ class TestCommandsTestnet(TestCaseForTestnet):
                          cmds._run('getprivatekeyforpath', ("m/0/10000",), wallet=wallet))
         self.assertEqual("p2wpkh:cQAj4WGf1socCPCJNMjXYCJ8Bs5JUAk5pbDr4ris44QdgAXcV24S",
                          cmds._run('getprivatekeyforpath', ("m/5h/100000/88h/7",), wallet=wallet))
+
+    @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
+    def test_paytomanybatch(self, mock_save_db):
+        wallet = restore_wallet_from_text('frost repair depend effort salon ring foam oak cancel receive save usage',
+                                          gap_limit=8,
+                                          path='if_this_exists_mocking_failed_648151893',
+                                          config=self.config)['wallet']
+        txin = PartialTxInput(prevout=TxOutpoint(txid=bytes([1]) * 32, out_idx=0))
+        txin.script_sig = b''
+        funding_outputs = [PartialTxOutput.from_address_and_value(addr, 1_000_000)
+                           for addr in wallet.get_receiving_addresses()]
+        funding_tx = Transaction(PartialTransaction.from_io([txin], funding_outputs).serialize_to_network())
+        wallet.receive_tx_callback(funding_tx.txid(), funding_tx, TX_HEIGHT_UNCONFIRMED)
+        cmds = Commands(config=self.config)
+        dest_addr = 'tb1q3ws2p0qjk5vrravv065xqlnkckvzcpclk79eu2'
+        payouts = [[[dest_addr, '0.015']], [[dest_addr, '0.005'], [dest_addr, '0.001']]]
+        txs = [tx_from_any(tx) for tx in cmds._run('paytomanybatch', (payouts,), wallet=wallet,
+                                                    feerate=1, locktime=1325501)]
+        self.assertEqual(2, len(txs))
+        self.assertFalse({txin.prevout for txin in txs[0].inputs()} & {txin.prevout for txin in txs[1].inputs()})
+        for tx, outputs in zip(txs, payouts):
+            self.assertEqual(1325501, tx.locktime)
+            self.assertEqual(sorted(int(Decimal(amount) * 10**8) for addr, amount in outputs),
+                             sorted(o.value for o in tx.outputs() if o.address == dest_addr))
+        with self.assertRaises(Exception):
+            cmds._run('paytomanybatch', ([[[dest_addr, '!']]],), wallet=wallet, feerate=1)
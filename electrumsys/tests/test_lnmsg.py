@@ -240,6 +240,21 @@ class TestLNMsg(TestCaseForTestnet):
                           ),
                          decode_msg(bfh("01020000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000043497fd7f826957108f4a30fd9cec3aeba79972084e90ead01ea33090000000000d43100006f00025e6ed0830100009000000000000000c8000001f400000023")))
 
+    def test_decode_msg__truncated_mandatory_fields(self):
+        chan_upd = bfh("01020000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000043497fd7f826957108f4a30fd9cec3aeba79972084e90ead01ea33090000000000d43100006f00025e6ed0830100009000000000000000c8000001f400000023")
+        with self.assertRaises(UnexpectedEndOfStream):
+            decode_msg(chan_upd[:-1])
+        # optional trailing field partially present -> ignored
+        self.assertNotIn('htlc_maximum_msat', decode_msg(chan_upd + bytes(7))[1])
+        commitment_signed = encode_msg("commitment_signed", channel_id=bytes(32), signature=bytes(64),
+                                       num_htlcs=2, htlc_signature=bytes(128))
+        self.assertEqual(bytes(128), decode_msg(commitment_signed)[1]['htlc_signature'])
+        with self.assertRaises(UnexpectedEndOfStream):
+            decode_msg(commitment_signed[:-1])
+        with self.assertRaises(UnexpectedFieldSizeForEncoder):
+            encode_msg("commitment_signed", channel_id=bytes(32), signature=bytes(64),
+                       num_htlcs=2, htlc_signature=bytes(64))
+
     def test_encode_decode_msg__ints_can_be_passed_as_bytes(self):
         self.assertEqual(bfh("01020000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000000043497fd7f826957108f4a30fd9cec3aeba79972084e90ead01ea33090000000000d43100006f00025e6ed0830100009000000000000000c8000001f400000023000000003b9aca00"),
                          encode_msg(
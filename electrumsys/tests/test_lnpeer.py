@@ -5,28 +5,33 @@ import os
 from contextlib import contextmanager
 from collections import defaultdict
 import logging
+import threading
+import time
 import concurrent
 from concurrent import futures
 import unittest
+from unittest import mock
 from typing import Iterable, NamedTuple
 
 from aiorpcx import TaskGroup
 
 from electrumsys import constants
 from electrumsys.network import Network
-from electrumsys.ecc import ECPrivkey
+from electrumsys.ecc import ECPrivkey, ECPubkey, sig_string_from_r_and_s
 from electrumsys import simple_config, lnutil
-from electrumsys.lnaddr import lnencode, LnAddr, lndecode
-from electrumsys.bitcoin import COIN, sha256
+from electrumsys.lnaddr import lnencode, LnAddr, lndecode, SerializableKey
+from electrumsys.bitcoin import COIN, sha256, sha256d
 from electrumsys.util import bh2u, create_and_start_event_loop, NetworkRetryManager
 from electrumsys.lnpeer import Peer
-from electrumsys.lnutil import LNPeerAddr, Keypair, privkey_to_pubkey
+from electrumsys.lnutil import LNPeerAddr, Keypair, privkey_to_pubkey, ShortChannelID
 from electrumsys.lnutil import LightningPeerConnectionClosed, RemoteMisbehaving
 from electrumsys.lnutil import PaymentFailure, LnFeatures, HTLCOwner
 from electrumsys.lnchannel import ChannelState, PeerState, Channel
-from electrumsys.lnrouter import LNPathFinder, PathEdge, LNPathInconsistent
+from electrumsys import lnrouter
+from electrumsys.lnrouter import LNPathFinder, PathEdge, LNPathInconsistent, PathFindingTimeout
 from electrumsys.channel_db import ChannelDB
-from electrumsys.lnworker import LNWallet, NoPathFound
+from electrumsys.lnverifier import VerifiedGossipCache, verify_sigs_for_gossip
+from electrumsys.lnworker import LNWallet, NoPathFound, GossipSyncScheduler
 from electrumsys.lnmsg import encode_msg, decode_msg
 from electrumsys.logging import console_stderr_handler, Logger
 from electrumsys.lnworker import PaymentInfo, RECEIVED, PR_UNPAID
@@ -119,6 +124,7 @@ class MockLNWallet(Logger, NetworkRetryManager[LNPeerAddr]):
         self.features = LnFeatures(0)
         self.features |= LnFeatures.OPTION_DATA_LOSS_PROTECT_OPT
         self.pending_payments = defaultdict(asyncio.Future)
+        self.pending_payment_routes = {}
         for chan in chans:
             chan.lnworker = self
         self._peers = {}  # bytes -> Peer
@@ -167,9 +173,12 @@ class MockLNWallet(Logger, NetworkRetryManager[LNPeerAddr]):
     save_preimage = LNWallet.save_preimage
     get_preimage = LNWallet.get_preimage
     _create_route_from_invoice = LNWallet._create_route_from_invoice
+    _create_routes_from_invoice = LNWallet._create_routes_from_invoice
+    create_routes_for_payment = LNWallet.create_routes_for_payment
     _check_invoice = staticmethod(LNWallet._check_invoice)
     _pay_to_route = LNWallet._pay_to_route
     _pay = LNWallet._pay
+    _filter_routes_after_failure = LNWallet._filter_routes_after_failure
     force_close_channel = LNWallet.force_close_channel
     try_force_closing = LNWallet.try_force_closing
     get_first_timestamp = lambda self: 0
@@ -178,6 +187,7 @@ class MockLNWallet(Logger, NetworkRetryManager[LNPeerAddr]):
     channels_for_peer = LNWallet.channels_for_peer
     _calc_routing_hints_for_invoice = LNWallet._calc_routing_hints_for_invoice
     handle_error_code_from_failed_htlc = LNWallet.handle_error_code_from_failed_htlc
+    _handle_error_code_from_failed_htlc = LNWallet._handle_error_code_from_failed_htlc
 
 
 class MockTransport:
@@ -568,6 +578,38 @@ class TestPeer(ElectrumSysTestCase):
         with self.assertRaises(PaymentDone):
             run(f())
 
+    @needs_test_with_all_chacha20_implementations
+    def test_payment_multihop_hint_channel_failure(self):
+        graph = self.prepare_chans_and_peers_in_square()
+        # bob cannot forward through his channel to dave, the first routing hint
+        graph.chan_bd.set_can_send_ctx_updates(False)
+        peers = graph.all_peers()
+        async def pay(pay_req):
+            with mock.patch.object(graph.w_a, 'create_routes_for_payment',
+                                   wraps=graph.w_a.create_routes_for_payment) as create_routes:
+                result, log = await graph.w_a._pay(pay_req, attempts=3)
+            self.assertTrue(result)
+            self.assertEqual(2, len(log))
+            self.assertEqual(graph.chan_bd.short_channel_id, log[0].route[1].short_channel_id)
+            self.assertEqual(OnionFailureCode.TEMPORARY_CHANNEL_FAILURE, log[0].failure_details.failure_msg.code)
+            self.assertEqual(graph.chan_cd.short_channel_id, log[1].route[1].short_channel_id)
+            # the route through carol was found with the first one, but after a
+            # failure on a hint channel, we search again, without that hint
+            self.assertEqual(2, create_routes.call_count)
+            raise PaymentDone()
+        async def f():
+            async with TaskGroup() as group:
+                for peer in peers:
+                    await group.spawn(peer._message_loop())
+                    await group.spawn(peer.htlc_switch())
+                await asyncio.sleep(0.2)
+                pay_req = await self.prepare_invoice(graph.w_d, include_routing_hints=True)
+                await group.spawn(pay(pay_req))
+        # keep the hints in the order of dave's channels
+        with mock.patch('random.shuffle'):
+            with self.assertRaises(PaymentDone):
+                run(f())
+
     @needs_test_with_all_chacha20_implementations
     def test_close(self):
         alice_channel, bob_channel = create_test_channels()
@@ -625,6 +667,99 @@ class TestPeer(ElectrumSysTestCase):
         with self.assertRaises(PaymentFailure):
             run(f())
 
+    def test_create_routes_for_payment(self):
+        alice_channel, bob_channel = create_test_channels()
+        p1, p2, w1, w2, _q1, _q2 = self.prepare_peers(alice_channel, bob_channel)
+        lnaddr = LnAddr(paymenthash=bytes(32), amount=Decimal('0.0001'))
+        lnaddr.pubkey = SerializableKey(ECPubkey(w2.node_keypair.pubkey))
+        path_finder = w1.network.path_finder
+        routes = run(w1.create_routes_for_payment(lnaddr))
+        self.assertEqual([[w2.node_keypair.pubkey]], [[edge.node_id for edge in route] for route in routes])
+        # the time budget is read from the config, and only counts once the search runs
+        w1.network.config.set_key('lightning_pathfinding_time_budget', 0.1)
+        with mock.patch.object(lnrouter._PathSearch, 'CHECK_INTERVAL', 1):
+            path_finder.executor.submit(time.sleep, 0.3)
+            self.assertEqual(routes, run(w1.create_routes_for_payment(lnaddr)))
+            w1.network.config.set_key('lightning_pathfinding_time_budget', 0)
+            with self.assertRaises(PathFindingTimeout):
+                run(w1.create_routes_for_payment(lnaddr))
+        # the search is told to stop when the coroutine is cancelled
+        started = threading.Event()
+        stopped = threading.Event()
+        def slow_search(decoded_invoice, *, cancel_event, **kwargs):
+            started.set()
+            if cancel_event.wait(timeout=5):
+                stopped.set()
+        async def cancel_search():
+            task = asyncio.ensure_future(w1.create_routes_for_payment(lnaddr))
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        with mock.patch.object(w1, '_create_routes_from_invoice', side_effect=slow_search):
+            run(cancel_search())
+            self.assertTrue(stopped.wait(timeout=1))
+
+    def test_verify_sigs_for_gossip(self):
+        privkey = ECPrivkey(bytes([7]) * 32)
+        def node_announcement(timestamp):
+            fields = dict(flen=0, features=b'', timestamp=timestamp, node_id=privkey.get_public_key_bytes(),
+                          rgb_color=b'\x00' * 3, alias=b'\x00' * 32, addrlen=0, addresses=b'')
+            raw = encode_msg('node_announcement', signature=bytes(64), **fields)
+            signature = privkey.sign(sha256d(raw[66:]), sig_string_from_r_and_s)
+            raw = encode_msg('node_announcement', signature=signature, **fields)
+            payload = decode_msg(raw)[1]
+            payload['raw'] = raw
+            return payload
+        good = node_announcement(1)
+        bad = node_announcement(2)
+        bad['raw'] = bad['raw'][:-1] + b'\x01'
+        cache = VerifiedGossipCache(max_entries=10)
+        self.assertFalse(verify_sigs_for_gossip([], [good, bad], cache=cache))
+        self.assertEqual(0, len(cache))
+        # duplicates are only verified once, and verified announcements are cached
+        self.assertTrue(verify_sigs_for_gossip([], [good, good], cache=cache))
+        self.assertEqual(1, len(cache))
+        with mock.patch('electrumsys.ecc.verify_signatures', return_value=[]) as verify_signatures:
+            self.assertTrue(verify_sigs_for_gossip([], [good], cache=cache))
+            verify_signatures.assert_called_once_with([])
+
+    def test_gossip_sync_scheduler(self):
+        scheduler = GossipSyncScheduler()
+        scheduler.BATCH_SIZE = 3
+        ids = [ShortChannelID.from_components(600_000 + i, 0, 0) for i in range(8)]
+        node_a, node_b, node_c, node_d = [b'\x02' + bytes([x]) * 32 for x in b'abcd']
+        async def add_ids(new_ids):
+            scheduler.add_ids(new_ids)
+        async def wait_and_assign(node_id):
+            await scheduler.wait_for_ids()
+            return scheduler.assign(node_id)
+        # peers without work wait until ids are added
+        waiter = asyncio.run_coroutine_threadsafe(wait_and_assign(node_c), self.asyncio_loop)
+        run(asyncio.sleep(0.01))
+        self.assertFalse(waiter.done())
+        run(add_ids(ids[::-1]))
+        # peers get disjoint ranges of ids
+        self.assertEqual(ids[0:3], waiter.result())
+        self.assertEqual(ids[3:6], scheduler.assign(node_a))
+        self.assertEqual(ids[6:8], scheduler.assign(node_b))
+        self.assertEqual([], scheduler.assign(node_d))
+        # ids that are being queried are not handed out again
+        run(add_ids(ids))
+        self.assertEqual(8, scheduler.num_unresolved())
+        scheduler.answered(node_a)
+        self.assertEqual(5, scheduler.num_unresolved())
+        self.assertGreater(scheduler.get_sync_rate(), 0)
+        # the batch of a peer that goes away is handed out again
+        scheduler.release(node_b)
+        self.assertEqual(ids[6:8], scheduler.assign(node_a))
+        # messages that were handed to the ChannelDB are dropped
+        msgs = [{'raw': bytes([i])} for i in range(3)]
+        self.assertEqual(msgs[:2], scheduler.remove_seen([msgs[0], msgs[1], msgs[0]]))
+        scheduler.add_seen(msgs[:1])
+        self.assertEqual(msgs[1:], scheduler.remove_seen(msgs))
+
 
 def run(coro):
     return asyncio.run_coroutine_threadsafe(coro, loop=asyncio.get_event_loop()).result()
@@ -1,9 +1,15 @@
 import unittest
+from unittest import mock
 import tempfile
 import shutil
 import asyncio
+import concurrent.futures
+import os
+import sqlite3
+import threading
+import time
 
-from electrumsys.util import bh2u, bfh, create_and_start_event_loop
+from electrumsys.util import bh2u, bfh, create_and_start_event_loop, get_headers_dir
 from electrumsys.lnonion import (OnionHopsDataSingle, new_onion_packet,
                               process_onion_packet, _decode_onion_error, decode_onion_error,
                               OnionFailureCode, OnionPacket)
@@ -11,8 +17,11 @@ from electrumsys import bitcoin, lnrouter
 from electrumsys.constants import BitcoinTestnet
 from electrumsys.simple_config import SimpleConfig
 from electrumsys.lnrouter import PathEdge
+from electrumsys.lnutil import ShortChannelID
+from electrumsys.lnmsg import encode_msg, decode_msg
+from electrumsys.sql_db import sql
 
-from . import TestCaseForTestnet
+from . import TestCaseForTestnet, wait_for_future
 from .test_bitcoin import needs_test_with_all_chacha20_implementations
 
 
@@ -28,7 +37,7 @@ class Test_LNRouter(TestCaseForTestnet):
         self._loop_thread.join(timeout=1)
         super().tearDown()
 
-    def test_find_path_for_payment(self):
+    def _make_channel_db(self):
         class fake_network:
             config = self.config
             asyncio_loop = asyncio.get_event_loop()
@@ -37,7 +46,10 @@ class Test_LNRouter(TestCaseForTestnet):
             interface = None
         fake_network.channel_db = lnrouter.ChannelDB(fake_network())
         fake_network.channel_db.data_loaded.set()
-        cdb = fake_network.channel_db
+        return fake_network.channel_db
+
+    def test_find_path_for_payment(self):
+        cdb = self._make_channel_db()
         path_finder = lnrouter.LNPathFinder(cdb)
         self.assertEqual(cdb.num_channels, 0)
         cdb.add_channel_announcement({'node_id_1': b'\x02bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb', 'node_id_2': b'\x02cccccccccccccccccccccccccccccccc',
@@ -97,6 +109,292 @@ class Test_LNRouter(TestCaseForTestnet):
         self._loop_thread.join(timeout=1)
         cdb.sql_thread.join(timeout=1)
 
+    @staticmethod
+    def _add_channel(cdb, scid: bytes, node1: bytes, node2: bytes, *, fee_base_msat=100):
+        cdb.add_channel_announcement({'node_id_1': node1, 'node_id_2': node2,
+                                     'bitcoin_key_1': node1, 'bitcoin_key_2': node2,
+                                     'short_channel_id': scid,
+                                     'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+                                     'len': 0, 'features': b''}, trusted=True)
+        for direction in (b'\x00', b'\x01'):
+            cdb.add_channel_update({'short_channel_id': scid, 'message_flags': b'\x00', 'channel_flags': direction,
+                                    'cltv_expiry_delta': 10, 'htlc_minimum_msat': 250, 'fee_base_msat': fee_base_msat,
+                                    'fee_proportional_millionths': 150,
+                                    'chain_hash': BitcoinTestnet.rev_genesis_bytes(), 'timestamp': 0})
+
+    def test_channel_graph_snapshot(self):
+        cdb = self._make_channel_db()
+        path_finder = lnrouter.LNPathFinder(cdb)
+        add_channel = lambda scid, node1, node2: self._add_channel(cdb, scid, node1, node2)
+        node_a, node_b, node_c = b'\x02' + b'a' * 32, b'\x02' + b'b' * 32, b'\x02' + b'c' * 32
+        add_channel(bfh('0000000000000001'), node_a, node_b)
+        add_channel(bfh('0000000000000002'), node_b, node_c)
+        graph = cdb.get_channel_graph()
+        self.assertIs(graph, cdb.get_channel_graph())
+        self.assertEqual(3, graph.num_nodes)
+        path = path_finder.find_path_for_payment(node_a, node_c, 100000)
+        self.assertEqual([bfh('0000000000000001'), bfh('0000000000000002')],
+                         [edge.short_channel_id for edge in path])
+        # a direct channel is preferred, once it has both policies
+        add_channel(bfh('0000000000000003'), node_a, node_c)
+        self.assertEqual(1, len(path_finder.find_path_for_payment(node_a, node_c, 100000)))
+        cdb.prune_old_policies(-1)
+        self.assertIsNone(path_finder.find_path_for_payment(node_a, node_c, 100000))
+        # snapshots taken before are not affected
+        self.assertEqual(2, len(graph.short_channel_ids))
+        self.assertEqual([graph.POLICY_KNOWN] * 4, list(graph.policy_flags))
+        cdb.remove_channel(ShortChannelID(bfh('0000000000000001')))
+        add_channel(bfh('0000000000000004'), node_a, node_b)
+        graph2 = cdb.get_channel_graph()
+        self.assertEqual(3, len(graph2.short_channel_ids))  # slot of removed channel is reused
+        self.assertNotIn(bfh('0000000000000001'), graph2.channel_index)
+        path = path_finder.find_path_for_payment(node_a, node_b, 100000)
+        self.assertEqual([bfh('0000000000000004')], [edge.short_channel_id for edge in path])
+        path_finder.mission_control.report_failure(ShortChannelID(bfh('0000000000000004')), node_a, 0)
+        self.assertIsNone(path_finder.find_path_for_payment(node_a, node_b, 100000))
+
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+        cdb.sql_thread.join(timeout=1)
+
+    def test_find_paths_for_payment(self):
+        cdb = self._make_channel_db()
+        path_finder = lnrouter.LNPathFinder(cdb)
+        node_a, node_b, node_c, node_d, node_e = [b'\x02' + bytes([x]) * 32 for x in b'abcde']
+        self._add_channel(cdb, bfh('0000000000000001'), node_a, node_b)
+        self._add_channel(cdb, bfh('0000000000000002'), node_b, node_e)
+        self._add_channel(cdb, bfh('0000000000000003'), node_a, node_c)
+        self._add_channel(cdb, bfh('0000000000000004'), node_c, node_e, fee_base_msat=200)
+        self._add_channel(cdb, bfh('0000000000000005'), node_b, node_d)
+        self._add_channel(cdb, bfh('0000000000000006'), node_d, node_e, fee_base_msat=300)
+        paths = path_finder.find_paths_for_payment(node_a, node_e, 100000, num_paths=3)
+        self.assertEqual([[1, 2], [3, 4]],
+                         [[int.from_bytes(edge.short_channel_id, 'big') for edge in path] for path in paths])
+        self.assertEqual(node_e, paths[1][-1].node_id)
+        self.assertEqual(paths[:1], path_finder.find_paths_for_payment(node_a, node_e, 100000, num_paths=1))
+        self.assertEqual(paths[0], path_finder.find_path_for_payment(node_a, node_e, 100000))
+        # the direct path is found once
+        self._add_channel(cdb, bfh('0000000000000007'), node_a, node_e)
+        paths = path_finder.find_paths_for_payment(node_a, node_e, 100000, num_paths=5)
+        self.assertEqual([[7], [1, 2], [3, 4]],
+                         [[int.from_bytes(edge.short_channel_id, 'big') for edge in path] for path in paths])
+
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+        cdb.sql_thread.join(timeout=1)
+
+    def test_mission_control(self):
+        cdb = self._make_channel_db()
+        path_finder = lnrouter.LNPathFinder(cdb)
+        mission_control = path_finder.mission_control
+        node_a, node_b, node_c, node_e = [b'\x02' + bytes([x]) * 32 for x in b'abce']
+        self._add_channel(cdb, bfh('0000000000000001'), node_a, node_b)
+        self._add_channel(cdb, bfh('0000000000000002'), node_b, node_e)
+        self._add_channel(cdb, bfh('0000000000000003'), node_a, node_c)
+        self._add_channel(cdb, bfh('0000000000000004'), node_c, node_e, fee_base_msat=4000)
+        scids = lambda path: [int.from_bytes(edge.short_channel_id, 'big') for edge in path]
+        path = path_finder.find_path_for_payment(node_a, node_e, 100000)
+        self.assertEqual([1, 2], scids(path))
+        route = path_finder.create_route_from_path(path, node_a)
+        # node_b could not forward the payment through channel 2
+        mission_control.report_route(route, 100000, sender_idx=0, channel_failed=True)
+        self.assertEqual([3, 4], scids(path_finder.find_path_for_payment(node_a, node_e, 100000)))
+        # smaller amounts are less likely to fail
+        self.assertEqual([1, 2], scids(path_finder.find_path_for_payment(node_a, node_e, 1000)))
+        # the payment goes through another route, and a smaller one through channel 2
+        mission_control.report_route(path_finder.create_route_from_path(
+            path_finder.find_path_for_payment(node_a, node_e, 100000), node_a), 100000)
+        mission_control.report_route(route, 50000)
+        history_2 = cdb.get_edge_history(bfh('0000000000000002') + node_b)
+        history_4 = cdb.get_edge_history(bfh('0000000000000004') + node_c)
+        self.assertEqual((50000, 100000), (history_2.success_amount_msat, history_2.fail_amount_msat))
+        self.assertEqual((100000, 0), (history_4.success_amount_msat, history_4.fail_time))
+        self.assertIsNone(cdb.get_edge_history(bfh('0000000000000003') + node_a))  # our own channel
+        now = history_2.fail_time
+        self.assertAlmostEqual(0.95, mission_control.get_probability(history_2, 50000, now))
+        self.assertAlmostEqual(0.24, mission_control.get_probability(history_2, 80000, now))
+        self.assertAlmostEqual(0, mission_control.get_probability(history_2, 100000, now))
+        self.assertAlmostEqual(0.3, mission_control.get_probability(history_2, 100000, now + 3600))
+        self.assertEqual(float('inf'), mission_control.edge_cost(history_2, 100000, now))
+        self.assertLess(mission_control.edge_cost(history_2, 50000, now), mission_control.edge_cost(None, 50000, now))
+        self.assertFalse(mission_control.is_edge_usable(ShortChannelID(bfh('0000000000000002')), node_b, 100000, now=now))
+        self.assertTrue(mission_control.is_edge_usable(ShortChannelID(bfh('0000000000000002')), node_b, 50000, now=now))
+        self.assertTrue(mission_control.is_edge_usable(ShortChannelID(bfh('0000000000000005')), node_e, 100000, now=now))
+        # once the failure is forgotten, the route that went through is still preferred
+        mission_control.report_failure(ShortChannelID(bfh('0000000000000002')), node_b, 100000,
+                                       now=now - 10 * mission_control.HALF_LIFE)
+        history_2 = cdb.get_edge_history(bfh('0000000000000002') + node_b)
+        self.assertAlmostEqual(0.6, mission_control.get_probability(history_2, 100000, now), places=2)
+        self.assertEqual([3, 4], scids(path_finder.find_path_for_payment(node_a, node_e, 100000)))
+        # a failure that does not depend on the amount
+        mission_control.report_failure(ShortChannelID(bfh('0000000000000002')), node_b, 0, now=now)
+        history_2 = cdb.get_edge_history(bfh('0000000000000002') + node_b)
+        self.assertEqual(float('inf'), mission_control.edge_cost(history_2, 1000, now))
+        # results are removed with their channel, and saved
+        self.assertEqual(2, len(cdb.get_all_edge_history()))
+        cdb.remove_channel(ShortChannelID(bfh('0000000000000002')))
+        expected = cdb.get_all_edge_history()
+        self.assertEqual([bfh('0000000000000004') + node_c], list(expected))
+        cdb.stop()
+        cdb.sql_thread.join(timeout=1)
+        cdb = self._make_channel_db()
+        wait_for_future(cdb.load_data())
+        self.assertEqual(expected, cdb.get_all_edge_history())
+        lnrouter.MissionControl(cdb).clear()
+        self.assertEqual({}, cdb.get_all_edge_history())
+
+        cdb.stop()
+        cdb.sql_thread.join(timeout=1)
+
+    def test_path_finding_deadline_and_snapshot(self):
+        cdb = self._make_channel_db()
+        path_finder = lnrouter.LNPathFinder(cdb)
+        node_a, node_b, node_c, node_e = [b'\x02' + bytes([x]) * 32 for x in b'abce']
+        self._add_channel(cdb, bfh('0000000000000001'), node_a, node_b)
+        self._add_channel(cdb, bfh('0000000000000002'), node_b, node_e)
+        self._add_channel(cdb, bfh('0000000000000003'), node_a, node_c)
+        self._add_channel(cdb, bfh('0000000000000004'), node_c, node_e, fee_base_msat=200)
+        with mock.patch.object(lnrouter._PathSearch, 'CHECK_INTERVAL', 1):
+            with self.assertRaises(lnrouter.PathFindingTimeout):
+                path_finder.find_path_for_payment(node_a, node_e, 100000, deadline=time.monotonic() - 1)
+            cancel_event = threading.Event()
+            cancel_event.set()
+            with self.assertRaises(concurrent.futures.CancelledError):
+                path_finder.executor.submit(path_finder.find_path_for_payment, node_a, node_e, 100000,
+                                            cancel_event=cancel_event).result()
+            path = path_finder.find_path_for_payment(node_a, node_e, 100000, deadline=time.monotonic() + 60)
+        self.assertEqual([bfh('0000000000000001'), bfh('0000000000000002')],
+                         [edge.short_channel_id for edge in path])
+        # the paths found before the deadline are kept
+        with mock.patch.object(path_finder, '_find_path_avoiding', side_effect=lnrouter.PathFindingTimeout):
+            self.assertEqual([path], path_finder.find_paths_for_payment(node_a, node_e, 100000, num_paths=2))
+        # the route is built with the policies the path was found with
+        graph = cdb.get_channel_graph()
+        cdb.add_channel_update({'short_channel_id': bfh('0000000000000002'), 'message_flags': b'\x00', 'channel_flags': b'\x00',
+                                'cltv_expiry_delta': 20, 'htlc_minimum_msat': 250, 'fee_base_msat': 900,
+                                'fee_proportional_millionths': 150,
+                                'chain_hash': BitcoinTestnet.rev_genesis_bytes(), 'timestamp': 100})
+        route = path_finder.create_route_from_path(path, node_a, graph=graph)
+        self.assertEqual((100, 10), (route[1].fee_base_msat, route[1].cltv_expiry_delta))
+        self.assertEqual(route[:1], path_finder.create_route_from_path(path[:1], node_a))
+        route = path_finder.create_route_from_path(path, node_a)
+        self.assertEqual((900, 20), (route[1].fee_base_msat, route[1].cltv_expiry_delta))
+        with self.assertRaises(lnrouter.LNPathInconsistent):
+            path_finder.create_route_from_path([path[1]], node_a, graph=graph)
+
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+        cdb.sql_thread.join(timeout=1)
+
+    def test_load_data_without_decoding(self):
+        def with_raw(msg_type, **fields):
+            raw = encode_msg(msg_type, **fields)
+            payload = decode_msg(raw)[1]
+            payload['raw'] = raw
+            return payload
+        def load_channel_db():
+            self.asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+            while not self.asyncio_loop.is_running():
+                time.sleep(0.01)
+            cdb = self._make_channel_db()
+            wait_for_future(cdb.load_data())
+            return cdb
+        def stop(cdb):
+            # the sql thread commits pending writes before it stops
+            cdb.stop()
+            cdb.sql_thread.join(timeout=1)
+            self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+            self._loop_thread.join(timeout=1)
+
+        node_a, node_b = b'\x02' + b'a' * 32, b'\x02' + b'b' * 32
+        scid = bfh('0000000000000001')
+        cdb = self._make_channel_db()
+        cdb.add_channel_announcement(with_raw(
+            'channel_announcement', node_signature_1=bytes(64), node_signature_2=bytes(64),
+            bitcoin_signature_1=bytes(64), bitcoin_signature_2=bytes(64), len=0, features=b'',
+            chain_hash=BitcoinTestnet.rev_genesis_bytes(), short_channel_id=scid,
+            node_id_1=node_a, node_id_2=node_b, bitcoin_key_1=node_a, bitcoin_key_2=node_b))
+        now = int(time.time())
+        for direction, htlc_maximum_msat in ((b'\x00', 10**9), (b'\x01', 2**64 - 1)):
+            cdb.add_channel_update(with_raw(
+                'channel_update', signature=bytes(64), chain_hash=BitcoinTestnet.rev_genesis_bytes(),
+                short_channel_id=scid, timestamp=now, message_flags=b'\x01', channel_flags=direction,
+                cltv_expiry_delta=40, htlc_minimum_msat=1000, fee_base_msat=1000,
+                fee_proportional_millionths=10, htlc_maximum_msat=htlc_maximum_msat))
+        cdb.add_node_announcement(with_raw(
+            'node_announcement', signature=bytes(64), flen=1, features=b'\x02', timestamp=now,
+            node_id=node_a, rgb_color=b'\x00' * 3, alias=b'alice'.ljust(32, b'\x00'), addrlen=0, addresses=b''))
+        expected = (dict(cdb._channels), dict(cdb._policies), dict(cdb._nodes))
+        stop(cdb)
+        # rows written by this version are loaded from the decoded columns
+        with mock.patch('electrumsys.channel_db.decode_msg', wraps=decode_msg) as decode_msg_mock:
+            cdb = load_channel_db()
+            stop(cdb)
+        self.assertEqual(expected, (cdb._channels, cdb._policies, cdb._nodes))
+        # htlc_maximum_msat does not fit in an sqlite integer
+        self.assertEqual(1, decode_msg_mock.call_count)
+        # rows written by older versions are decoded, and their decoded columns are filled in
+        conn = sqlite3.connect(os.path.join(get_headers_dir(self.config), 'gossip_db'))
+        conn.execute("UPDATE channel_info SET node1_id=NULL, node2_id=NULL")
+        conn.execute("UPDATE policy SET timestamp=NULL")
+        conn.execute("UPDATE node_info SET timestamp=NULL")
+        conn.commit()
+        conn.close()
+        cdb = load_channel_db()
+        stop(cdb)
+        self.assertEqual(expected, (cdb._channels, cdb._policies, cdb._nodes))
+        with mock.patch('electrumsys.channel_db.decode_msg', wraps=decode_msg) as decode_msg_mock:
+            cdb = load_channel_db()
+        self.assertEqual(1, decode_msg_mock.call_count)
+        self.assertEqual(expected, (cdb._channels, cdb._policies, cdb._nodes))
+
+    def test_prune_old_policies_in_slices(self):
+        while not self.asyncio_loop.is_running():
+            time.sleep(0.01)
+        cdb = self._make_channel_db()
+        now = int(time.time())
+        nodes = [b'\x02' + bytes([x]) * 32 for x in range(6)]
+        def add_update(scid, direction, timestamp):
+            raw = encode_msg('channel_update', signature=bytes(64), chain_hash=BitcoinTestnet.rev_genesis_bytes(),
+                             short_channel_id=scid, timestamp=timestamp, message_flags=b'\x00',
+                             channel_flags=direction, cltv_expiry_delta=10, htlc_minimum_msat=250,
+                             fee_base_msat=100, fee_proportional_millionths=150)
+            payload = decode_msg(raw)[1]
+            payload['raw'] = raw
+            cdb.add_channel_update(payload)
+        for i in range(3):
+            scid = bytes(7) + bytes([i + 1])
+            node1, node2 = nodes[2 * i], nodes[2 * i + 1]
+            cdb.add_channel_announcement({'node_id_1': node1, 'node_id_2': node2, 'bitcoin_key_1': node1,
+                                          'bitcoin_key_2': node2, 'short_channel_id': scid,
+                                          'chain_hash': BitcoinTestnet.rev_genesis_bytes(),
+                                          'len': 0, 'features': b'', 'raw': b'chan%d' % i}, trusted=True)
+            add_update(scid, b'\x00', now - 1000 - i)
+            add_update(scid, b'\x01', now - 10)
+        # a policy that is replaced by a newer one is not pruned
+        add_update(bytes(7) + b'\x03', b'\x00', now - 100)
+        self.assertEqual(6, len(cdb._policies))
+        self.assertFalse(cdb.prune_old_policies(500, max_num=1))
+        self.assertEqual(5, len(cdb._policies))
+        self.assertIsNone(cdb._policies.get((nodes[2], bytes(7) + b'\x02')))
+        self.assertTrue(cdb.prune_old_policies(500, max_num=1))
+        self.assertTrue(cdb.prune_old_policies(500, max_num=1))
+        self.assertEqual(4, len(cdb._policies))
+        self.assertEqual((0, 2, 1), cdb.get_num_channels_partitioned_by_policy_count())
+        fut = sql(lambda db: db.conn.execute("SELECT timestamp FROM policy ORDER BY timestamp").fetchall())(cdb)
+        self.assertEqual([(now - 100,)] + [(now - 10,)] * 3, wait_for_future(fut))
+        cdb.prune_old_policies(5)
+        self.assertEqual((3, 0, 0), cdb.get_num_channels_partitioned_by_policy_count())
+        self.assertFalse(cdb.prune_orphaned_channels(max_num=2))
+        self.assertTrue(cdb.prune_orphaned_channels(max_num=2))
+        self.assertEqual(0, len(cdb._channels))
+        cdb.stop()
+        cdb.sql_thread.join(timeout=1)
+        conn = sqlite3.connect(os.path.join(get_headers_dir(self.config), 'gossip_db'))
+        self.assertEqual(0, conn.execute("SELECT count(*) FROM policy").fetchone()[0])
+        self.assertEqual(0, conn.execute("SELECT count(*) FROM channel_info").fetchone()[0])
+        conn.close()
+
     @needs_test_with_all_chacha20_implementations
     def test_new_onion_packet_legacy(self):
         # test vector from bolt-04
@@ -0,0 +1,68 @@
+import asyncio
+from unittest import mock
+
+from electrumsys import util
+from electrumsys.lnwatcher import LNWatcher
+from electrumsys.simple_config import SimpleConfig
+from electrumsys.util import TxMinedInfo
+
+from . import ElectrumSysTestCase
+
+
+class MockNetwork:
+    def __init__(self, config):
+        self.config = config
+
+    def notify(self, key):
+        pass
+
+
+class TestLNWatcher(ElectrumSysTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = SimpleConfig({'electrumsys_path': self.electrumsys_path})
+        self.watcher = LNWatcher(MockNetwork(self.config))
+        self.watcher.synchronizer = mock.Mock()
+        self.watcher.CALLBACK_COALESCE_DELAY = 0
+        self.calls = []
+
+    def tearDown(self):
+        util.unregister_callback(self.watcher.on_network_update)
+        super().tearDown()
+
+    def _add_callback(self, address):
+        async def callback():
+            self.calls.append(address)
+        self.watcher.add_callback(address, callback)
+
+    def _update(self, event, *args):
+        self.calls = []
+        asyncio.get_event_loop().run_until_complete(self.watcher.on_network_update(event, *args))
+        return sorted(self.calls)
+
+    def test_only_affected_callbacks_run(self):
+        w = self.watcher
+        addr1 = 'bc1q2ccr34wzep58d4239tl3x3734ttle92a8srmuw'
+        addr2 = 'bc1qnp78h78vp92pwdwq5xvh8eprlga5q8gu66960c'
+        self._add_callback(addr1)
+        self._add_callback(addr2)
+        # new callbacks run on the next event
+        self.assertEqual(sorted([addr1, addr2]), self._update('fee'))
+        self.assertEqual([], self._update('fee'))
+        # addr1: open channel with a deeply mined funding tx, addr2: closed, still being swept
+        w._set_callback_deps(addr1, {'aa' * 32 + ':0': None}, settled=True)
+        w._set_callback_deps(addr2, {'bb' * 32 + ':0': 'cc' * 32}, settled=False)
+        self.assertEqual([addr2], self._update('blockchain_updated'))
+        # txs and address histories only run the callbacks that looked at them
+        info = TxMinedInfo(height=100, conf=1)
+        self.assertEqual([addr1], self._update('verified', w, 'aa' * 32, info))
+        self.assertEqual([addr2], self._update('verified', w, 'cc' * 32, info))
+        self.assertEqual([], self._update('verified', w, 'dd' * 32, info))
+        w.receive_history_callback(addr1, [], {})
+        self.assertEqual([addr1], self._update('wallet_updated', w))
+        self.assertEqual([], self._update('wallet_updated', w))
+        # events of other wallets are ignored
+        self.assertEqual([], self._update('verified', object(), 'aa' * 32, info))
+        w.remove_callback(addr2)
+        self.assertEqual([], self._update('blockchain_updated'))
@@ -1,11 +1,15 @@
 import asyncio
+import itertools
 import tempfile
 import unittest
+from collections import defaultdict
+
+from aiorpcx import RPCError
 
 from electrumsys import constants
 from electrumsys.simple_config import SimpleConfig
 from electrumsys import blockchain
-from electrumsys.interface import Interface, ServerAddr
+from electrumsys.interface import Interface, ServerAddr, NotificationSession
 from electrumsys.crypto import sha256
 from electrumsys.util import bh2u
 
@@ -117,6 +121,56 @@ class TestNetwork(ElectrumSysTestCase):
         self.assertEqual(self.interface.q.qsize(), 0)
 
 
+class MockBatch:
+    def __init__(self, session):
+        self.session = session
+        self.requests = []
+        self.results = None
+    def add_request(self, method, args=()):
+        self.requests.append((method, args))
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *exc_info):
+        self.session.batches.append(self.requests)
+        self.results = tuple(self.session.responses[args[0]] for method, args in self.requests)
+
+class MockNotificationSession(NotificationSession):
+    def __init__(self, responses):
+        # no transport: only the subscription bookkeeping is used
+        self.subscriptions = defaultdict(list)
+        self.cache = {}
+        self._msg_counter = itertools.count(start=1)
+        self.interface = None
+        self.responses = responses
+        self.batches = []
+    def send_batch(self, raise_errors=False):
+        return MockBatch(self)
+
+
+class TestNotificationSession(ElectrumSysTestCase):
+
+    def test_subscribe_many_sends_one_batch(self):
+        session = MockNotificationSession({'a': 'status_a', 'b': None, 'c': 'status_c'})
+        session.cache[session.get_hashable_key_for_rpc_call('blockchain.scripthash.subscribe', ['c'])] = 'cached_c'
+        queue = asyncio.Queue()
+        asyncio.get_event_loop().run_until_complete(
+            session.subscribe_many('blockchain.scripthash.subscribe', [['a'], ['b'], ['c']], queue))
+        # cached subscriptions are not requested again
+        self.assertEqual([[('blockchain.scripthash.subscribe', ['a']), ('blockchain.scripthash.subscribe', ['b'])]],
+                         session.batches)
+        self.assertEqual(['c', 'cached_c'], queue.get_nowait())
+        self.assertEqual(['a', 'status_a'], queue.get_nowait())
+        self.assertEqual(['b', None], queue.get_nowait())
+        self.assertEqual(3, len(session.subscriptions))
+        self.assertEqual('status_a', session.cache[session.get_hashable_key_for_rpc_call('blockchain.scripthash.subscribe', ['a'])])
+
+    def test_subscribe_many_raises_errors(self):
+        session = MockNotificationSession({'a': 'status_a', 'b': RPCError(1, 'history too large')})
+        with self.assertRaises(RPCError):
+            asyncio.get_event_loop().run_until_complete(
+                session.subscribe_many('blockchain.scripthash.subscribe', [['a'], ['b']], asyncio.Queue()))
+
+
 if __name__=="__main__":
     constants.set_regtest()
     unittest.main()
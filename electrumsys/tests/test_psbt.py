@@ -1,9 +1,11 @@
 from pprint import pprint
+import io
 import unittest
 
 from electrumsys import constants
-from electrumsys.transaction import (tx_from_any, PartialTransaction, BadHeaderMagic, UnexpectedEndOfStream,
-                                  SerializationError, PSBTInputConsistencyFailure)
+from electrumsys.transaction import (tx_from_any, tx_from_fd, PartialTransaction, BadHeaderMagic, UnexpectedEndOfStream,
+                                  SerializationError, PSBTInputConsistencyFailure, Transaction,
+                                  PartialTxInput, PartialTxOutput, TxOutpoint)
 
 from . import ElectrumSysTestCase, TestCaseForTestnet
 
@@ -267,3 +269,41 @@ class TestPSSYSomplexChecks(TestCaseForTestnet):
         tx1.combine_with_other_psbt(tx2)
         self.assertEqual("70736274ff01003f0200000001ffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff0000000000ffffffff010000000000000000036a0100000000000a0f0102030405060708090f0102030405060708090a0b0c0d0e0f0a0f0102030405060708100f0102030405060708090a0b0c0d0e0f000a0f0102030405060708090f0102030405060708090a0b0c0d0e0f0a0f0102030405060708100f0102030405060708090a0b0c0d0e0f000a0f0102030405060708090f0102030405060708090a0b0c0d0e0f0a0f0102030405060708100f0102030405060708090a0b0c0d0e0f00",
                          tx1.serialize_as_bytes().hex())
+
+
+class TestPSBTStreaming(TestCaseForTestnet):
+
+    @staticmethod
+    def _make_psbt(ns, *, sig: bytes) -> bytes:
+        inputs = []
+        for n in ns:
+            prev_tx = PartialTransaction.from_io(
+                [PartialTxInput(prevout=TxOutpoint(txid=bytes([n + 1]) * 32, out_idx=n))],
+                [PartialTxOutput(scriptpubkey=bytes.fromhex('0014') + bytes([n]) * 20, value=100_000 + n)])
+            prev_tx = Transaction(prev_tx.serialize_to_network(include_sigs=False))
+            txin = PartialTxInput(prevout=TxOutpoint(txid=bytes.fromhex(prev_tx.txid()), out_idx=0))
+            txin.utxo = prev_tx
+            pubkey = bytes([2]) + bytes([n]) * 32
+            txin.part_sigs[pubkey] = sig
+            txin.bip32_paths[pubkey] = (bytes(4), [n, 1])
+            inputs.append(txin)
+        outputs = [PartialTxOutput(scriptpubkey=bytes.fromhex('0014') + bytes([200 + ns[0]]) * 20, value=50_000)]
+        return PartialTransaction.from_io(inputs, outputs).serialize_as_bytes(force_psbt=True)
+
+    def test_streaming_parser_matches_in_memory_parser(self):
+        raw = self._make_psbt(range(5), sig=b'\x30' * 71)
+        with io.BytesIO(raw) as fd:
+            tx = PartialTransaction.from_psbt_fd(fd)
+        self.assertEqual(raw, tx.serialize_as_bytes(force_psbt=True))
+        self.assertEqual(raw, PartialTransaction.from_raw_psbt(raw).serialize_as_bytes(force_psbt=True))
+
+    def test_tx_from_fd(self):
+        raw = self._make_psbt(range(3), sig=b'\x30' * 71)
+        with io.BytesIO(raw) as fd:
+            self.assertEqual(raw, tx_from_fd(fd).serialize_as_bytes(force_psbt=True))
+        # anything else goes through tx_from_any
+        with io.BytesIO(raw.hex().encode() + b'\n') as fd:
+            self.assertEqual(raw, tx_from_fd(fd).serialize_as_bytes(force_psbt=True))
+        with io.BytesIO(raw[:-1]) as fd:
+            with self.assertRaises(UnexpectedEndOfStream):
+                tx_from_fd(fd)
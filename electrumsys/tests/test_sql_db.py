@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import time
+
+from electrumsys.util import create_and_start_event_loop
+from electrumsys.sql_db import sql, SqlDB
+
+from . import ElectrumSysTestCase, wait_for_future
+
+
+class KeyValueDB(SqlDB):
+
+    def create_database(self):
+        self.conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value INTEGER)")
+        self.conn.commit()
+
+    @sql
+    def put(self, key, value):
+        self.conn.execute("REPLACE INTO kv (key, value) VALUES (?,?)", (key, value))
+
+
+class ForeignKeyDB(SqlDB):
+
+    def create_database(self):
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE child (id INTEGER PRIMARY KEY, parent_id INTEGER "
+                          "REFERENCES parent(id) DEFERRABLE INITIALLY DEFERRED)")
+        self.conn.commit()
+
+
+class TestSqlDB(ElectrumSysTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+        while not self.asyncio_loop.is_running():
+            time.sleep(0.01)
+
+    def tearDown(self):
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+        super().tearDown()
+
+    def test_requests_are_committed_in_batches(self):
+        path = os.path.join(self.electrumsys_path, 'kv_db')
+        db = KeyValueDB(self.asyncio_loop, path)
+        def count_rows():
+            conn = sqlite3.connect(path)
+            try:
+                return conn.execute("SELECT count(*) FROM kv").fetchone()[0]
+            finally:
+                conn.close()
+        self.assertEqual('wal', wait_for_future(sql(lambda db: db.conn.execute("PRAGMA journal_mode").fetchone()[0])(db)))
+        # block the sql thread while the following requests are queued
+        blocked = threading.Event()
+        wait_fut = sql(lambda db: blocked.wait(timeout=5))(db)
+        fut1 = db.put('a', 1)
+        fut2 = sql(lambda db: 1 // 0)(db)
+        fut3 = db.put('b', 2)
+        blocked.set()
+        self.assertTrue(wait_for_future(wait_fut))
+        self.assertIsNone(wait_for_future(fut1))
+        with self.assertRaises(ZeroDivisionError):
+            wait_for_future(fut2)
+        # once a write is awaited, it has been committed
+        self.assertIsNone(wait_for_future(fut3))
+        self.assertEqual(2, count_rows())
+        db.stop()
+        db.sql_thread.join(timeout=1)
+        self.assertFalse(db.sql_thread.is_alive())
+
+    def test_batch_is_rolled_back_if_commit_fails(self):
+        db = ForeignKeyDB(self.asyncio_loop, os.path.join(self.electrumsys_path, 'fk_db'))
+        # the deferred constraint fails on commit
+        fut = sql(lambda db: db.conn.execute("INSERT INTO child VALUES (1, 1)"))(db)
+        with self.assertRaises(sqlite3.IntegrityError):
+            wait_for_future(fut)
+        # the failed transaction does not make the next batch fail
+        self.assertEqual(1, wait_for_future(sql(lambda db: db.conn.execute("INSERT INTO parent VALUES (2)").rowcount)(db)))
+        count = sql(lambda db: db.conn.execute("SELECT count(*) FROM child").fetchone()[0])(db)
+        self.assertEqual(0, wait_for_future(count))
+        db.stop()
+        db.sql_thread.join(timeout=1)
@@ -1,7 +1,10 @@
 from typing import NamedTuple, Union
+from unittest import mock
 
-from electrumsys import transaction, bitcoin
-from electrumsys.transaction import convert_raw_tx_to_hex, tx_from_any, Transaction, PartialTransaction
+from electrumsys import transaction, bitcoin, ecc
+from electrumsys.transaction import (convert_raw_tx_to_hex, tx_from_any, Transaction, PartialTransaction,
+                                     PartialTxInput, PartialTxOutput, TxOutpoint)
+from electrumsys.crypto import sha256d
 from electrumsys.util import bh2u, bfh
 
 from . import ElectrumSysTestCase
@@ -120,6 +123,121 @@ class TestTransaction(ElectrumSysTestCase):
         self.assertEqual(tx.estimated_weight(), 772)
         self.assertEqual(tx.estimated_size(), 193)
 
+    def test_estimated_sizes_agree_with_serializer(self):
+        pubkey = bfh('02e61d176da16edd1d258a200ad9759ef63adf8e14cd97f53227bae35cdb84d2f6')
+        uncompressed_pubkey = bfh('04' + 64 * '11')
+
+        def make_txin(n, script_type, *, address=None, pubkeys=(), num_sig=1):
+            txin = PartialTxInput(prevout=TxOutpoint(txid=bytes([n]) * 32, out_idx=n))
+            txin.script_type = script_type
+            txin._trusted_address = address
+            txin.pubkeys = list(pubkeys)
+            txin.num_sig = num_sig
+            return txin
+
+        p2pkh_addr = bitcoin.hash160_to_p2pkh(bytes(20))
+        p2sh_addr = bitcoin.hash160_to_p2sh(bytes(20))
+        p2wpkh_addr = bitcoin.hash_to_segwit_addr(bytes(20), witver=0)
+        p2wsh_addr = bitcoin.hash_to_segwit_addr(bytes(32), witver=0)
+        txins = [
+            make_txin(1, 'p2pkh', pubkeys=[pubkey]),
+            make_txin(2, 'p2pkh', pubkeys=[uncompressed_pubkey]),
+            make_txin(3, 'p2pk', pubkeys=[pubkey]),
+            make_txin(4, 'p2wpkh', pubkeys=[pubkey]),
+            make_txin(5, 'p2wpkh-p2sh', pubkeys=[pubkey]),
+            make_txin(6, 'p2sh', pubkeys=[pubkey] * 3, num_sig=2),
+            make_txin(7, 'p2wsh', pubkeys=[pubkey] * 3, num_sig=2),
+            make_txin(8, 'p2wsh-p2sh', pubkeys=[pubkey] * 15, num_sig=15),
+            make_txin(9, 'address', address=p2pkh_addr),
+            make_txin(10, 'address', address=p2sh_addr),
+            make_txin(11, 'address', address=p2wpkh_addr),
+        ]
+        finalized_txin = make_txin(12, 'p2wpkh', pubkeys=[pubkey])
+        finalized_txin.script_sig = b''
+        finalized_txin.witness = bfh('02' + '47' + 71 * '00' + '21' + pubkey.hex())
+        txins.append(finalized_txin)
+
+        for txin in txins:
+            script = Transaction.input_script(txin, estimate_size=True)
+            self.assertEqual(len(Transaction.serialize_input(txin, script)) // 2,
+                             Transaction.estimated_input_size(txin), msg=txin.script_type)
+            self.assertEqual(len(Transaction.serialize_witness(txin, estimate_size=True)) // 2,
+                             Transaction.estimated_input_witness_size(txin), msg=txin.script_type)
+
+        outputs = [PartialTxOutput.from_address_and_value(addr, 10000)
+                   for addr in (p2pkh_addr, p2sh_addr, p2wsh_addr)]
+        outputs.append(PartialTxOutput(scriptpubkey=bfh('6a') + bytes(300), value=0))
+        for tx_inputs in (txins[:3], txins[3:4], txins, txins * 30):
+            tx = PartialTransaction.from_io(tx_inputs, outputs)
+            self.assertFalse(tx.is_complete())
+            self.assertEqual(3 * tx.estimated_base_size() + tx.estimated_total_size(),
+                             tx.estimated_weight())
+
+    def test_cached_txin_txout_serialization_invalidated_on_change(self):
+        tx = Transaction(signed_segwit_blob)
+        txin = tx.inputs()[0]
+        txout = tx.outputs()[0]
+        txin_ser = txin.serialize_to_network()
+        txout_ser = txout.serialize_to_network()
+        self.assertEqual(txin_ser, txin.serialize_to_network())
+        txin.nsequence = 0xffffffff
+        txout.value += 1
+        self.assertEqual(txin_ser[:-4] + bfh('ffffffff'), txin.serialize_to_network())
+        self.assertEqual(bytes([txout_ser[0] + 1]) + txout_ser[1:], txout.serialize_to_network())
+        self.assertEqual(bfh(txin.prevout.serialize_to_network().hex() + '0100ffffffff'),
+                         txin.serialize_to_network(script_sig=b'\x00'))
+        tx.invalidate_ser_cache()
+        self.assertEqual(signed_segwit_blob.replace('fdffffff02', 'ffffffff02').replace('80c3c901', '81c3c901'),
+                         tx.serialize())
+
+    def test_legacy_sighash_from_shared_fields_matches_preimage(self):
+        pubkey = bfh('02e61d176da16edd1d258a200ad9759ef63adf8e14cd97f53227bae35cdb84d2f6')
+        inputs = []
+        for n, script_type in enumerate(['p2pkh', 'p2sh', 'p2wpkh', 'p2pkh', 'p2sh'] * 60):
+            txin = PartialTxInput(prevout=TxOutpoint(txid=bytes([n % 256]) * 32, out_idx=n))
+            txin.script_type = script_type
+            txin.pubkeys = [pubkey] * (2 if script_type == 'p2sh' else 1)
+            txin.num_sig = 1
+            txin._trusted_value_sats = 10_000 + n
+            inputs.append(txin)
+        outputs = [PartialTxOutput(scriptpubkey=bfh('0014') + bytes(20), value=1000 * i) for i in range(1, 4)]
+        tx = PartialTransaction.from_io(inputs, outputs, locktime=1234)
+        bip143_fields = tx._calc_bip143_shared_txdigest_fields()
+        legacy_fields = tx._calc_legacy_shared_txdigest_fields()
+        for i in range(len(inputs)):
+            self.assertEqual(sha256d(bfh(tx.serialize_preimage(i))),
+                             tx._calc_sighash(i, bip143_shared_txdigest_fields=bip143_fields,
+                                              legacy_shared_txdigest_fields=legacy_fields))
+
+    def test_sign_in_worker_pool_matches_serial_signing(self):
+        privkeys = [bytes([k]) * 32 for k in (1, 2, 3)]
+        pubkeys = [ecc.ECPrivkey(k).get_public_key_bytes(compressed=True) for k in privkeys]
+        def make_tx():
+            inputs = []
+            for n, script_type in enumerate(['p2wpkh', 'p2pkh', 'p2wsh', 'p2sh'] * 10):
+                txin = PartialTxInput(prevout=TxOutpoint(txid=bytes([n + 1]) * 32, out_idx=n))
+                txin.script_type = script_type
+                multisig = script_type in ('p2wsh', 'p2sh')
+                txin.pubkeys = pubkeys if multisig else [pubkeys[n % 3]]
+                txin.num_sig = 2 if multisig else 1
+                txin._trusted_value_sats = 10_000 + n
+                inputs.append(txin)
+            outputs = [PartialTxOutput(scriptpubkey=bfh('0014') + bytes(20), value=100_000)]
+            return PartialTransaction.from_io(inputs, outputs, locktime=1234)
+        keypairs = {pk.hex(): (k, True) for pk, k in zip(pubkeys, privkeys)}
+        with mock.patch.object(transaction, '_MIN_SIGNATURES_FOR_SIGNING_POOL', 10**9):
+            serial_tx = make_tx()
+            serial_tx.sign(keypairs)
+        with mock.patch.object(transaction, '_MIN_SIGNATURES_FOR_SIGNING_POOL', 1), \
+                mock.patch.object(ecc.os, 'cpu_count', return_value=4):
+            parallel_tx = make_tx()
+            parallel_tx.sign(keypairs)
+        self.assertTrue(parallel_tx.is_complete())
+        for txin in parallel_tx.inputs():
+            self.assertEqual(txin.num_sig, len(txin.part_sigs))
+        self.assertEqual(serial_tx._serialize_as_base64(), parallel_tx._serialize_as_base64())
+        self.assertEqual(serial_tx.serialize(), parallel_tx.serialize())
+
     def test_estimated_output_size(self):
         estimated_output_size = transaction.Transaction.estimated_output_size
         self.assertEqual(estimated_output_size('14gcRovpkCoGkCNBivQBvw7eso7eiNAbxG'), 34)
@@ -127,6 +245,31 @@ class TestTransaction(ElectrumSysTestCase):
         self.assertEqual(estimated_output_size('bc1q3g5tmkmlvxryhh843v4dz026avatc0zzr6h3af'), 31)
         self.assertEqual(estimated_output_size('bc1qnvks7gfdu72de8qv6q6rhkkzu70fqz4wpjzuxjf6aydsx7wxfwcqnlxuv3'), 43)
 
+    def test_deserialize_parses_inputs_and_outputs_lazily(self):
+        tx = transaction.Transaction(signed_segwit_blob)
+        tx.deserialize()
+        self.assertEqual([None], tx._inputs._items)
+        self.assertEqual([None, None], tx._outputs._items)
+        self.assertEqual(1, len(tx.inputs()))
+        txout = tx.outputs()[1]
+        self.assertEqual(79936100, txout.value)
+        self.assertEqual([None, txout], tx._outputs._items)
+        # the witness is sliced from the raw tx, and matches parse_witness
+        txin = tx.inputs()[0]
+        vds = transaction.BCDataStream()
+        vds.write(txin.witness)
+        expected_txin = transaction.TxInput(prevout=txin.prevout)
+        transaction.parse_witness(vds, expected_txin)
+        self.assertEqual(expected_txin.witness, txin.witness)
+        self.assertEqual(tx.outputs()[:], list(tx.outputs()))
+        self.assertEqual(signed_segwit_blob, tx.serialize())
+        tx.invalidate_ser_cache()
+        self.assertEqual(signed_segwit_blob, tx.serialize())
+        # structural errors are still raised when deserializing
+        for raw in (signed_segwit_blob[:-10], signed_segwit_blob[:200], signed_segwit_blob + '00'):
+            with self.assertRaises(transaction.SerializationError):
+                transaction.Transaction(raw).deserialize()
+
     # TODO other tests for segwit tx
     def test_tx_signed_segwit(self):
         tx = transaction.Transaction(signed_segwit_blob)
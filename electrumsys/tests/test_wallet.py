@@ -200,6 +200,31 @@ class TestCreateRestoreWallet(WalletTestCase):
         self.assertEqual(text, wallet.keystore.get_master_private_key(password=None))
         self.assertEqual('3Pa4hfP3LFWqa2nfphYaF7PZfdJYNusAnp', wallet.get_receiving_addresses()[0])
 
+    def test_derive_addresses_batch_matches_single(self):
+        text = 'zpub6nydoME6CFdJtMpzHW5BNoPz6i6XbeT9qfz72wsRqGdgGEYeivso6xjfw8cGcCyHwF7BNW4LDuHF35XrZsovBLWMF4qXSjmhTXYiHbWqGLt'
+        d = restore_wallet_from_text(text, path=self.wallet_path, gap_limit=5, config=self.config)
+        wallet = d['wallet']  # type: Standard_Wallet
+        for for_change in (0, 1):
+            self.assertEqual([wallet.derive_address(for_change, n) for n in range(3, 10)],
+                             wallet.derive_addresses(for_change, 3, 7))
+        self.assertEqual(wallet.get_receiving_addresses(), wallet.derive_addresses(0, 0, 5))
+
+    def test_persist_derived_pubkeys(self):
+        text = 'zpub6nydoME6CFdJtMpzHW5BNoPz6i6XbeT9qfz72wsRqGdgGEYeivso6xjfw8cGcCyHwF7BNW4LDuHF35XrZsovBLWMF4qXSjmhTXYiHbWqGLt'
+        self.config.set_key('persist_derived_pubkeys', True)
+        d = restore_wallet_from_text(text, path=self.wallet_path, gap_limit=5, config=self.config)
+        wallet = d['wallet']  # type: Standard_Wallet
+        self.assertEqual([wallet.derive_pubkeys(0, n)[0] for n in range(5)],
+                         wallet.db.get_derived_pubkeys(text, 0))
+        self.assertEqual(wallet.db.num_change_addresses(), len(wallet.db.get_derived_pubkeys(text, 1)))
+
+    def test_derived_pubkeys_not_stored_by_default(self):
+        text = 'zpub6nydoME6CFdJtMpzHW5BNoPz6i6XbeT9qfz72wsRqGdgGEYeivso6xjfw8cGcCyHwF7BNW4LDuHF35XrZsovBLWMF4qXSjmhTXYiHbWqGLt'
+        d = restore_wallet_from_text(text, path=self.wallet_path, gap_limit=5, config=self.config)
+        wallet = d['wallet']  # type: Standard_Wallet
+        self.assertEqual([], wallet.db.get_derived_pubkeys(text, 0))
+        self.assertNotIn('derived_pubkeys', wallet.db.data)
+
     def test_restore_wallet_from_text_xprv(self):
         text = 'zprvAZzHPqhCMt51fskXBUYB1fTFYgG3CBjJUT4WEZTpGw6hPSDWBPZYZARC5sE9xAcX8NeWvvucFws8vZxEa65RosKAhy7r5MsmKTxr3hmNmea'
         d = restore_wallet_from_text(text, path=self.wallet_path, gap_limit=1, config=self.config)
@@ -229,3 +254,35 @@ class TestCreateRestoreWallet(WalletTestCase):
         # also test addr deletion
         wallet.delete_address('bc1qnp78h78vp92pwdwq5xvh8eprlga5q8gu66960c')
         self.assertEqual(1, len(wallet.get_receiving_addresses()))
+
+
+class TestWalletDBHistoryStatus(ElectrumSysTestCase):
+
+    def test_history_status_is_cached_and_updated(self):
+        from electrumsys.synchronizer import history_status
+        db = WalletDB('', manual_upgrades=False)
+        addr = 'bc1q2ccr34wzep58d4239tl3x3734ttle92a8srmuw'
+        self.assertIsNone(db.get_addr_history_status(addr))
+        hist = [('a0' * 32, 100), ('b1' * 32, 0)]
+        db.set_addr_history(addr, hist)
+        self.assertEqual(history_status(hist), db.get_addr_history_status(addr))
+        hist2 = hist + [('c2' * 32, -1)]
+        db.set_addr_history(addr, hist2, status=history_status(hist2))
+        self.assertEqual(history_status(hist2), db.get_addr_history_status(addr))
+        db.remove_addr_history(addr)
+        self.assertIsNone(db.get_addr_history_status(addr))
+
+
+class TestWalletDBVerifiedTxHeightIndex(ElectrumSysTestCase):
+
+    def test_verified_tx_height_index(self):
+        db = WalletDB('', manual_upgrades=False)
+        for i, height in enumerate((5, 6, 6, 9)):
+            db.add_verified_tx(f'{i:064x}', TxMinedInfo(height=height, timestamp=0, txpos=i, header_hash='00' * 32))
+        self.assertEqual({6: [f'{1:064x}', f'{2:064x}'], 9: [f'{3:064x}']},
+                         {h: sorted(txids) for h, txids in db.list_verified_tx_above_height(5).items()})
+        # moving a tx to a different height, and removing one
+        db.add_verified_tx(f'{3:064x}', TxMinedInfo(height=4, timestamp=0, txpos=3, header_hash='00' * 32))
+        db.remove_verified_tx(f'{1:064x}')
+        self.assertEqual({6: [f'{2:064x}']}, db.list_verified_tx_above_height(5))
+        self.assertEqual({}, db.list_verified_tx_above_height(6))
@@ -11,7 +11,8 @@ from electrumsys import SimpleConfig
 from electrumsys.address_synchronizer import TX_HEIGHT_UNCONFIRMED, TX_HEIGHT_UNCONF_PARENT
 from electrumsys.wallet import sweep, Multisig_Wallet, Standard_Wallet, Imported_Wallet, restore_wallet_from_text, Abstract_Wallet
 from electrumsys.util import bfh, bh2u
-from electrumsys.transaction import TxOutput, Transaction, PartialTransaction, PartialTxOutput, PartialTxInput, tx_from_any
+from electrumsys.transaction import (TxOutput, Transaction, PartialTransaction, PartialTxOutput, PartialTxInput,
+                                     TxOutpoint, tx_from_any)
 from electrumsys.mnemonic import seed_type
 
 from electrumsys.plugins.trustedcoin import trustedcoin
@@ -1370,6 +1371,46 @@ class TestWalletSending(TestCaseForTestnet):
         wallet.receive_tx_callback(tx.txid(), tx, TX_HEIGHT_UNCONFIRMED)
         self.assertEqual((0, funding_output_value - 50000, 0), wallet.get_balance())
 
+    @mock.patch.object(wallet, 'get_locktime_for_new_transaction', return_value=1325501)
+    @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
+    def test_batch_of_unsigned_transactions(self, mock_save_db, mock_get_locktime):
+        ks = keystore.from_seed('frost repair depend effort salon ring foam oak cancel receive save usage', '', False)
+        wallet = WalletIntegrityHelper.create_standard_wallet(ks, gap_limit=8, config=self.config)
+
+        # bootstrap wallet with one coin on each receiving address
+        txin = PartialTxInput(prevout=TxOutpoint(txid=bytes([1]) * 32, out_idx=0))
+        txin.script_sig = b''
+        funding_outputs = [PartialTxOutput.from_address_and_value(addr, 1_000_000)
+                           for addr in wallet.get_receiving_addresses()]
+        funding_tx = Transaction(PartialTransaction.from_io([txin], funding_outputs).serialize_to_network())
+        wallet.receive_tx_callback(funding_tx.txid(), funding_tx, TX_HEIGHT_UNCONFIRMED)
+
+        dest_addr = 'tb1q3ws2p0qjk5vrravv065xqlnkckvzcpclk79eu2'
+        outputs_list = [[PartialTxOutput.from_address_and_value(dest_addr, amount)]
+                        for amount in (1_500_000, 500_000, 2_500_000)]
+        txs = wallet.create_unsigned_transactions(outputs_list, feerate=1, rbf=True)
+        self.assertEqual(3, len(txs))
+        spent = [txin.prevout for tx in txs for txin in tx.inputs()]
+        self.assertEqual(len(spent), len(set(spent)))
+        change_addrs = []
+        for tx, outputs in zip(txs, outputs_list):
+            self.assertEqual(1325501, tx.locktime)
+            self.assertTrue(all(txin.script_type == 'p2wpkh' and txin.bip32_paths for txin in tx.inputs()))
+            self.assertEqual(outputs[0].value, sum(o.value for o in tx.outputs() if o.address == dest_addr))
+            change_addrs += [o.address for o in tx.outputs() if o.is_change]
+            wallet.sign_transaction(tx, password=None)
+            self.assertTrue(tx.is_complete())
+        # each tx sends its change to an address of its own
+        self.assertEqual(3, len(change_addrs))
+        self.assertEqual(len(change_addrs), len(set(change_addrs)))
+        # new change addresses are created if needed
+        change_addrs_list = wallet.get_change_addresses_for_new_transactions(num_txs=10)
+        self.assertEqual(10, len(set(addrs[0] for addrs in change_addrs_list)))
+        # spending max is not supported in a batch
+        with self.assertRaises(Exception) as ctx:
+            wallet.create_unsigned_transactions([[PartialTxOutput.from_address_and_value(dest_addr, '!')]], feerate=1)
+        self.assertIn('Cannot spend max', str(ctx.exception))
+
     def test_sweep_p2pk(self):
 
         class NetworkMock:
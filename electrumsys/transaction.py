@@ -33,10 +33,13 @@ import sys
 import io
 import base64
 from typing import (Sequence, Union, NamedTuple, Tuple, Optional, Iterable,
-                    Callable, List, Dict, Set, TYPE_CHECKING)
+                    Callable, List, Dict, Set, BinaryIO, TYPE_CHECKING)
 from collections import defaultdict
+import collections.abc
 from enum import IntEnum
 import itertools
+import functools
+import hashlib
 import binascii
 
 from . import ecc, bitcoin, constants, segwit_addr, bip32
@@ -57,6 +60,29 @@ if TYPE_CHECKING:
 _logger = get_logger(__name__)
 DEBUG_PSBT_PARSING = False
 
+# signing many inputs is spread over the libsecp256k1 thread pool of ecc
+_MIN_SIGNATURES_FOR_SIGNING_POOL = 8
+
+
+def _sign_sighash(privkey_bytes: bytes, pre_hash: bytes) -> str:
+    sig = ecc.ECPrivkey(privkey_bytes).sign_transaction(pre_hash)
+    return bh2u(sig) + '01'  # SIGHASH_ALL
+
+
+def _sign_sighashes(jobs: Sequence[Tuple[bytes, bytes]]) -> List[str]:
+    """Signs (privkey_bytes, pre_hash) pairs, returning the sigs in the same order."""
+    num_workers = ecc.num_signature_threads()
+    if num_workers < 2 or len(jobs) < _MIN_SIGNATURES_FOR_SIGNING_POOL:
+        return [_sign_sighash(sec, pre_hash) for sec, pre_hash in jobs]
+    # ThreadPoolExecutor.map ignores chunksize, so jobs are split into one chunk per worker
+    chunk_size = -(-len(jobs) // num_workers)
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    sigs = []
+    for chunk_sigs in ecc.get_signature_executor().map(
+            lambda chunk: [_sign_sighash(sec, pre_hash) for sec, pre_hash in chunk], chunks):
+        sigs.extend(chunk_sigs)
+    return sigs
+
 
 class SerializationError(Exception):
     """ Thrown when there's a problem deserializing or serializing """
@@ -90,24 +116,45 @@ SIGHASH_ALL = 1
 
 
 class TxOutput:
-    scriptpubkey: bytes
-    value: Union[int, str]
+    __slots__ = ('_scriptpubkey', '_value', '_cached_ser')
+    _scriptpubkey: bytes
+    _value: Union[int, str]
+    _cached_ser: Optional[bytes]
 
     def __init__(self, *, scriptpubkey: bytes, value: Union[int, str]):
+        self._cached_ser = None
         self.scriptpubkey = scriptpubkey
         self.value = value  # str when the output is set to max: '!'  # in satoshis
 
+    @property
+    def scriptpubkey(self) -> bytes:
+        return self._scriptpubkey
+
+    @scriptpubkey.setter
+    def scriptpubkey(self, scriptpubkey: bytes):
+        self._scriptpubkey = scriptpubkey
+        self._cached_ser = None
+
+    @property
+    def value(self) -> Union[int, str]:
+        return self._value
+
+    @value.setter
+    def value(self, value: Union[int, str]):
+        self._value = value
+        self._cached_ser = None
+
     @classmethod
     def from_address_and_value(cls, address: str, value: Union[int, str]) -> Union['TxOutput', 'PartialTxOutput']:
         return cls(scriptpubkey=bfh(bitcoin.address_to_script(address)),
                    value=value)
 
     def serialize_to_network(self) -> bytes:
-        buf = int.to_bytes(self.value, 8, byteorder="little", signed=False)
-        script = self.scriptpubkey
-        buf += bfh(var_int(len(script.hex()) // 2))
-        buf += script
-        return buf
+        if self._cached_ser is None:
+            script = self.scriptpubkey
+            self._cached_ser = (int.to_bytes(self.value, 8, byteorder="little", signed=False)
+                                + _var_int_bytes(len(script)) + script)
+        return self._cached_ser
 
     @classmethod
     def from_network_bytes(cls, raw: bytes) -> 'TxOutput':
@@ -161,9 +208,17 @@ class TxOutput:
         return d
 
 class BIP143SharedTxDigestFields(NamedTuple):
-    hashPrevouts: str
-    hashSequence: str
-    hashOutputs: str
+    hashPrevouts: bytes
+    hashSequence: bytes
+    hashOutputs: bytes
+
+class LegacySharedTxDigestFields(NamedTuple):
+    # the pre-segwit preimage of input i is:
+    #   prefix + inputs[:offsets[i]] + (input i with scriptCode) + inputs[offsets[i+1]:] + suffix
+    prefix: bytes  # nVersion, number of inputs
+    inputs: bytes  # all inputs, serialized with empty scriptSig
+    offsets: Sequence[int]  # start of each input in `inputs`, followed by len(inputs)
+    suffix: bytes  # outputs, nLocktime
 
 class TxOutpoint(NamedTuple):
     txid: bytes  # endianness same as hex string displayed; reverse of tx serialization order
@@ -182,18 +237,20 @@ class TxOutpoint(NamedTuple):
         return [self.txid.hex(), self.out_idx]
 
     def serialize_to_network(self) -> bytes:
-        return self.txid[::-1] + bfh(int_to_hex(self.out_idx, 4))
+        return self.txid[::-1] + _int_to_bytes(self.out_idx, 4)
 
     def is_coinbase(self) -> bool:
         return self.txid == bytes(32)
 
 
 class TxInput:
-    prevout: TxOutpoint
-    script_sig: Optional[bytes]
-    nsequence: int
+    __slots__ = ('_prevout', '_script_sig', '_nsequence', 'witness', '_is_coinbase_output', '_cached_ser')
+    _prevout: TxOutpoint
+    _script_sig: Optional[bytes]
+    _nsequence: int
     witness: Optional[bytes]
     _is_coinbase_output: bool
+    _cached_ser: Optional[Tuple[bytes, bytes]]  # (script_sig, serialization)
 
     def __init__(self, *,
                  prevout: TxOutpoint,
@@ -201,12 +258,56 @@ class TxInput:
                  nsequence: int = 0xffffffff - 1,
                  witness: bytes = None,
                  is_coinbase_output: bool = False):
+        self._cached_ser = None
         self.prevout = prevout
         self.script_sig = script_sig
         self.nsequence = nsequence
         self.witness = witness
         self._is_coinbase_output = is_coinbase_output
 
+    @property
+    def prevout(self) -> TxOutpoint:
+        return self._prevout
+
+    @prevout.setter
+    def prevout(self, prevout: TxOutpoint):
+        self._prevout = prevout
+        self._cached_ser = None
+
+    @property
+    def script_sig(self) -> Optional[bytes]:
+        return self._script_sig
+
+    @script_sig.setter
+    def script_sig(self, script_sig: Optional[bytes]):
+        self._script_sig = script_sig
+        self._cached_ser = None
+
+    @property
+    def nsequence(self) -> int:
+        return self._nsequence
+
+    @nsequence.setter
+    def nsequence(self, nsequence: int):
+        self._nsequence = nsequence
+        self._cached_ser = None
+
+    def serialize_to_network(self, *, script_sig: bytes = None) -> bytes:
+        """Returns the serialization of the input, without witness.
+        `script_sig` overrides self.script_sig, e.g. for unsigned inputs.
+        """
+        if script_sig is None:
+            script_sig = self.script_sig or b''
+        cached = self._cached_ser
+        if cached is not None and cached[0] == script_sig:
+            return cached[1]
+        ser = b''.join((self.prevout.serialize_to_network(),
+                        _var_int_bytes(len(script_sig)),
+                        script_sig,
+                        _int_to_bytes(self.nsequence, 4)))
+        self._cached_ser = (script_sig, ser)
+        return ser
+
     def is_coinbase_input(self) -> bool:
         """Whether this is the input of a coinbase tx."""
         return self.prevout.is_coinbase()
@@ -293,6 +394,16 @@ class BCDataStream(object):
         else:
             raise SerializationError('attempt to read past end of buffer')
 
+    def skip_bytes(self, length: int) -> None:
+        """Like read_bytes, but only advances the cursor."""
+        if self.input is None:
+            raise SerializationError("call write(bytes) before trying to deserialize")
+        assert length >= 0
+        read_end = self.read_cursor + length
+        if not (0 <= self.read_cursor <= read_end <= len(self.input)):
+            raise SerializationError('attempt to read past end of buffer')
+        self.read_cursor = read_end
+
     def write_bytes(self, _bytes: Union[bytes, bytearray], length: int):
         assert len(_bytes) == length, len(_bytes)
         self.write(_bytes)
@@ -493,16 +604,73 @@ def parse_witness(vds: BCDataStream, txin: TxInput) -> None:
     txin.witness = bfh(construct_witness(witness_elements))
 
 
-def parse_output(vds: BCDataStream) -> TxOutput:
-    value = vds.read_int64()
+def _check_output_value(value: int) -> None:
     if value > TOTAL_COIN_SUPPLY_LIMIT_IN_SYS * COIN:
         raise SerializationError('invalid output amount (too large)')
     if value < 0:
         raise SerializationError('invalid output amount (negative)')
+
+
+def parse_output(vds: BCDataStream) -> TxOutput:
+    value = vds.read_int64()
+    _check_output_value(value)
     scriptpubkey = vds.read_bytes(vds.read_compact_size())
     return TxOutput(value=value, scriptpubkey=scriptpubkey)
 
 
+def _parse_input_at(raw: bytes, offsets: Tuple[int, Optional[int], Optional[int]]) -> TxInput:
+    txin_start, witness_start, witness_end = offsets
+    vds = BCDataStream()
+    vds.input = raw
+    vds.read_cursor = txin_start
+    txin = parse_input(vds)
+    if witness_start is not None:
+        # the network serialization of a witness is what we store in txin.witness
+        txin.witness = raw[witness_start:witness_end]
+    return txin
+
+
+def _parse_output_at(raw: bytes, txout_start: int) -> TxOutput:
+    vds = BCDataStream()
+    vds.input = raw
+    vds.read_cursor = txout_start
+    return parse_output(vds)
+
+
+class _LazyTxIOs(collections.abc.Sequence):
+    """The inputs or outputs of a deserialized tx, as a read-only sequence.
+    Deserialization only records where each item starts in the raw tx;
+    an item is parsed when it is first accessed.
+    """
+    __slots__ = ('_raw', '_offsets', '_parse_item', '_items')
+
+    def __init__(self, raw: bytes, offsets: Sequence, parse_item: Callable[[bytes, object], object]):
+        self._raw = raw
+        self._offsets = offsets
+        self._parse_item = parse_item
+        self._items = [None] * len(offsets)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        item = self._items[idx]
+        if item is None:
+            item = self._items[idx] = self._parse_item(self._raw, self._offsets[idx])
+        return item
+
+    def __iter__(self):
+        for idx in range(len(self._items)):
+            yield self[idx]
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+
 # pay & redeem scripts
 
 def multisig_script(public_keys: Sequence[str], m: int) -> str:
@@ -514,6 +682,80 @@ def multisig_script(public_keys: Sequence[str], m: int) -> str:
     return op_m + ''.join(keylist) + op_n + opcodes.OP_CHECKMULTISIG.hex()
 
 
+@functools.lru_cache(maxsize=10_000)
+def _guess_txintype_from_address(addr: str, *, net) -> str:
+    # decoding addresses is slow, and tx size estimation does it for every coin
+    witver, witprog = segwit_addr.decode(net.SEGWIT_HRP, addr)
+    if witprog is not None:
+        return 'p2wpkh'
+    addrtype, hash_160_ = b58_address_to_hash160(addr)
+    if addrtype == net.ADDRTYPE_P2PKH:
+        return 'p2pkh'
+    elif addrtype == net.ADDRTYPE_P2SH:
+        return 'p2wpkh-p2sh'
+    raise Exception(f'unrecognized address: {repr(addr)}')
+
+
+def _int_to_bytes(i: int, length: int) -> bytes:
+    """Converts int to little-endian bytes. Same as bfh(int_to_hex(i, length)).
+    `length` is the number of bytes available
+    """
+    if not isinstance(i, int):
+        raise TypeError('{} instead of int'.format(i))
+    if i < 0:
+        # two's complement
+        if i < -(1 << (8 * length - 1)):
+            raise OverflowError('cannot convert int {} to bytes ({} bytes)'.format(i, length))
+        i += 1 << (8 * length)
+    return i.to_bytes(length, byteorder='little')
+
+
+def _var_int_bytes(i: int) -> bytes:
+    """Same as bfh(var_int(i)), the Bitcoin "CompactSize"."""
+    assert i >= 0, i
+    if i < 0xfd:
+        return bytes((i,))
+    elif i <= 0xffff:
+        return b'\xfd' + i.to_bytes(2, byteorder='little')
+    elif i <= 0xffffffff:
+        return b'\xfe' + i.to_bytes(4, byteorder='little')
+    else:
+        return b'\xff' + i.to_bytes(8, byteorder='little')
+
+
+def _var_int_size(i: int) -> int:
+    """Returns len(var_int(i)) in bytes."""
+    if i < 0xfd:
+        return 1
+    elif i <= 0xffff:
+        return 3
+    elif i <= 0xffffffff:
+        return 5
+    else:
+        return 9
+
+
+def _push_script_size(data_len: int) -> int:
+    """Returns the size in bytes of push_script(data) for data of length data_len.
+    Only valid for data_len > 1, as single bytes might be pushed using small integer opcodes.
+    """
+    assert data_len > 1, data_len
+    if data_len < opcodes.OP_PUSHDATA1:
+        return 1 + data_len
+    elif data_len <= 0xff:
+        return 2 + data_len
+    elif data_len <= 0xffff:
+        return 3 + data_len
+    else:
+        return 5 + data_len
+
+
+def _multisig_script_size(num_pubkeys: int, pubkey_size: int) -> int:
+    """Returns the size in bytes of multisig_script(), which only allows up to 15 pubkeys."""
+    # OP_m, pushed pubkeys, OP_n, OP_CHECKMULTISIG
+    return 1 + num_pubkeys * _push_script_size(pubkey_size) + 1 + 1
+
+
 
 
 class Transaction:
@@ -545,6 +787,8 @@ class Transaction:
         self.start_position = start_position
 
         self._cached_txid = None  # type: Optional[str]
+        # whether the cached network ser has witness data; None if unknown
+        self._raw_has_witnesses = None  # type: Optional[bool]
 
     @property
     def locktime(self):
@@ -597,12 +841,13 @@ class Transaction:
         else:
             return
 
+        # Only build an index of the inputs, outputs and witnesses here,
+        # they are parsed from the raw bytes when first accessed.
+        # Offsets are relative to the start of the tx.
+        start = self.start_position
         vds = BCDataStream()
-        if self.copy_input:
-            vds.write(raw_bytes)
-        else:
-            vds.input = raw_bytes
-        vds.read_cursor = self.start_position
+        vds.input = raw_bytes
+        vds.read_cursor = start
         self._version = vds.read_int32()
         n_vin = vds.read_compact_size()
         is_segwit = (n_vin == 0)
@@ -613,17 +858,38 @@ class Transaction:
             n_vin = vds.read_compact_size()
         if n_vin < 1:
             raise SerializationError('tx needs to have at least 1 input')
-        self._inputs = [parse_input(vds) for i in range(n_vin)]
+        txin_starts = []
+        for i in range(n_vin):
+            txin_starts.append(vds.read_cursor - start)
+            vds.skip_bytes(32 + 4)  # prevout
+            vds.skip_bytes(vds.read_compact_size())  # script_sig
+            vds.skip_bytes(4)  # nsequence
         n_vout = vds.read_compact_size()
         if n_vout < 1:
             raise SerializationError('tx needs to have at least 1 output')
-        self._outputs = [parse_output(vds) for i in range(n_vout)]
+        txout_starts = []
+        for i in range(n_vout):
+            txout_starts.append(vds.read_cursor - start)
+            _check_output_value(vds.read_int64())
+            vds.skip_bytes(vds.read_compact_size())  # scriptpubkey
+        witness_spans = [(None, None)] * n_vin
         if is_segwit:
-            for txin in self._inputs:
-                parse_witness(vds, txin)
+            witness_spans = []
+            for i in range(n_vin):
+                witness_start = vds.read_cursor - start
+                for j in range(vds.read_compact_size()):
+                    vds.skip_bytes(vds.read_compact_size())
+                witness_spans.append((witness_start, vds.read_cursor - start))
         self._locktime = vds.read_uint32()
         if vds.can_read_more() and not self.expect_trailing_data:
             raise SerializationError('extra junk at the end')
+        # the lazy lists keep their own reference to the raw tx, as the ser caches can be invalidated
+        raw = bytes(raw_bytes[start:vds.read_cursor])
+        self._inputs = _LazyTxIOs(raw, [(txin_start, *witness_span)
+                                        for txin_start, witness_span in zip(txin_starts, witness_spans)],
+                                  _parse_input_at)
+        self._outputs = _LazyTxIOs(raw, txout_starts, _parse_output_at)
+        self._raw_has_witnesses = is_segwit
         if self.expect_trailing_data:
             if self._cached_network_ser is not None:
                 self._cached_network_ser = self._cached_network_ser[(2*self.start_position):(2*vds.read_cursor)]
@@ -714,15 +980,7 @@ class Transaction:
         # the estimation will not be precise.
         if addr is None:
             return 'p2wpkh'
-        witver, witprog = segwit_addr.decode(constants.net.SEGWIT_HRP, addr)
-        if witprog is not None:
-            return 'p2wpkh'
-        addrtype, hash_160_ = b58_address_to_hash160(addr)
-        if addrtype == constants.net.ADDRTYPE_P2PKH:
-            return 'p2pkh'
-        elif addrtype == constants.net.ADDRTYPE_P2SH:
-            return 'p2wpkh-p2sh'
-        raise Exception(f'unrecognized address: {repr(addr)}')
+        return _guess_txintype_from_address(addr, net=constants.net)
 
     @classmethod
     def input_script(self, txin: TxInput, *, estimate_size=False) -> str:
@@ -790,24 +1048,32 @@ class Transaction:
 
     @classmethod
     def serialize_input(self, txin: TxInput, script: str) -> str:
-        # Prev hash and index
-        s = txin.prevout.serialize_to_network().hex()
-        # Script length, script, sequence
-        s += var_int(len(script)//2)
-        s += script
-        s += int_to_hex(txin.nsequence, 4)
-        return s
+        return txin.serialize_to_network(script_sig=bfh(script)).hex()
 
     def _calc_bip143_shared_txdigest_fields(self) -> BIP143SharedTxDigestFields:
         inputs = self.inputs()
         outputs = self.outputs()
-        hashPrevouts = bh2u(sha256d(b''.join(txin.prevout.serialize_to_network() for txin in inputs)))
-        hashSequence = bh2u(sha256d(bfh(''.join(int_to_hex(txin.nsequence, 4) for txin in inputs))))
-        hashOutputs = bh2u(sha256d(bfh(''.join(o.serialize_to_network().hex() for o in outputs))))
+        hashPrevouts = sha256d(b''.join(txin.prevout.serialize_to_network() for txin in inputs))
+        hashSequence = sha256d(b''.join(_int_to_bytes(txin.nsequence, 4) for txin in inputs))
+        hashOutputs = sha256d(b''.join(o.serialize_to_network() for o in outputs))
         return BIP143SharedTxDigestFields(hashPrevouts=hashPrevouts,
                                           hashSequence=hashSequence,
                                           hashOutputs=hashOutputs)
 
+    def _calc_legacy_shared_txdigest_fields(self) -> LegacySharedTxDigestFields:
+        inputs = self.inputs()
+        outputs = self.outputs()
+        prefix = _int_to_bytes(self.version, 4) + _var_int_bytes(len(inputs))
+        empty_inputs = [txin.serialize_to_network(script_sig=b'') for txin in inputs]
+        offsets = list(itertools.accumulate([0] + [len(x) for x in empty_inputs]))
+        suffix = b''.join(itertools.chain([_var_int_bytes(len(outputs))],
+                                          (o.serialize_to_network() for o in outputs),
+                                          [_int_to_bytes(self.locktime, 4)]))
+        return LegacySharedTxDigestFields(prefix=prefix,
+                                          inputs=b''.join(empty_inputs),
+                                          offsets=offsets,
+                                          suffix=suffix)
+
     def is_segwit(self, *, guess_for_address=False):
         return any(self.is_segwit_input(txin, guess_for_address=guess_for_address)
                    for txin in self.inputs())
@@ -816,20 +1082,21 @@ class Transaction:
         self._cached_network_ser = None
         self._cached_network_ser_bytes = None
         self._cached_txid = None
+        self._raw_has_witnesses = None
 
     def serialize(self) -> str:
         if self._cached_network_ser is not None:
             return self._cached_network_ser
-        if self._cached_network_ser_bytes is not None:
-            self._cached_network_ser = bh2u(self._cached_network_ser_bytes)
-            return self._cached_network_ser
-        self._cached_network_ser = self.serialize_to_network(estimate_size=False, include_sigs=True)
+        self._cached_network_ser = bh2u(self.serialize_as_bytes())
         return self._cached_network_ser
 
     def serialize_as_bytes(self) -> bytes:
         if self._cached_network_ser_bytes is not None:
             return self._cached_network_ser_bytes
-        self._cached_network_ser_bytes = bfh(self.serialize())
+        if self._cached_network_ser is not None:
+            self._cached_network_ser_bytes = bfh(self._cached_network_ser)
+            return self._cached_network_ser_bytes
+        self._cached_network_ser_bytes = self._serialize_to_network_bytes(estimate_size=False, include_sigs=True)
         return self._cached_network_ser_bytes
 
     def serialize_to_network(self, *, estimate_size=False, include_sigs=True, force_legacy=False) -> str:
@@ -838,55 +1105,92 @@ class Transaction:
         `force_legacy` signals to use the pre-segwit format
         note: (not include_sigs) implies force_legacy
         """
+        return self._serialize_to_network_bytes(estimate_size=estimate_size,
+                                                include_sigs=include_sigs,
+                                                force_legacy=force_legacy).hex()
+
+    def _has_default_script_serialization(self) -> bool:
+        # Some plugins replace input_script/serialize_witness on a tx instance
+        # to customise serialization. If so, those must be used even for
+        # inputs that already have a scriptSig/witness.
+        return 'input_script' not in self.__dict__ and 'serialize_witness' not in self.__dict__
+
+    def _serialize_to_network_bytes(self, *, estimate_size=False, include_sigs=True, force_legacy=False) -> bytes:
+        """Same as serialize_to_network, but returns bytes.
+        Per-input and per-output serializations are cached on the txins/txouts.
+        """
         self.deserialize()
-        nVersion = int_to_hex(self.version, 4)
-        nLocktime = int_to_hex(self.locktime, 4)
         inputs = self.inputs()
         outputs = self.outputs()
+        use_default_scripts = self._has_default_script_serialization()
 
-        def create_script_sig(txin: TxInput) -> str:
-            if include_sigs:
-                return self.input_script(txin, estimate_size=estimate_size)
-            return ''
-        txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, create_script_sig(txin))
-                                               for txin in inputs)
-        txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
+        def get_script_sig(txin: TxInput) -> bytes:
+            if not include_sigs:
+                return b''
+            if use_default_scripts and txin.script_sig is not None:
+                return txin.script_sig
+            return bfh(self.input_script(txin, estimate_size=estimate_size))
+
+        def get_witness(txin: TxInput) -> bytes:
+            if use_default_scripts and txin.witness is not None:
+                return txin.witness
+            return bfh(self.serialize_witness(txin, estimate_size=estimate_size))
 
         use_segwit_ser_for_estimate_size = estimate_size and self.is_segwit(guess_for_address=True)
         use_segwit_ser_for_actual_use = not estimate_size and self.is_segwit()
         use_segwit_ser = use_segwit_ser_for_estimate_size or use_segwit_ser_for_actual_use
-        if include_sigs and not force_legacy and use_segwit_ser:
-            marker = '00'
-            flag = '01'
-            witness = ''.join(self.serialize_witness(x, estimate_size=estimate_size) for x in inputs)
-            return nVersion + marker + flag + txins + txouts + witness + nLocktime
-        else:
-            return nVersion + txins + txouts + nLocktime
+        use_segwit_ser = include_sigs and not force_legacy and use_segwit_ser
+
+        parts = [_int_to_bytes(self.version, 4)]
+        if use_segwit_ser:
+            parts.append(b'\x00\x01')  # marker, flag
+        parts.append(_var_int_bytes(len(inputs)))
+        parts.extend(txin.serialize_to_network(script_sig=get_script_sig(txin)) for txin in inputs)
+        parts.append(_var_int_bytes(len(outputs)))
+        parts.extend(o.serialize_to_network() for o in outputs)
+        if use_segwit_ser:
+            parts.extend(get_witness(txin) for txin in inputs)
+        parts.append(_int_to_bytes(self.locktime, 4))
+        # join sizes the result once, then copies each part into it
+        return b''.join(parts)
 
     def txid(self) -> Optional[str]:
         if self._cached_txid is None:
             self.deserialize()
+            if (self._raw_has_witnesses is False and self.start_position == 0
+                    and self._cached_network_ser_bytes is not None):
+                # legacy network tx: hash it without looking at the inputs
+                self._cached_txid = bh2u(sha256d(self._cached_network_ser_bytes)[::-1])
+                return self._cached_txid
             all_segwit = all(self.is_segwit_input(x) for x in self.inputs())
             if not all_segwit and not self.is_complete():
                 return None
-            try:
-                ser = self.serialize_to_network(force_legacy=True)
-            except UnknownTxinType:
-                # we might not know how to construct scriptSig for some scripts
-                return None
-            self._cached_txid = bh2u(sha256d(bfh(ser))[::-1])
+            if (self._cached_network_ser_bytes is not None and self.start_position == 0
+                    and not self.is_segwit()):
+                # the network serialization is already in legacy format
+                ser = self._cached_network_ser_bytes
+            else:
+                try:
+                    ser = self._serialize_to_network_bytes(force_legacy=True)
+                except UnknownTxinType:
+                    # we might not know how to construct scriptSig for some scripts
+                    return None
+            self._cached_txid = bh2u(sha256d(ser)[::-1])
         return self._cached_txid
 
     def wtxid(self) -> Optional[str]:
         self.deserialize()
         if not self.is_complete():
             return None
-        try:
-            ser = self.serialize_to_network()
-        except UnknownTxinType:
-            # we might not know how to construct scriptSig/witness for some scripts
-            return None
-        return bh2u(sha256d(bfh(ser))[::-1])
+        if self._cached_network_ser_bytes is not None and self.start_position == 0:
+            ser = self._cached_network_ser_bytes
+        else:
+            try:
+                ser = self._serialize_to_network_bytes()
+            except UnknownTxinType:
+                # we might not know how to construct scriptSig/witness for some scripts
+                return None
+        return bh2u(sha256d(ser)[::-1])
 
     def add_info_from_wallet(self, wallet: 'Abstract_Wallet') -> None:
         return  # no-op
@@ -907,22 +1211,107 @@ class Transaction:
     @classmethod
     def estimated_input_weight(cls, txin, is_segwit_tx):
         '''Return an estimate of serialized input weight in weight units.'''
-        script = cls.input_script(txin, estimate_size=True)
-        input_size = len(cls.serialize_input(txin, script)) // 2
+        input_size = cls.estimated_input_size(txin)
 
         if cls.is_segwit_input(txin, guess_for_address=True):
-            witness_size = len(cls.serialize_witness(txin, estimate_size=True)) // 2
+            witness_size = cls.estimated_input_witness_size(txin)
         else:
             witness_size = 1 if is_segwit_tx else 0
 
         return 4 * input_size + witness_size
 
+    # The following size estimates are computed arithmetically from the txin type,
+    # and must agree with serializing using estimate_size=True.
+
+    @classmethod
+    def _estimated_siglist_sizes(cls, txin: 'PartialTxInput') -> Tuple[int, int, int]:
+        """Returns (pubkey_size, num_pubkeys, num_sig) as in get_siglist(estimate_size=True)."""
+        try:
+            pubkey_size = len(txin.pubkeys[0])
+        except IndexError:
+            pubkey_size = 33  # guess it is compressed
+        return pubkey_size, max(1, len(txin.pubkeys)), max(1, txin.num_sig)
+
+    @classmethod
+    def estimated_input_size(cls, txin: TxInput) -> int:
+        """Return the estimated size of the non-witness serialization of txin, in bytes."""
+        script_size = cls._estimated_input_script_size(txin)
+        # prevout, script length, script, nsequence
+        return 36 + _var_int_size(script_size) + script_size + 4
+
+    @classmethod
+    def _estimated_input_script_size(cls, txin: TxInput) -> int:
+        # see input_script
+        if txin.script_sig is not None:
+            return len(txin.script_sig)
+        if txin.is_coinbase_input():
+            return 0
+        assert isinstance(txin, PartialTxInput)
+
+        if txin.is_p2sh_segwit() and txin.redeem_script:
+            return _push_script_size(len(txin.redeem_script))
+        if txin.is_native_segwit():
+            return 0
+
+        _type = txin.script_type
+        if _type in ('address', 'unknown'):
+            _type = cls.guess_txintype_from_address(txin.address)
+        pubkey_size, num_pubkeys, num_sig = cls._estimated_siglist_sizes(txin)
+        sigs_size = num_sig * _push_script_size(72)
+        if _type == 'p2pk':
+            return sigs_size
+        elif _type == 'p2sh':
+            redeem_script_size = _multisig_script_size(num_pubkeys, pubkey_size)
+            return 1 + sigs_size + _push_script_size(redeem_script_size)
+        elif _type == 'p2pkh':
+            return sigs_size + _push_script_size(pubkey_size)
+        elif _type in ['p2wpkh', 'p2wsh']:
+            return 0
+        elif _type == 'p2wpkh-p2sh':
+            return _push_script_size(22)
+        elif _type == 'p2wsh-p2sh':
+            return _push_script_size(34)
+        raise UnknownTxinType(f'cannot construct scriptSig for txin_type: {_type}')
+
+    @classmethod
+    def estimated_input_witness_size(cls, txin: TxInput) -> int:
+        """Return the estimated size of the witness of txin, in bytes."""
+        # see serialize_witness
+        if txin.witness is not None:
+            return len(txin.witness)
+        if txin.is_coinbase_input():
+            return 0
+        assert isinstance(txin, PartialTxInput)
+
+        _type = txin.script_type
+        if not cls.is_segwit_input(txin):
+            return 1
+
+        if _type in ('address', 'unknown'):
+            _type = cls.guess_txintype_from_address(txin.address)
+        pubkey_size, num_pubkeys, num_sig = cls._estimated_siglist_sizes(txin)
+        sig_size = 1 + 72
+        if _type in ['p2wpkh', 'p2wpkh-p2sh']:
+            return 1 + sig_size + 1 + pubkey_size
+        elif _type in ['p2wsh', 'p2wsh-p2sh']:
+            witness_script_size = _multisig_script_size(num_pubkeys, pubkey_size)
+            return (_var_int_size(num_sig + 2) + 1 + num_sig * sig_size
+                    + _var_int_size(witness_script_size) + witness_script_size)
+        elif _type in ['p2pk', 'p2pkh', 'p2sh']:
+            return 1
+        raise UnknownTxinType(f'cannot construct witness for txin_type: {_type}')
+
+    @classmethod
+    def estimated_output_size_for_script(cls, script: bytes) -> int:
+        """Return the serialized size of an output with given scriptPubKey, in bytes."""
+        # 8 byte value + script len + script
+        return 8 + _var_int_size(len(script)) + len(script)
+
     @classmethod
     def estimated_output_size(cls, address):
         """Return an estimate of serialized output size in bytes."""
-        script = bitcoin.address_to_script(address)
-        # 8 byte value + 1 byte script len + script
-        return 9 + len(script) // 2
+        script = bfh(bitcoin.address_to_script(address))
+        return cls.estimated_output_size_for_script(script)
 
     @classmethod
     def virtual_size_from_weight(cls, weight):
@@ -951,10 +1340,26 @@ class Transaction:
 
     def estimated_weight(self):
         """Return an estimate of transaction weight."""
+        if not self.is_complete():
+            # equivalent to the below, without serializing
+            return self._estimated_weight_without_serializing()
         total_tx_size = self.estimated_total_size()
         base_tx_size = self.estimated_base_size()
         return 3 * base_tx_size + total_tx_size
 
+    def _estimated_weight_without_serializing(self) -> int:
+        inputs = self.inputs()
+        outputs = self.outputs()
+        # version, input count, output count, locktime
+        base_size = 4 + _var_int_size(len(inputs)) + _var_int_size(len(outputs)) + 4
+        base_size += sum(self.estimated_input_size(txin) for txin in inputs)
+        base_size += sum(self.estimated_output_size_for_script(o.scriptpubkey) for o in outputs)
+        weight = 4 * base_size
+        if self.is_segwit(guess_for_address=True):
+            # marker, flag and witnesses
+            weight += 2 + sum(self.estimated_input_witness_size(txin) for txin in inputs)
+        return weight
+
     def is_complete(self) -> bool:
         return True
 
@@ -1051,6 +1456,18 @@ def tx_from_any(raw: Union[str, bytes], *,
                                  f"raw: {raw[:30]}...") from e
 
 
+def tx_from_fd(fd: BinaryIO) -> Union['PartialTransaction', 'Transaction']:
+    """Like tx_from_any, for a seekable file opened in binary mode.
+    Binary PSBTs are parsed from the file as they are read, instead of
+    being read whole and converted to hex first.
+    """
+    if fd.read(5) == b'psbt\xff':
+        fd.seek(0)
+        return PartialTransaction.from_psbt_fd(fd)
+    fd.seek(0)
+    return tx_from_any(fd.read())
+
+
 class PSBTGlobalType(IntEnum):
     UNSIGNED_TX = 0
     XPUB = 1
@@ -1091,7 +1508,44 @@ def deser_compact_size(f) -> Optional[int]:
     return nit
 
 
+class _PSBTField:
+    """A PSBT-only attribute of a PartialTxInput/PartialTxOutput.
+    The values live in the `_psbt_fields` dict of the instance, which is only
+    created once a field is set (or a dict/list field is accessed). Most
+    coins and outputs never carry any PSBT data, so they don't pay for it.
+    """
+
+    def __init__(self, default_factory: Callable[[], object] = None):
+        self.default_factory = default_factory
+        self.name = None  # type: Optional[str]
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        fields = obj._psbt_fields
+        if fields is not None and self.name in fields:
+            return fields[self.name]
+        if self.default_factory is None:
+            return None
+        # mutable default: store it, so that in-place changes stick
+        value = self.default_factory()
+        self.__set__(obj, value)
+        return value
+
+    def __set__(self, obj, value):
+        fields = obj._psbt_fields
+        if fields is None:
+            if value is None and self.default_factory is None:
+                return
+            fields = obj._psbt_fields = {}
+        fields[self.name] = value
+
+
 class PSBTSection:
+    __slots__ = ()
 
     def _populate_psbt_fields_from_fd(self, fd=None):
         if not fd: return
@@ -1124,9 +1578,9 @@ class PSBTSection:
     def create_psbt_writer(cls, fd):
         def wr(key_type: int, val: bytes, key: bytes = b''):
             full_key = cls.get_fullkey_from_keytype_and_key(key_type, key)
-            fd.write(bytes.fromhex(var_int(len(full_key))))  # key_size
+            fd.write(_var_int_bytes(len(full_key)))  # key_size
             fd.write(full_key)  # key
-            fd.write(bytes.fromhex(var_int(len(val))))  # val_size
+            fd.write(_var_int_bytes(len(val)))  # val_size
             fd.write(val)  # val
         return wr
 
@@ -1140,7 +1594,7 @@ class PSBTSection:
 
     @classmethod
     def get_fullkey_from_keytype_and_key(cls, key_type: int, key: bytes) -> bytes:
-        key_type_bytes = bytes.fromhex(var_int(key_type))
+        key_type_bytes = _var_int_bytes(key_type)
         return key_type_bytes + key
 
     def _serialize_psbt_section(self, fd):
@@ -1156,16 +1610,22 @@ class PSBTSection:
 
 
 class PartialTxInput(TxInput, PSBTSection):
+    __slots__ = ('script_type', 'num_sig', 'pubkeys', '_trusted_value_sats', '_trusted_address',
+                 'block_height', '_is_p2sh_segwit', '_is_native_segwit', '_psbt_fields')
+
+    # PSBT-only fields
+    utxo = _PSBTField()  # type: Optional[Transaction]
+    witness_utxo = _PSBTField()  # type: Optional[TxOutput]
+    part_sigs = _PSBTField(dict)  # type: Dict[bytes, bytes]  # pubkey -> sig
+    sighash = _PSBTField()  # type: Optional[int]
+    bip32_paths = _PSBTField(dict)  # type: Dict[bytes, Tuple[bytes, Sequence[int]]]  # pubkey -> (xpub_fingerprint, path)
+    redeem_script = _PSBTField()  # type: Optional[bytes]
+    witness_script = _PSBTField()  # type: Optional[bytes]
+    _unknown = _PSBTField(dict)  # type: Dict[bytes, bytes]
+
     def __init__(self, *args, **kwargs):
         TxInput.__init__(self, *args, **kwargs)
-        self.utxo = None  # type: Optional[Transaction]
-        self.witness_utxo = None  # type: Optional[TxOutput]
-        self.part_sigs = {}  # type: Dict[bytes, bytes]  # pubkey -> sig
-        self.sighash = None  # type: Optional[int]
-        self.bip32_paths = {}  # type: Dict[bytes, Tuple[bytes, Sequence[int]]]  # pubkey -> (xpub_fingerprint, path)
-        self.redeem_script = None  # type: Optional[bytes]
-        self.witness_script = None  # type: Optional[bytes]
-        self._unknown = {}  # type: Dict[bytes, bytes]
+        self._psbt_fields = None  # type: Optional[Dict[str, object]]
 
         self.script_type = 'unknown'
         self.num_sig = 0  # type: int  # num req sigs for multisig
@@ -1300,7 +1760,7 @@ class PartialTxInput(TxInput, PSBTSection):
         if self.witness_utxo:
             wr(PSBTInputType.WITNESS_UTXO, self.witness_utxo.serialize_to_network())
         elif self.utxo:
-            wr(PSBTInputType.NON_WITNESS_UTXO, bfh(self.utxo.serialize_to_network(include_sigs=True)))
+            wr(PSBTInputType.NON_WITNESS_UTXO, Transaction.serialize_as_bytes(self.utxo))
         for pk, val in sorted(self.part_sigs.items()):
             wr(PSBTInputType.PARTIAL_SIG, val, pk)
         if self.sighash is not None:
@@ -1465,12 +1925,17 @@ class PartialTxInput(TxInput, PSBTSection):
 
 
 class PartialTxOutput(TxOutput, PSBTSection):
+    __slots__ = ('script_type', 'num_sig', 'pubkeys', 'is_mine', 'is_change', '_psbt_fields')
+
+    # PSBT-only fields
+    redeem_script = _PSBTField()  # type: Optional[bytes]
+    witness_script = _PSBTField()  # type: Optional[bytes]
+    bip32_paths = _PSBTField(dict)  # type: Dict[bytes, Tuple[bytes, Sequence[int]]]  # pubkey -> (xpub_fingerprint, path)
+    _unknown = _PSBTField(dict)  # type: Dict[bytes, bytes]
+
     def __init__(self, *args, **kwargs):
         TxOutput.__init__(self, *args, **kwargs)
-        self.redeem_script = None  # type: Optional[bytes]
-        self.witness_script = None  # type: Optional[bytes]
-        self.bip32_paths = {}  # type: Dict[bytes, Tuple[bytes, Sequence[int]]]  # pubkey -> (xpub_fingerprint, path)
-        self._unknown = {}  # type: Dict[bytes, bytes]
+        self._psbt_fields = None  # type: Optional[Dict[str, object]]
 
         self.script_type = 'unknown'
         self.num_sig = 0  # num req sigs for multisig
@@ -1584,91 +2049,99 @@ class PartialTransaction(Transaction):
         if not isinstance(raw, (bytes, bytearray)) or raw[0:5] != b'psbt\xff':
             raise BadHeaderMagic("bad magic")
 
-        tx = None  # type: Optional[PartialTransaction]
+        with io.BytesIO(raw) as fd:
+            return cls.from_psbt_fd(fd)
 
-        # We parse the raw stream twice. The first pass is used to find the
-        # PSBT_GLOBAL_UNSIGNED_TX key in the global section and set 'tx'.
-        # The second pass does everything else.
-        with io.BytesIO(raw[5:]) as fd:  # parsing "first pass"
-            while True:
-                try:
-                    kt, key, val = PSBTSection.get_next_kv_from_fd(fd)
-                except StopIteration:
-                    break
-                try:
-                    kt = PSBTGlobalType(kt)
-                except ValueError:
-                    pass  # unknown type
-                if kt == PSBTGlobalType.UNSIGNED_TX:
-                    if tx is not None:
-                        raise SerializationError(f"duplicate key: {repr(kt)}")
-                    if key: raise SerializationError(f"key for {repr(kt)} must be empty")
-                    unsigned_tx = Transaction(val.hex())
-                    for txin in unsigned_tx.inputs():
-                        if txin.script_sig or txin.witness:
-                            raise SerializationError(f"PSBT {repr(kt)} must have empty scriptSigs and witnesses")
-                    tx = PartialTransaction.from_tx(unsigned_tx)
+    @classmethod
+    def from_psbt_fd(cls, fd: BinaryIO) -> 'PartialTransaction':
+        """Parses a binary PSBT from a file-like object, in a single pass.
+        Previous transactions (utxo fields) are only indexed, not parsed.
+        """
+        if fd.read(5) != b'psbt\xff':
+            raise BadHeaderMagic("bad magic")
+        tx = cls._read_psbt_global_section(fd)
+        try:
+            # inputs sections
+            for txin in tx.inputs():
+                if DEBUG_PSBT_PARSING: print("-> new input starts")
+                txin._populate_psbt_fields_from_fd(fd)
+            # outputs sections
+            for txout in tx.outputs():
+                if DEBUG_PSBT_PARSING: print("-> new output starts")
+                txout._populate_psbt_fields_from_fd(fd)
+        except UnexpectedEndOfStream:
+            raise UnexpectedEndOfStream('Unexpected end of stream. Num input and output maps provided does not match unsigned tx.') from None
+
+        if fd.read(1) != b'':
+            raise SerializationError("extra junk at the end of PSBT")
 
-        if tx is None:
-            raise SerializationError(f"PSBT missing required global section PSBT_GLOBAL_UNSIGNED_TX")
+        for txin in tx.inputs():
+            txin.validate_data()
 
-        with io.BytesIO(raw[5:]) as fd:  # parsing "second pass"
-            # global section
-            while True:
-                try:
-                    kt, key, val = PSBTSection.get_next_kv_from_fd(fd)
-                except StopIteration:
-                    break
-                try:
-                    kt = PSBTGlobalType(kt)
-                except ValueError:
-                    pass  # unknown type
-                if DEBUG_PSBT_PARSING: print(f"{repr(kt)} {key.hex()} {val.hex()}")
-                if kt == PSBTGlobalType.UNSIGNED_TX:
-                    pass  # already handled during "first" parsing pass
-                elif kt == PSBTGlobalType.XPUB:
-                    bip32node = BIP32Node.from_bytes(key)
-                    if bip32node in tx.xpubs:
-                        raise SerializationError(f"duplicate key: {repr(kt)}")
-                    xfp, path = unpack_bip32_root_fingerprint_and_int_path(val)
-                    if bip32node.depth != len(path):
-                        raise SerializationError(f"PSBT global xpub has mismatching depth ({bip32node.depth}) "
-                                                 f"and derivation prefix len ({len(path)})")
-                    child_number_of_xpub = int.from_bytes(bip32node.child_number, 'big')
-                    if not ((bip32node.depth == 0 and child_number_of_xpub == 0)
-                            or (bip32node.depth != 0 and child_number_of_xpub == path[-1])):
-                        raise SerializationError(f"PSBT global xpub has inconsistent child_number and derivation prefix")
-                    tx.xpubs[bip32node] = xfp, path
-                elif kt == PSBTGlobalType.VERSION:
-                    if len(val) > 4:
-                        raise SerializationError(f"value for {repr(kt)} has unexpected length: {len(val)} > 4")
-                    psbt_version = int.from_bytes(val, byteorder='little', signed=False)
-                    if psbt_version > 0:
-                        raise SerializationError(f"Only PSBTs with version 0 are supported. Found version: {psbt_version}")
-                    if key: raise SerializationError(f"key for {repr(kt)} must be empty")
-                else:
-                    full_key = PSBTSection.get_fullkey_from_keytype_and_key(kt, key)
-                    if full_key in tx._unknown:
-                        raise SerializationError(f'duplicate key. PSBT global key for unknown type: {full_key}')
-                    tx._unknown[full_key] = val
+        return tx
+
+    @classmethod
+    def _read_psbt_global_section(cls, fd: BinaryIO) -> 'PartialTransaction':
+        """Reads the global section of a PSBT from fd (positioned after the magic),
+        and returns the tx it describes, without any input or output data yet.
+        """
+        # The PSBT_GLOBAL_UNSIGNED_TX key can be anywhere in the global section,
+        # so collect the (small) section first, and set 'tx' before handling the rest.
+        global_kvs = []
+        while True:
+            try:
+                kt, key, val = PSBTSection.get_next_kv_from_fd(fd)
+            except StopIteration:
+                break
             try:
-                # inputs sections
-                for txin in tx.inputs():
-                    if DEBUG_PSBT_PARSING: print("-> new input starts")
-                    txin._populate_psbt_fields_from_fd(fd)
-                # outputs sections
-                for txout in tx.outputs():
-                    if DEBUG_PSBT_PARSING: print("-> new output starts")
-                    txout._populate_psbt_fields_from_fd(fd)
-            except UnexpectedEndOfStream:
-                raise UnexpectedEndOfStream('Unexpected end of stream. Num input and output maps provided does not match unsigned tx.') from None
-
-            if fd.read(1) != b'':
-                raise SerializationError("extra junk at the end of PSBT")
+                kt = PSBTGlobalType(kt)
+            except ValueError:
+                pass  # unknown type
+            global_kvs.append((kt, key, val))
 
-        for txin in tx.inputs():
-            txin.validate_data()
+        tx = None  # type: Optional[PartialTransaction]
+        for kt, key, val in global_kvs:
+            if kt == PSBTGlobalType.UNSIGNED_TX:
+                if tx is not None:
+                    raise SerializationError(f"duplicate key: {repr(kt)}")
+                if key: raise SerializationError(f"key for {repr(kt)} must be empty")
+                unsigned_tx = Transaction(val)
+                for txin in unsigned_tx.inputs():
+                    if txin.script_sig or txin.witness:
+                        raise SerializationError(f"PSBT {repr(kt)} must have empty scriptSigs and witnesses")
+                tx = cls.from_tx(unsigned_tx)
+        if tx is None:
+            raise SerializationError(f"PSBT missing required global section PSBT_GLOBAL_UNSIGNED_TX")
 
+        for kt, key, val in global_kvs:
+            if DEBUG_PSBT_PARSING: print(f"{repr(kt)} {key.hex()} {val.hex()}")
+            if kt == PSBTGlobalType.UNSIGNED_TX:
+                pass  # already handled above
+            elif kt == PSBTGlobalType.XPUB:
+                bip32node = BIP32Node.from_bytes(key)
+                if bip32node in tx.xpubs:
+                    raise SerializationError(f"duplicate key: {repr(kt)}")
+                xfp, path = unpack_bip32_root_fingerprint_and_int_path(val)
+                if bip32node.depth != len(path):
+                    raise SerializationError(f"PSBT global xpub has mismatching depth ({bip32node.depth}) "
+                                             f"and derivation prefix len ({len(path)})")
+                child_number_of_xpub = int.from_bytes(bip32node.child_number, 'big')
+                if not ((bip32node.depth == 0 and child_number_of_xpub == 0)
+                        or (bip32node.depth != 0 and child_number_of_xpub == path[-1])):
+                    raise SerializationError(f"PSBT global xpub has inconsistent child_number and derivation prefix")
+                tx.xpubs[bip32node] = xfp, path
+            elif kt == PSBTGlobalType.VERSION:
+                if len(val) > 4:
+                    raise SerializationError(f"value for {repr(kt)} has unexpected length: {len(val)} > 4")
+                psbt_version = int.from_bytes(val, byteorder='little', signed=False)
+                if psbt_version > 0:
+                    raise SerializationError(f"Only PSBTs with version 0 are supported. Found version: {psbt_version}")
+                if key: raise SerializationError(f"key for {repr(kt)} must be empty")
+            else:
+                full_key = PSBTSection.get_fullkey_from_keytype_and_key(kt, key)
+                if full_key in tx._unknown:
+                    raise SerializationError(f'duplicate key. PSBT global key for unknown type: {full_key}')
+                tx._unknown[full_key] = val
         return tx
 
     @classmethod
@@ -1685,10 +2158,19 @@ class PartialTransaction(Transaction):
         return self
 
     def _serialize_psbt(self, fd) -> None:
+        self._serialize_psbt_global_section(fd)
+        # input sections
+        for inp in self._inputs:
+            inp._serialize_psbt_section(fd)
+        # output sections
+        for outp in self._outputs:
+            outp._serialize_psbt_section(fd)
+
+    def _serialize_psbt_global_section(self, fd) -> None:
         wr = PSBTSection.create_psbt_writer(fd)
         fd.write(b'psbt\xff')
         # global section
-        wr(PSBTGlobalType.UNSIGNED_TX, bfh(self.serialize_to_network(include_sigs=False)))
+        wr(PSBTGlobalType.UNSIGNED_TX, self._serialize_to_network_bytes(include_sigs=False))
         for bip32node, (xfp, path) in sorted(self.xpubs.items()):
             val = pack_bip32_root_fingerprint_and_int_path(xfp, path)
             wr(PSBTGlobalType.XPUB, val, key=bip32node.to_bytes())
@@ -1696,12 +2178,6 @@ class PartialTransaction(Transaction):
             key_type, key = PSBTSection.get_keytype_and_key_from_fullkey(full_key)
             wr(key_type, val, key=key)
         fd.write(b'\x00')  # section-separator
-        # input sections
-        for inp in self._inputs:
-            inp._serialize_psbt_section(fd)
-        # output sections
-        for outp in self._outputs:
-            outp._serialize_psbt_section(fd)
 
     def finalize_psbt(self) -> None:
         for txin in self.inputs():
@@ -1795,61 +2271,117 @@ class PartialTransaction(Transaction):
 
     def serialize_preimage(self, txin_index: int, *,
                            bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None) -> str:
-        nVersion = int_to_hex(self.version, 4)
-        nLocktime = int_to_hex(self.locktime, 4)
+        return self._serialize_preimage_bytes(
+            txin_index, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields).hex()
+
+    def _serialize_preimage_bytes(self, txin_index: int, *,
+                                  bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None) -> bytes:
+        nVersion = _int_to_bytes(self.version, 4)
+        nLocktime = _int_to_bytes(self.locktime, 4)
         inputs = self.inputs()
         outputs = self.outputs()
         txin = inputs[txin_index]
         sighash = txin.sighash if txin.sighash is not None else SIGHASH_ALL
         if sighash != SIGHASH_ALL:
             raise Exception("only SIGHASH_ALL signing is supported!")
-        nHashType = int_to_hex(sighash, 4)
-        preimage_script = self.get_preimage_script(txin)
+        nHashType = _int_to_bytes(sighash, 4)
+        preimage_script = bfh(self.get_preimage_script(txin))
         if self.is_segwit_input(txin):
             if bip143_shared_txdigest_fields is None:
                 bip143_shared_txdigest_fields = self._calc_bip143_shared_txdigest_fields()
             hashPrevouts = bip143_shared_txdigest_fields.hashPrevouts
             hashSequence = bip143_shared_txdigest_fields.hashSequence
             hashOutputs = bip143_shared_txdigest_fields.hashOutputs
-            outpoint = txin.prevout.serialize_to_network().hex()
-            scriptCode = var_int(len(preimage_script) // 2) + preimage_script
-            amount = int_to_hex(txin.value_sats(), 8)
-            nSequence = int_to_hex(txin.nsequence, 4)
-            preimage = nVersion + hashPrevouts + hashSequence + outpoint + scriptCode + amount + nSequence + hashOutputs + nLocktime + nHashType
+            outpoint = txin.prevout.serialize_to_network()
+            scriptCode = _var_int_bytes(len(preimage_script)) + preimage_script
+            amount = _int_to_bytes(txin.value_sats(), 8)
+            nSequence = _int_to_bytes(txin.nsequence, 4)
+            preimage = b''.join((nVersion, hashPrevouts, hashSequence, outpoint, scriptCode,
+                                 amount, nSequence, hashOutputs, nLocktime, nHashType))
         else:
-            txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, preimage_script if txin_index==k else '')
-                                                   for k, txin in enumerate(inputs))
-            txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
-            preimage = nVersion + txins + txouts + nLocktime + nHashType
+            parts = [nVersion, _var_int_bytes(len(inputs))]
+            parts.extend(txin.serialize_to_network(script_sig=preimage_script if txin_index == k else b'')
+                         for k, txin in enumerate(inputs))
+            parts.append(_var_int_bytes(len(outputs)))
+            parts.extend(o.serialize_to_network() for o in outputs)
+            parts.extend((nLocktime, nHashType))
+            preimage = b''.join(parts)
         return preimage
 
+    def _calc_sighash(self, txin_index: int, *,
+                      bip143_shared_txdigest_fields: BIP143SharedTxDigestFields = None,
+                      legacy_shared_txdigest_fields: LegacySharedTxDigestFields = None) -> bytes:
+        """Returns sha256d of the preimage of input txin_index.
+        Passing the shared fields avoids recomputing them for every input.
+        For pre-segwit inputs, the preimage is hashed piecewise from the shared
+        fields, so the work per input does not involve re-serializing the tx.
+        """
+        txin = self.inputs()[txin_index]
+        if self.is_segwit_input(txin) or legacy_shared_txdigest_fields is None:
+            return sha256d(self._serialize_preimage_bytes(
+                txin_index, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields))
+        sighash = txin.sighash if txin.sighash is not None else SIGHASH_ALL
+        if sighash != SIGHASH_ALL:
+            raise Exception("only SIGHASH_ALL signing is supported!")
+        fields = legacy_shared_txdigest_fields
+        preimage_script = bfh(self.get_preimage_script(txin))
+        inputs = memoryview(fields.inputs)
+        h = hashlib.sha256(fields.prefix)
+        h.update(inputs[:fields.offsets[txin_index]])
+        h.update(txin.serialize_to_network(script_sig=preimage_script))
+        h.update(inputs[fields.offsets[txin_index + 1]:])
+        h.update(fields.suffix)
+        h.update(_int_to_bytes(sighash, 4))
+        return hashlib.sha256(h.digest()).digest()
+
     def sign(self, keypairs) -> None:
         # keypairs:  pubkey_hex -> (secret_bytes, is_compressed)
         bip143_shared_txdigest_fields = self._calc_bip143_shared_txdigest_fields()
-        for i, txin in enumerate(self.inputs()):
-            pubkeys = [pk.hex() for pk in txin.pubkeys]
-            for pubkey in pubkeys:
+        legacy_shared_txdigest_fields = None
+        if not all(self.is_segwit_input(txin) for txin in self.inputs()):
+            legacy_shared_txdigest_fields = self._calc_legacy_shared_txdigest_fields()
+        # Each round adds at most one signature per input: the next key (in pubkey order)
+        # we have for every input that is still incomplete. Sighashes are computed up front,
+        # signatures are created in a worker pool, and then added back in input order,
+        # so the resulting PSBT does not depend on how the signing work was scheduled.
+        sighashes = {}  # type: Dict[int, bytes]
+        remaining_pubkeys = {i: [pk.hex() for pk in txin.pubkeys]
+                             for i, txin in enumerate(self.inputs())}
+        while True:
+            jobs = []  # type: List[Tuple[int, str, bytes]]
+            for i, txin in enumerate(self.inputs()):
                 if txin.is_complete():
-                    break
-                if pubkey not in keypairs:
                     continue
+                pubkeys = remaining_pubkeys[i]
+                while pubkeys and pubkeys[0] not in keypairs:
+                    pubkeys.pop(0)
+                if not pubkeys:
+                    continue
+                pubkey = pubkeys.pop(0)
+                if i not in sighashes:
+                    txin.validate_data(for_signing=True)
+                    sighashes[i] = self._calc_sighash(
+                        i, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields,
+                        legacy_shared_txdigest_fields=legacy_shared_txdigest_fields)
+                jobs.append((i, pubkey, keypairs[pubkey][0]))
+            if not jobs:
+                break
+            sigs = _sign_sighashes([(sec, sighashes[i]) for i, pubkey, sec in jobs])
+            for (i, pubkey, sec), sig in zip(jobs, sigs):
                 _logger.info(f"adding signature for {pubkey}")
-                sec, compressed = keypairs[pubkey]
-                sig = self.sign_txin(i, sec, bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)
                 self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey, sig=sig)
 
         _logger.debug(f"is_complete {self.is_complete()}")
         self.invalidate_ser_cache()
 
-    def sign_txin(self, txin_index, privkey_bytes, *, bip143_shared_txdigest_fields=None) -> str:
+    def sign_txin(self, txin_index, privkey_bytes, *, bip143_shared_txdigest_fields=None,
+                  legacy_shared_txdigest_fields=None) -> str:
         txin = self.inputs()[txin_index]
         txin.validate_data(for_signing=True)
-        pre_hash = sha256d(bfh(self.serialize_preimage(txin_index,
-                                                       bip143_shared_txdigest_fields=bip143_shared_txdigest_fields)))
-        privkey = ecc.ECPrivkey(privkey_bytes)
-        sig = privkey.sign_transaction(pre_hash)
-        sig = bh2u(sig) + '01'  # SIGHASH_ALL
-        return sig
+        pre_hash = self._calc_sighash(txin_index,
+                                      bip143_shared_txdigest_fields=bip143_shared_txdigest_fields,
+                                      legacy_shared_txdigest_fields=legacy_shared_txdigest_fields)
+        return _sign_sighash(privkey_bytes, pre_hash)
 
     def is_complete(self) -> bool:
         return all([txin.is_complete() for txin in self.inputs()])
@@ -1897,29 +2429,29 @@ class PartialTransaction(Transaction):
             return
         if len(self.inputs()) != len(signatures):
             raise Exception('expected {} signatures; got {}'.format(len(self.inputs()), len(signatures)))
+        bip143_shared_txdigest_fields = self._calc_bip143_shared_txdigest_fields()
+        legacy_shared_txdigest_fields = self._calc_legacy_shared_txdigest_fields()
+        # check every sig against all pubkeys of its input, in one batch
+        candidates = []  # type: List[Tuple[int, str, str]]
+        items = []
         for i, txin in enumerate(self.inputs()):
-            pubkeys = [pk.hex() for pk in txin.pubkeys]
             sig = signatures[i]
             if bfh(sig) in list(txin.part_sigs.values()):
                 continue
-            pre_hash = sha256d(bfh(self.serialize_preimage(i)))
+            pre_hash = self._calc_sighash(i,
+                                          bip143_shared_txdigest_fields=bip143_shared_txdigest_fields,
+                                          legacy_shared_txdigest_fields=legacy_shared_txdigest_fields)
             sig_string = ecc.sig_string_from_der_sig(bfh(sig[:-2]))
-            for recid in range(4):
-                try:
-                    public_key = ecc.ECPubkey.from_sig_string(sig_string, recid, pre_hash)
-                except ecc.InvalidECPointException:
-                    # the point might not be on the curve for some recid values
-                    continue
-                pubkey_hex = public_key.get_public_key_hex(compressed=True)
-                if pubkey_hex in pubkeys:
-                    try:
-                        public_key.verify_message_hash(sig_string, pre_hash)
-                    except Exception:
-                        _logger.exception('')
-                        continue
-                    _logger.info(f"adding sig: txin_idx={i}, signing_pubkey={pubkey_hex}, sig={sig}")
-                    self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey_hex, sig=sig)
-                    break
+            for pubkey in txin.pubkeys:
+                candidates.append((i, pubkey.hex(), sig))
+                items.append((pubkey, sig_string, pre_hash))
+        signed_txin_idxs = set()
+        for (i, pubkey_hex, sig), is_valid in zip(candidates, ecc.verify_signatures(items)):
+            if not is_valid or i in signed_txin_idxs:
+                continue
+            _logger.info(f"adding sig: txin_idx={i}, signing_pubkey={pubkey_hex}, sig={sig}")
+            self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey_hex, sig=sig)
+            signed_txin_idxs.add(i)
         # redo raw
         self.invalidate_ser_cache()
 
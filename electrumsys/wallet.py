@@ -40,7 +40,7 @@ from functools import partial
 from collections import defaultdict
 from numbers import Number
 from decimal import Decimal
-from typing import TYPE_CHECKING, List, Optional, Tuple, Union, NamedTuple, Sequence, Dict, Any, Set
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union, NamedTuple, Sequence, Dict, Any, Set, Callable
 from abc import ABC, abstractmethod
 import itertools
 
@@ -1174,6 +1174,28 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         max_change = self.max_change_outputs if self.multiple_change else 1
         return change_addrs[:max_change]
 
+    def get_change_addresses_for_new_transactions(self, preferred_change_addr=None, *,
+                                                  num_txs: int) -> List[List[str]]:
+        """Like get_change_addresses_for_new_transaction, for a batch of
+        num_txs transactions. Each transaction gets its own unused change
+        addresses, so that the transactions of a batch are not linked by
+        their change. New change addresses are created if there are not
+        enough unused ones. A preferred change address is used for all of them.
+        """
+        if preferred_change_addr or not self.use_change:
+            change_addrs = self.get_change_addresses_for_new_transaction(preferred_change_addr)
+            return [change_addrs] * num_txs
+        max_change = self.max_change_outputs if self.multiple_change else 1
+        addrs = list(self.calc_unused_change_addresses()[:num_txs * max_change])
+        if len(addrs) < num_txs and self.is_deterministic():
+            addrs += self.create_new_addresses(True, num_txs - len(addrs))
+        for addr in addrs:
+            assert is_address(addr), f"not valid syscoin address: {addr}"
+            self.check_address_for_corruption(addr)
+        # without an address of its own, the change of a tx goes back
+        # to the address of its first input (see CoinChooserBase.make_tx)
+        return [addrs[i::num_txs] for i in range(num_txs)]
+
     def make_unsigned_assetsend_transaction(self, asset_guid, asset_address, outputs) -> PartialTransaction:
         tx = None
         if outputs is None or len(outputs) == 0:
@@ -1261,15 +1283,7 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             for item in coins:
                 self.add_input_info(item)
 
-            # Fee estimator
-            if fee is None:
-                fee_estimator = self.config.estimate_fee
-            elif isinstance(fee, Number):
-                fee_estimator = lambda size: fee
-            elif callable(fee):
-                fee_estimator = fee
-            else:
-                raise Exception(f'Invalid argument fee: {fee}')
+            fee_estimator = self._get_fee_estimator(fee)
 
             if i_max is None:
                 # Let the coin chooser select the coins to spend
@@ -1337,6 +1351,49 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         run_hook('make_unsigned_transaction', self, tx)
         return tx
 
+    def _get_fee_estimator(self, fee) -> Callable[[Union[int, float, Decimal]], int]:
+        if fee is None:
+            return self.config.estimate_fee
+        elif isinstance(fee, Number):
+            return lambda size: fee
+        elif callable(fee):
+            return fee
+        else:
+            raise Exception(f'Invalid argument fee: {fee}')
+
+    def make_unsigned_transactions(self, *, coins: Sequence[PartialTxInput],
+                                   outputs_list: Sequence[List[PartialTxOutput]], fee=None,
+                                   change_addr: str = None) -> List[PartialTransaction]:
+        """Build one unsigned transaction per list of outputs, as for a batch
+        of payouts. Coins selected for one transaction are not used by the
+        others. The coins are bucketized once, and the fee estimator is
+        shared by the whole batch; each transaction has its own change addresses.
+        """
+        if any([c.already_has_some_signatures() for c in coins]):
+            raise Exception("Some inputs already contain signatures!")
+        if any(o.value == '!' for outputs in outputs_list for o in outputs):
+            raise Exception("Cannot spend max in a batch of transactions")
+        if fee is None and self.config.fee_per_kb() is None:
+            raise NoDynamicFeeEstimates()
+
+        for item in coins:
+            self.add_input_info(item)
+        fee_estimator = self._get_fee_estimator(fee)
+        coin_chooser = coinchooser.get_coin_chooser(self.config)
+        change_addrs_list = self.get_change_addresses_for_new_transactions(change_addr,
+                                                                           num_txs=len(outputs_list))
+        txs = coin_chooser.make_batch(coins=coins,
+                                      outputs_list=[copy.deepcopy(outputs) for outputs in outputs_list],
+                                      change_addrs_list=change_addrs_list,
+                                      fee_estimator_vb=fee_estimator,
+                                      dust_threshold=self.dust_threshold())
+        locktime = get_locktime_for_new_transaction(self.network)
+        for tx in txs:
+            tx.locktime = locktime
+            tx.add_info_from_wallet(self)
+            run_hook('make_unsigned_transaction', self, tx)
+        return txs
+
     def mktx(self, *, outputs: List[PartialTxOutput], password=None, fee=None, change_addr=None,
              domain=None, rbf=False, nonlocal_only=False, tx_version=None, sign=True) -> PartialTransaction:
         coins = self.get_spendable_coins(domain, nonlocal_only=nonlocal_only)
@@ -2135,6 +2192,32 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             self.sign_transaction(tx, password)
         return tx
 
+    def create_unsigned_transactions(self, outputs_list, *, fee=None, feerate=None, change_addr=None,
+                                     domain_addr=None, domain_coins=None, rbf=None, locktime=None):
+        if fee is not None and feerate is not None:
+            raise Exception("Cannot specify both 'fee' and 'feerate' at the same time!")
+        coins = self.get_spendable_coins(domain_addr)
+        if domain_coins is not None:
+            coins = [coin for coin in coins if (coin.prevout.to_str() in domain_coins)]
+        if feerate is not None:
+            fee_per_kb = 1000 * Decimal(feerate)
+            fee_estimator = partial(SimpleConfig.estimate_fee_for_feerate, fee_per_kb)
+        else:
+            fee_estimator = fee
+        txs = self.make_unsigned_transactions(
+            coins=coins,
+            outputs_list=outputs_list,
+            fee=fee_estimator,
+            change_addr=change_addr)
+        if rbf is None:
+            rbf = self.config.get('use_rbf', True)
+        for tx in txs:
+            if locktime is not None:
+                tx.locktime = locktime
+            if rbf:
+                tx.set_rbf(True)
+        return txs
+
 
 class Simple_Wallet(Abstract_Wallet):
     # wallet with a single keystore
@@ -2368,10 +2451,27 @@ class Deterministic_Wallet(Abstract_Wallet):
         self._ephemeral_addr_to_addr_index = {}  # type: Dict[str, Sequence[int]]
         Abstract_Wallet.__init__(self, db, storage, config=config)
         self.gap_limit = db.get('gap_limit', 20)
+        # optionally keep derived pubkeys in the wallet file, so that they do not
+        # have to be derived again each time the wallet is opened
+        self._persist_derived_pubkeys = bool(self.config.get('persist_derived_pubkeys', False))
+        if self._persist_derived_pubkeys:
+            self._load_derived_pubkeys()
         # generate addresses now. note that without libsecp this might block
         # for a few seconds!
         self.synchronize()
 
+    @profiler
+    def _load_derived_pubkeys(self):
+        num_addresses = {0: self.db.num_receiving_addresses(), 1: self.db.num_change_addresses()}
+        for k in self.get_keystores():
+            mpk = k.get_master_public_key()
+            for for_change, num_addr in num_addresses.items():
+                stored = self.db.get_derived_pubkeys(mpk, for_change)
+                k.add_derived_pubkeys_to_cache(for_change, 0, [bfh(pk) for pk in stored])
+                if len(stored) < num_addr:
+                    missing = k.derive_pubkeys(for_change, len(stored), num_addr - len(stored))
+                    self.db.add_derived_pubkeys(mpk, for_change, len(stored), [pk.hex() for pk in missing])
+
     def has_seed(self):
         return self.keystore.has_seed()
 
@@ -2449,6 +2549,15 @@ class Deterministic_Wallet(Abstract_Wallet):
         pubkeys = self.derive_pubkeys(for_change, n)
         return self.pubkeys_to_address(pubkeys)
 
+    def derive_addresses(self, for_change: int, start: int, count: int) -> Sequence[str]:
+        """Derives the addresses at indices start..start+count-1 in one batch.
+        Equivalent to calling derive_address for each index, but much faster.
+        """
+        for_change = int(for_change)
+        pubkeys_per_keystore = [[pk.hex() for pk in k.derive_pubkeys(for_change, start, count)]
+                                for k in self.get_keystores()]
+        return [self.pubkeys_to_address(list(pubkeys)) for pubkeys in zip(*pubkeys_per_keystore)]
+
     def export_private_key_for_path(self, path: Union[Sequence[int], str], password: Optional[str]) -> str:
         if isinstance(path, str):
             path = convert_bip32_path_to_list_of_uint32(path)
@@ -2477,32 +2586,43 @@ class Deterministic_Wallet(Abstract_Wallet):
             txinout.bip32_paths[pubkey] = (fp_bytes, der_full)
 
     def create_new_address(self, for_change: bool = False):
+        return self.create_new_addresses(for_change, 1)[0]
+
+    def create_new_addresses(self, for_change: bool, count: int) -> Sequence[str]:
         assert type(for_change) is bool
         with self.lock:
             n = self.db.num_change_addresses() if for_change else self.db.num_receiving_addresses()
-            address = self.derive_address(int(for_change), n)
-            self.db.add_change_address(address) if for_change else self.db.add_receiving_address(address)
-            self.add_address(address)
-            if for_change:
+            addresses = self.derive_addresses(int(for_change), n, count)
+            if self._persist_derived_pubkeys:
+                for k in self.get_keystores():
+                    pubkeys = k.derive_pubkeys(int(for_change), n, count)
+                    self.db.add_derived_pubkeys(k.get_master_public_key(), for_change, n,
+                                                [pk.hex() for pk in pubkeys])
+            for address in addresses:
+                self.db.add_change_address(address) if for_change else self.db.add_receiving_address(address)
+            self.add_addresses(addresses)
+            if for_change and hasattr(self, '_not_old_change_addresses'):
                 # note: if it's actually "old", it will get filtered later
-                self._not_old_change_addresses.append(address)
-            return address
+                self._not_old_change_addresses.extend(addresses)
+            return addresses
 
     def synchronize_sequence(self, for_change):
         limit = self.gap_limit_for_change if for_change else self.gap_limit
-        while True:
+        with self.lock:
             num_addr = self.db.num_change_addresses() if for_change else self.db.num_receiving_addresses()
-            if num_addr < limit:
-                self.create_new_address(for_change)
-                continue
             if for_change:
                 last_few_addresses = self.get_change_addresses(slice_start=-limit)
             else:
                 last_few_addresses = self.get_receiving_addresses(slice_start=-limit)
-            if any(map(self.address_is_old, last_few_addresses)):
-                self.create_new_address(for_change)
-            else:
-                break
+            # There must be 'limit' addresses after the last old one.
+            # Only the last few addresses need to be checked; newly created ones cannot be old.
+            num_needed = limit
+            for i, addr in enumerate(reversed(last_few_addresses)):
+                if self.address_is_old(addr):
+                    num_needed = num_addr - i + limit
+                    break
+            if num_needed > num_addr:
+                self.create_new_addresses(for_change, num_needed - num_addr)
 
     @AddressSynchronizer.with_local_height_cached
     def synchronize(self):
@@ -27,6 +27,7 @@ import ast
 import json
 import copy
 import threading
+import bisect
 from collections import defaultdict
 from typing import Dict, Optional, List, Tuple, Set, Iterable, NamedTuple, Sequence, TYPE_CHECKING, Union
 import binascii
@@ -860,15 +861,32 @@ class WalletDB(JsonDB):
         assert isinstance(addr, str)
         return self.history.get(addr, [])
 
+    @locked
+    def get_addr_history_status(self, addr: str) -> Optional[str]:
+        """Returns the electrum protocol status hash of the stored history of addr.
+        The hash is cached, and only recomputed after the history changes.
+        """
+        assert isinstance(addr, str)
+        if addr not in self._history_status:
+            from .synchronizer import history_status
+            self._history_status[addr] = history_status(self.history.get(addr, []))
+        return self._history_status[addr]
+
     @modifier
-    def set_addr_history(self, addr: str, hist) -> None:
+    def set_addr_history(self, addr: str, hist, *, status: Optional[str] = None) -> None:
+        # note: if status is provided, the caller must have checked it matches hist
         assert isinstance(addr, str)
         self.history[addr] = hist
+        if status is not None:
+            self._history_status[addr] = status
+        else:
+            self._history_status.pop(addr, None)
 
     @modifier
     def remove_addr_history(self, addr: str) -> None:
         assert isinstance(addr, str)
         self.history.pop(addr, None)
+        self._history_status.pop(addr, None)
 
     @locked
     def list_verified_tx(self) -> Sequence[str]:
@@ -886,17 +904,42 @@ class WalletDB(JsonDB):
                            txpos=txpos,
                            header_hash=header_hash)
 
+    @locked
+    def list_verified_tx_above_height(self, height: int) -> Dict[int, Sequence[str]]:
+        """Returns the txids of verified txs mined above the given height, grouped by height."""
+        i = bisect.bisect_right(self._verified_tx_heights, height)
+        return {h: list(self._verified_tx_by_height[h]) for h in self._verified_tx_heights[i:]}
+
     @modifier
     def add_verified_tx(self, txid: str, info: TxMinedInfo):
         assert isinstance(txid, str)
         assert isinstance(info, TxMinedInfo)
+        self._remove_verified_tx_from_height_index(txid)
         self.verified_tx[txid] = (info.height, info.timestamp, info.txpos, info.header_hash)
+        self._add_verified_tx_to_height_index(txid, info.height)
 
     @modifier
     def remove_verified_tx(self, txid: str):
         assert isinstance(txid, str)
+        self._remove_verified_tx_from_height_index(txid)
         self.verified_tx.pop(txid, None)
 
+    def _add_verified_tx_to_height_index(self, txid: str, height: int) -> None:
+        if height not in self._verified_tx_by_height:
+            self._verified_tx_by_height[height] = set()
+            bisect.insort(self._verified_tx_heights, height)
+        self._verified_tx_by_height[height].add(txid)
+
+    def _remove_verified_tx_from_height_index(self, txid: str) -> None:
+        if txid not in self.verified_tx:
+            return
+        height = self.verified_tx[txid][0]
+        txids = self._verified_tx_by_height[height]
+        txids.discard(txid)
+        if not txids:
+            del self._verified_tx_by_height[height]
+            del self._verified_tx_heights[bisect.bisect_left(self._verified_tx_heights, height)]
+
     def is_in_verified_tx(self, txid: str) -> bool:
         assert isinstance(txid, str)
         return txid in self.verified_tx
@@ -998,6 +1041,25 @@ class WalletDB(JsonDB):
         self._addr_to_addr_index[addr] = (0, len(self.receiving_addresses))
         self.receiving_addresses.append(addr)
 
+    @locked
+    def get_derived_pubkeys(self, mpk: str, for_change: int) -> Sequence[str]:
+        assert isinstance(mpk, str)
+        derived_pubkeys = self.data.get('derived_pubkeys', {})  # type: Dict[str, Dict[str, List[str]]]
+        return list(derived_pubkeys.get(mpk, {}).get(str(int(for_change)), []))
+
+    @modifier
+    def add_derived_pubkeys(self, mpk: str, for_change: int, start: int, pubkeys: Sequence[str]) -> None:
+        # note: the stored list for each branch is kept contiguous from index 0
+        assert isinstance(mpk, str)
+        # master public key -> for_change -> list of pubkey hex
+        derived_pubkeys = self.get_dict('derived_pubkeys')
+        if mpk not in derived_pubkeys:
+            derived_pubkeys[mpk] = {'0': [], '1': []}
+        stored = derived_pubkeys[mpk][str(int(for_change))]
+        if start > len(stored):
+            return
+        stored.extend(pubkeys[len(stored) - start:])
+
     @locked
     def get_address_index(self, address: str) -> Optional[Sequence[int]]:
         assert isinstance(address, str)
@@ -1056,7 +1118,13 @@ class WalletDB(JsonDB):
         self.transactions = self.get_dict('transactions')        # type: Dict[str, Transaction]
         self.spent_outpoints = self.get_dict('spent_outpoints')  # txid -> output_index -> next_txid
         self.history = self.get_dict('addr_history')             # address -> list of (txid, height)
+        self._history_status = {}                                # type: Dict[str, Optional[str]]  # address -> status hash of self.history[address]
         self.verified_tx = self.get_dict('verified_tx3')         # txid -> (height, timestamp, txpos, header_hash)
+        # in-memory index of verified_tx, so that reorgs only touch affected txs
+        self._verified_tx_by_height = {}                         # type: Dict[int, Set[str]]
+        self._verified_tx_heights = []                           # type: List[int]  # sorted keys of _verified_tx_by_height
+        for txid, (height, timestamp, txpos, header_hash) in self.verified_tx.items():
+            self._add_verified_tx_to_height_index(txid, height)
         self.tx_fees = self.get_dict('tx_fees')                  # type: Dict[str, TxFeesValue]
         # scripthash -> set of (outpoint, value)
         self._prevouts_by_scripthash = self.get_dict('prevouts_by_scripthash')  # type: Dict[str, Set[Tuple[str, int]]]
@@ -1089,7 +1157,10 @@ class WalletDB(JsonDB):
         self.spent_outpoints.clear()
         self.transactions.clear()
         self.history.clear()
+        self._history_status.clear()
         self.verified_tx.clear()
+        self._verified_tx_by_height.clear()
+        self._verified_tx_heights.clear()
         self.tx_fees.clear()
         self._prevouts_by_scripthash.clear()
 